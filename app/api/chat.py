@@ -0,0 +1,195 @@
+"""
+对话与智能体运行接口
+- POST /chat/completions：单轮对话，支持JSON或SSE流式返回
+- WS   /chat/ws：基于WebSocket的多轮流式对话，支持中途取消
+- GET  /chat/sessions/{session_id}：查看会话后端中保存的消息
+- POST /agents/run：运行多智能体任务DAG，SSE在每个任务完成时推送结果
+"""
+import asyncio
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.orchestrator import Orchestrator
+from app.core.agents.session_backend import get_session_backend
+from app.schema.chat import AgentRunRequest, AgentTaskResult, ChatRequest, ChatResponse, SessionMessages
+from app.service.chat_service import (
+    StreamTimer,
+    build_tasks,
+    create_agent,
+    sse_event,
+    stream_chat_events,
+    task_result_payload,
+)
+from app.utils.logger import logger
+
+
+router = APIRouter(tags=["chat"])
+
+# SSE响应头：禁止代理缓冲，保证分片及时到达客户端
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@router.post("/chat/completions", response_model=ChatResponse)
+async def chat_completions(request: ChatRequest):
+    """单轮对话
+
+    messages 中开头的系统消息作为系统提示词，最后一条必须是用户消息，其余作为历史。
+    """
+    timer = StreamTimer()
+    *history, last = request.messages
+    if last.role != "user":
+        raise HTTPException(status_code=422, detail="最后一条消息必须是用户消息")
+
+    agent = create_agent(
+        history=history,
+        session_id=request.session_id,
+        temperature=request.temperature,
+        max_tokens=request.max_tokens,
+    )
+    try:
+        result = await agent.generate(last.content, stream=request.stream)
+    except Exception as e:
+        logger.error(f"调用LLM失败: {e}")
+        raise HTTPException(status_code=502, detail=f"调用LLM失败: {e}")
+
+    if not request.stream:
+        timer.mark_first_byte()
+        logger.info(f"对话完成: ttfb_ms={timer.ttfb_ms:.1f}")
+        return ChatResponse(content=result, ttfb_ms=timer.ttfb_ms, total_ms=timer.total_ms)
+    return StreamingResponse(
+        stream_chat_events(result, timer),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
+
+
+async def _pipe_to_websocket(websocket: WebSocket, chunks: AsyncGenerator[str, None], timer: StreamTimer) -> None:
+    """将流式分片逐条发送到WebSocket，发送等待即为背压"""
+    try:
+        async for chunk in chunks:
+            timer.mark_first_byte()
+            await websocket.send_json({"type": "delta", "content": chunk})
+    finally:
+        await chunks.aclose()
+
+
+@router.websocket("/chat/ws")
+async def chat_websocket(websocket: WebSocket):
+    """WebSocket多轮对话
+
+    客户端消息：
+        {"type": "message", "content": "...", "system_prompt": "...", "session_id": "..."}
+                                                      # system_prompt、session_id 仅首条有效
+        {"type": "cancel"}                                            # 取消当前生成
+    服务端消息：
+        {"type": "delta", "content": "..."}
+        {"type": "done", "ttfb_ms": ..., "total_ms": ...}
+        {"type": "cancelled"} / {"type": "error", "detail": "..."}
+    """
+    await websocket.accept()
+    inbox: asyncio.Queue = asyncio.Queue()
+
+    async def reader() -> None:
+        # 持续读取客户端消息，生成过程中也能及时感知取消和断开
+        try:
+            while True:
+                await inbox.put(await websocket.receive_json())
+        except WebSocketDisconnect:
+            await inbox.put(None)
+        except Exception as e:
+            logger.warning(f"WebSocket读取失败: {e}")
+            await inbox.put(None)
+
+    reader_task = asyncio.create_task(reader())
+    agent: Optional[BaseAgent] = None
+    # 生成期间已从 inbox 取出、留到下一轮处理的客户端消息（None 表示断开）
+    held: List[Optional[Dict[str, Any]]] = []
+    try:
+        while True:
+            message: Dict[str, Any] = held.pop() if held else await inbox.get()
+            if message is None:
+                return
+            if message.get("type", "message") != "message":
+                continue
+            if agent is None:
+                agent = create_agent(message.get("system_prompt"), session_id=message.get("session_id"))
+
+            timer = StreamTimer()
+            try:
+                chunks = await agent.generate(message.get("content", ""), stream=True)
+            except Exception as e:
+                logger.error(f"调用LLM失败: {e}")
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+
+            pipe = asyncio.create_task(_pipe_to_websocket(websocket, chunks, timer))
+            next_message = asyncio.create_task(inbox.get())
+            done, _ = await asyncio.wait({pipe, next_message}, return_when=asyncio.FIRST_COMPLETED)
+
+            if pipe in done:
+                if next_message in done:
+                    # 生成结束的同时收到了客户端消息，按下一轮处理，不能丢弃
+                    held.append(next_message.result())
+                else:
+                    next_message.cancel()
+                if pipe.exception() is not None:
+                    await websocket.send_json({"type": "error", "detail": str(pipe.exception())})
+                    continue
+                await websocket.send_json({"type": "done", "ttfb_ms": timer.ttfb_ms, "total_ms": timer.total_ms})
+                logger.info(f"WebSocket响应完成: ttfb_ms={timer.ttfb_ms}, total_ms={timer.total_ms:.1f}")
+                continue
+
+            # 生成过程中收到客户端消息：断开或取消都会终止上游请求
+            pipe.cancel()
+            await asyncio.gather(pipe, return_exceptions=True)
+            incoming = next_message.result()
+            if incoming is None:
+                logger.info("WebSocket客户端断开，已取消上游请求")
+                return
+            await websocket.send_json({"type": "cancelled"})
+            if incoming.get("type", "message") == "message":
+                # 生成中途发来的新消息按下一轮处理
+                held.append(incoming)
+    except WebSocketDisconnect:
+        logger.info("WebSocket客户端断开")
+    finally:
+        reader_task.cancel()
+        if agent is not None:
+            await agent.close()
+
+
+@router.get("/chat/sessions/{session_id}", response_model=SessionMessages)
+async def get_session(session_id: str, limit: Optional[int] = None):
+    """查看会话后端中保存的消息，limit 为最近的消息条数"""
+    messages = await get_session_backend().load(session_id, limit)
+    return SessionMessages(session_id=session_id, messages=messages)
+
+
+@router.post("/agents/run")
+async def run_agents(request: AgentRunRequest):
+    """运行多智能体任务DAG，无依赖关系的任务并发执行"""
+    try:
+        # 创建Agent之前校验任务图，使不合法的DAG返回422而不是在流中报错
+        Orchestrator.validate(request.tasks)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    tasks = build_tasks(request.tasks)
+    results = Orchestrator().run_stream(tasks)
+
+    if not request.stream:
+        return [AgentTaskResult(**task_result_payload(r)) async for r in results]
+
+    async def events() -> AsyncGenerator[str, None]:
+        timer = StreamTimer()
+        try:
+            async for result in results:
+                timer.mark_first_byte()
+                yield sse_event(task_result_payload(result), event="task")
+            yield sse_event({"ttfb_ms": timer.ttfb_ms, "total_ms": timer.total_ms}, event="done")
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
@@ -0,0 +1,69 @@
+"""
+后台任务接口
+- POST /jobs：提交任务，立即返回任务信息
+- GET  /jobs/{job_id}：查询任务状态和结果
+- GET  /jobs/{job_id}/events：读取进度事件，stream=true 时以SSE推送直到任务结束
+- POST /jobs/{job_id}/cancel：取消任务
+"""
+from typing import AsyncGenerator, List
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.schema.job import JobEventInfo, JobInfo, JobSubmitRequest
+from app.service.chat_service import sse_event
+from app.service.job_service import get_job_queue
+
+
+router = APIRouter(tags=["jobs"])
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@router.post("/jobs", response_model=JobInfo, status_code=202)
+async def submit_job(request: JobSubmitRequest):
+    """提交后台任务"""
+    try:
+        job = await get_job_queue().submit(request.kind, request.payload, request.timeout)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return JobInfo(**job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str):
+    """查询任务"""
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return JobInfo(**job)
+
+
+@router.get("/jobs/{job_id}/events", response_model=List[JobEventInfo])
+async def job_events(job_id: str, after: int = -1, stream: bool = False):
+    """读取任务进度事件
+
+    Args:
+        after: 只返回序号大于该值的事件，断线重连时传入最后收到的序号
+        stream: 为true时以SSE持续推送，任务结束后关闭连接
+    """
+    queue = get_job_queue()
+    if await queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if not stream:
+        return await queue.events(job_id, after)
+
+    async def events() -> AsyncGenerator[str, None]:
+        async for event in queue.stream(job_id, after):
+            yield sse_event(event, event=event["type"])
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobInfo)
+async def cancel_job(job_id: str):
+    """取消任务，运行中的任务在工作进程下次心跳时停止"""
+    job = await get_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return JobInfo(**job)
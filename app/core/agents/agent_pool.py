@@ -0,0 +1,113 @@
+"""
+Agent模板池
+- 按角色/模板名缓存配置好的模板Agent（客户端、缓存、限流器、历史策略已解析，系统提示词已序列化并计数）
+- acquire 返回模板的分支（fork），分支与模板结构共享系统提示词等前缀，创建成本与历史长度无关
+- 超过 idle_ttl 未使用的模板在下次访问池时淘汰，模板数超过上限时淘汰最久未使用的模板
+- 配置 llm / agents 变化时清空模板，之后按新配置重建
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.config.config_loader import config
+from app.core.agents.base_agent import BaseAgent
+from app.utils.logger import logger
+
+
+class AgentPool:
+    """Agent模板池"""
+
+    def __init__(self, max_templates: int = 64, idle_ttl: float = 600):
+        """
+        Args:
+            max_templates: 最多缓存的模板数
+            idle_ttl: 模板闲置多久后淘汰（秒）
+        """
+        self.max_templates = max_templates
+        self.idle_ttl = idle_ttl
+        # 模板名 -> (模板Agent, 最近使用时间)
+        self._templates: "OrderedDict[str, Tuple[BaseAgent, float]]" = OrderedDict()
+        self._factories: Dict[str, Callable[[], BaseAgent]] = {}
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def register(self, name: str, factory: Callable[[], BaseAgent]) -> None:
+        """注册模板，首次 acquire 时调用 factory 创建模板Agent"""
+        self._factories[name] = factory
+        self._templates.pop(name, None)
+
+    def acquire(self, name: str, factory: Optional[Callable[[], BaseAgent]] = None) -> BaseAgent:
+        """获取模板的分支
+
+        Args:
+            name: 模板名
+            factory: 模板不存在时使用的创建函数，默认使用 register 注册的函数
+
+        Returns:
+            BaseAgent: 共享模板历史的新分支，可以独立追加消息
+        """
+        now = time.monotonic()
+        self._evict_idle(now)
+        entry = self._templates.get(name)
+        if entry is None:
+            factory = factory or self._factories.get(name)
+            if factory is None:
+                raise KeyError(f"未注册的Agent模板: {name}")
+            template = factory()
+            self.builds += 1
+            while len(self._templates) >= self.max_templates:
+                self._templates.popitem(last=False)
+                self.evictions += 1
+        else:
+            template = entry[0]
+            self.hits += 1
+        self._templates[name] = (template, now)
+        self._templates.move_to_end(name)
+        return template.fork()
+
+    def _evict_idle(self, now: float) -> None:
+        # 按最近使用时间排序，遇到未过期的模板即可停止
+        while self._templates:
+            name, (_, last_used) = next(iter(self._templates.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            del self._templates[name]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """清空模板，下次获取时重建"""
+        self._templates.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "templates": len(self._templates),
+            "hits": self.hits,
+            "builds": self.builds,
+            "evictions": self.evictions,
+        }
+
+
+_default_pool: Optional[AgentPool] = None
+
+
+def _on_config_change(new, old, changed) -> None:
+    """模板持有按旧配置创建的客户端、限流器和模型参数，配置变化时清空"""
+    if _default_pool is not None:
+        _default_pool.clear()
+        logger.info("LLM或Agent配置已变化，已清空Agent模板池")
+
+
+config.subscribe(_on_config_change, "llm", "agents", in_loop=True)
+
+
+def get_agent_pool() -> AgentPool:
+    """根据配置 agents.pool 获取进程级共享模板池"""
+    global _default_pool
+    if _default_pool is None:
+        pool_config = (config.get("agents", {}) or {}).get("pool", {}) or {}
+        _default_pool = AgentPool(
+            max_templates=pool_config.get("max_templates", 64),
+            idle_ttl=pool_config.get("idle_ttl", 600),
+        )
+    return _default_pool
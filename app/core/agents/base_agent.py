@@ -1,17 +1,99 @@
-from typing import List, Dict, Any, Optional, AsyncGenerator
-import httpx
+import asyncio
+import copy
+from pathlib import Path
+from typing import List, Dict, Any, Optional, AsyncGenerator, Awaitable, Callable, Iterable, Set, Tuple, Union
+
 from openai import AsyncOpenAI
-from pydantic import BaseModel
 
+from app.config.config_loader import config
+from app.core.agents.batch import BatchReport, BatchResult, BatchRunner
+from app.core.agents.history import HistoryPolicy, TokenCounter, build_history_policy
+from app.core.agents.message_buffer import Message, MessageBuffer, TokenPrefix
 from app.core.agents.model_config import ModelConfig
+from app.core.agents.tools import ToolCall, ToolExecutor, ToolRegistry, as_executor
+from app.core.llm.cache import CompletionCache, get_default_cache, make_cache_key, replay_completion
+from app.core.llm.client_registry import client_registry
+from app.core.llm.rate_limiter import (
+    PRIORITY_NORMAL, Admission, RateLimiter, default_completion_tokens, get_rate_limiter
+)
+from app.core.llm.resilience import ResilientExecutor, get_executor
+from app.core.llm.router import Endpoint, Router, get_default_router
+from app.core.llm.semantic_cache import SemanticCache, get_default_semantic_cache, last_user_prompt, scope_of
+from app.core.llm.single_flight import SingleFlight, aclose_quietly, get_default_single_flight
+from app.utils.metrics import GenerationMetrics
+from app.utils.tracing import SPAN_KIND_CLIENT, start_span
+
+
+# 只用于创建客户端、不作为请求参数发送的配置项
+_CLIENT_FIELDS = {"api_key", "api_base"}
+
+
+def _tool_calls_of(message: Any) -> List[ToolCall]:
+    """提取响应消息中的工具调用，兼容旧版 function_call"""
+    if message.tool_calls:
+        return [ToolCall(c.id, c.function.name, c.function.arguments) for c in message.tool_calls]
+    if getattr(message, "function_call", None):
+        return [ToolCall("", message.function_call.name, message.function_call.arguments)]
+    return []
+
+
+def _assistant_tool_message(message: Any) -> Message:
+    """将请求工具调用的响应消息转为历史消息"""
+    if message.tool_calls:
+        return Message(
+            role="assistant",
+            content=message.content or "",
+            tool_calls=[c.model_dump(exclude_none=True) for c in message.tool_calls],
+        )
+    return Message(role="assistant", content=message.content or "", function_call=message.function_call.model_dump())
+
 
+# 被丢弃的流式回复在后台关闭上游流，保留任务引用直到关闭完成
+_abandoned: Set[asyncio.Task] = set()
 
-class Message(BaseModel):
-    """对话消息类"""
-    role: str
-    content: str
-    name: Optional[str] = None
-    function_call: Optional[Dict[str, Any]] = None
+
+class StreamReply:
+    """流式回复的文本片段异步迭代器
+
+    包装读取上游流的异步生成器。异步生成器从未开始迭代时，aclose() 和垃圾回收都不会执行其 finally，
+    因此未开始读取就关闭或被丢弃时，由 on_abandon 关闭上游流并结束追踪。
+    """
+
+    def __init__(self, generator: AsyncGenerator[str, None], on_abandon: Callable[[], Awaitable[None]]):
+        self._generator = generator
+        self._on_abandon = on_abandon
+        self._started = False
+        self._closed = False
+
+    def __aiter__(self) -> "StreamReply":
+        return self
+
+    async def __anext__(self) -> str:
+        if self._closed:
+            raise StopAsyncIteration
+        self._started = True
+        return await self._generator.__anext__()
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._started:
+            await self._generator.aclose()
+        else:
+            await self._on_abandon()
+
+    def __del__(self) -> None:
+        # 已开始读取的生成器由事件循环的异步生成器钩子负责关闭
+        if self._started or self._closed:
+            return
+        self._closed = True
+        try:
+            task = asyncio.get_running_loop().create_task(self._on_abandon())
+        except RuntimeError:
+            return
+        _abandoned.add(task)
+        task.add_done_callback(_abandoned.discard)
 
 
 class BaseAgent:
@@ -23,33 +105,56 @@ class BaseAgent:
         self,
         model_config: ModelConfig,
         system_prompt: Optional[str] = None,
+        cache: Optional[CompletionCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        history_policy: Optional[HistoryPolicy] = None,
+        resilience: Optional[ResilientExecutor] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        agent_id: Optional[str] = None,
+        priority: int = PRIORITY_NORMAL,
+        router: Optional[Router] = None,
+        semantic_cache: Optional[SemanticCache] = None,
     ):
         """初始化Agent
         
         Args:
             model_config: 模型配置
             system_prompt: 系统提示词
+            cache: 补全结果缓存，为None时根据配置 llm.cache 决定是否使用共享缓存
+            single_flight: 请求合并器，为None时根据配置 llm.single_flight 决定是否使用共享实例
+            history_policy: 历史策略，为None时根据配置 agents.history 创建，未配置则发送全部历史
+            resilience: 容错执行器（重试、熔断、对冲），为None时使用 api_base 对应的共享执行器
+            rate_limiter: 限流器，为None时根据配置 llm.rate_limit 使用 (api_base, model) 对应的共享限流器
+            agent_id: Agent标识，用于限流时在Agent之间公平轮转，默认按实例生成
+            priority: 限流优先级，数值越小越优先
+            router: 多端点路由器，为None时根据配置 llm.router 决定；启用后请求在端点池中路由，
+                    ModelConfig 中的 api_base/model 仅用于缓存键
+            semantic_cache: 语义缓存，为None时根据配置 llm.semantic_cache 决定是否使用共享实例
         """
         self.model_config = model_config
-        self._messages: List[Message] = []
-        
-        # 创建httpx客户端，设置正确的超时和限制
-        http_client = httpx.AsyncClient(
-            timeout=60.0,
-            limits=httpx.Limits(
-                max_keepalive_connections=5,
-                max_connections=10,
-                keepalive_expiry=30
-            )
+        self._buffer = MessageBuffer()
+        # 由 ModelConfig 生成的请求参数模板，仅在配置版本变化时重建
+        self._params_template: Dict[str, Any] = {}
+        self._params_version = -1
+        self.cache = cache if cache is not None else get_default_cache()
+        self.semantic_cache = semantic_cache if semantic_cache is not None else get_default_semantic_cache()
+        self.single_flight = single_flight if single_flight is not None else get_default_single_flight()
+        self.history_policy = (
+            history_policy if history_policy is not None
+            else build_history_policy(config.get("agents", {}).get("history"))
         )
+        # 每条消息Token数的前缀和，按需增量计算
+        self._token_counter: Optional[TokenCounter] = None
+        self._token_prefix = TokenPrefix()
         
-        # 创建OpenAI客户端
-        self.client = AsyncOpenAI(
-            api_key=model_config.api_key,
-            base_url=model_config.api_base,
-            http_client=http_client,
-            timeout=60.0
+        self.resilience = resilience if resilience is not None else get_executor(model_config.api_base)
+        self.rate_limiter = (
+            rate_limiter if rate_limiter is not None
+            else get_rate_limiter(model_config.api_base, model_config.model)
         )
+        self.agent_id = agent_id or f"{self.__class__.__name__}-{id(self):x}"
+        self.router = router if router is not None else get_default_router()
+        self.priority = priority
         
         if system_prompt:
             self.add_message("system", system_prompt)
@@ -62,16 +167,121 @@ class BaseAgent:
             content: 消息内容
             name: 可选的名称
         """
-        self._messages.append(Message(role=role, content=content, name=name))
+        self._buffer.append(Message(role=role, content=content, name=name))
     
+    def fork(self) -> "BaseAgent":
+        """创建共享当前对话历史的分支
+
+        分支与原Agent结构共享已有的消息（不复制消息对象和序列化结果），之后各自新增的消息互不可见；
+        客户端、缓存、限流器等共享组件直接复用，模型配置复制一份，修改互不影响。
+
+        Returns:
+            BaseAgent: 新分支
+        """
+        child = copy.copy(self)
+        # 深复制：stop、functions 等列表字段被原地修改时也不影响其他分支
+        child.model_config = self.model_config.model_copy(deep=True)
+        child._params_version = -1
+        child._buffer = self._buffer.fork()
+        child._token_prefix = self._token_prefix.fork()
+        child.agent_id = f"{self.__class__.__name__}-{id(child):x}"
+        return child
+
+    def history_checkpoint(self) -> Tuple[MessageBuffer, TokenPrefix]:
+        """记录当前对话历史，之后可通过 restore_history 回滚（与当前历史结构共享，不复制消息和前缀和）"""
+        return self._buffer.fork(), self._token_prefix.fork()
+
+    def restore_history(self, checkpoint: Tuple[MessageBuffer, TokenPrefix]) -> None:
+        """将对话历史回滚到 history_checkpoint 记录的状态，同一检查点可多次回滚"""
+        buffer, prefix = checkpoint
+        self._buffer = buffer.fork()
+        self._token_prefix = prefix.fork()
+
     def clear_messages(self) -> None:
         """清空历史消息"""
-        self._messages.clear()
+        self._buffer.clear()
+        self._token_prefix = TokenPrefix()
+    
+    def token_prefix(self) -> TokenPrefix:
+        """获取历史消息Token数的前缀和
+        
+        只为上次计算之后新增的消息计数，prefix[i] 为前 i 条消息的Token总数。
+        
+        Returns:
+            TokenPrefix: 长度为消息数+1的前缀和序列
+        """
+        if self._token_counter is None:
+            self._token_counter = TokenCounter(self.model_config.model)
+        prefix = self._token_prefix
+        for msg in self._buffer.serialized(len(prefix) - 1):
+            prefix.append(prefix[-1] + self._token_counter.count_message(msg))
+        return prefix
+    
+    def compact_history(self, start: int, end: int, summary: str) -> None:
+        """将 [start, end) 范围内的消息替换为一条摘要系统消息
+        
+        Args:
+            start: 起始下标
+            end: 结束下标（不含）
+            summary: 摘要内容
+        """
+        self._buffer.replace(start, end, [Message(role="system", content=summary)])
+        # 被替换位置之后的前缀和失效，下次按需重新计算
+        self._token_prefix.truncate(start + 1)
+    
+    async def _history_for_request(self) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """按历史策略选出本次请求要发送的消息
+        
+        直接使用预序列化的消息字典，不发生逐条序列化；Token数由缓存的前缀和得出。
+        
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[int]]: (消息列表, 消息Token数)，
+            既无历史策略也无限流时不计算Token数，返回None
+        """
+        if self.history_policy is None:
+            if self.rate_limiter is None and self.router is None:
+                return self._buffer.serialized(), None
+            return self._buffer.serialized(), self.token_prefix()[-1]
+        pinned, start = await self.history_policy.select(self)
+        prefix = self.token_prefix()
+        if pinned >= start:
+            return self._buffer.serialized(), prefix[-1]
+        messages = self._buffer.serialized(0, pinned) + self._buffer.serialized(start)
+        return messages, prefix[pinned] + prefix[-1] - prefix[start]
     
+    @property
+    def client(self) -> AsyncOpenAI:
+        """共享的OpenAI客户端
+
+        每次从注册表获取，同一 (api_base, api_key) 复用同一连接池；连接池配置变化后自动使用新客户端，
+        长期存活的Agent不会继续向已停用的旧客户端发请求。
+        """
+        return client_registry.get_client(self.model_config.api_base, self.model_config.api_key)
+
     @property
     def messages(self) -> List[Dict[str, Any]]:
-        """获取消息历史"""
-        return [msg.dict(exclude_none=True) for msg in self._messages]
+        """获取消息历史（副本）"""
+        return [dict(msg) for msg in self._buffer.serialized()]
+    
+    def _request_template(self) -> Dict[str, Any]:
+        """获取由 ModelConfig 生成的请求参数模板，配置未变化时直接复用"""
+        version = self.model_config.version
+        if version != self._params_version:
+            self._params_template = self.model_config.model_dump(exclude=_CLIENT_FIELDS, exclude_none=True)
+            self._params_version = version
+        return self._params_template
+    
+    def _build_params(self, messages: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        """组装请求参数
+        
+        Args:
+            messages: 消息列表
+            **kwargs: 覆盖模板的其他参数
+        
+        Returns:
+            Dict[str, Any]: 传给 chat.completions.create 的参数
+        """
+        return {**self._request_template(), "messages": messages, **kwargs}
     
     async def _create_chat_completion(
         self,
@@ -81,23 +291,173 @@ class BaseAgent:
         """创建聊天完成
         
         Args:
-            messages: 消息列表，如果为None则使用历史消息
+            messages: 消息列表，如果为None则使用按历史策略选出的历史消息
             **kwargs: 其他参数
         
         Returns:
             OpenAI API的响应
         """
-        messages = messages or self.messages
-        params = {
-            "model": self.model_config.model,
-            "messages": messages,
-            "stream": self.model_config.stream,
-            **{k: v for k, v in self.model_config.dict().items() 
-               if k not in ["model", "stream", "api_key", "api_base"] and v is not None},
-            **kwargs
-        }
+        prompt_tokens = None
+        if not messages:
+            messages, prompt_tokens = await self._history_for_request()
+        params = self._build_params(messages, **kwargs)
+        
+        if self.cache is None and self.single_flight is None and self.semantic_cache is None:
+            return await self._fetch_completion(None, params, prompt_tokens)
+        
+        # 缓存键不区分是否流式，命中时按当前请求方式回放
+        key = make_cache_key(params, api_base=self.model_config.api_base)
+        if self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return self.cache.replay(cached, stream=params["stream"])
+        
+        semantic = None
+        if self.semantic_cache is not None:
+            semantic = await self._semantic_lookup(params)
+            if semantic is not None and semantic[2] is not None:
+                return replay_completion(semantic[2], stream=params["stream"])
+        
+        if self.single_flight is None:
+            response = await self._fetch_completion(key, params, prompt_tokens)
+        else:
+            # 相同请求并发到达时只向上游发起一次调用
+            response = await self.single_flight.do(
+                key,
+                lambda: self._fetch_completion(key, params, prompt_tokens),
+                stream=params["stream"]
+            )
+        if semantic is None:
+            return response
+        vector, scope, _ = semantic
+        prompt = params["messages"][-1]["content"]
+        if params["stream"]:
+            return self.semantic_cache.record_stream(vector, scope, prompt, response)
+        self.semantic_cache.add(vector, scope, prompt, response.model_dump())
+        return response
+    
+    async def _semantic_lookup(self, params: Dict[str, Any]) -> Optional[Tuple[Any, int, Optional[Dict[str, Any]]]]:
+        """在语义缓存中查找意思相近的提问
         
-        return await self.client.chat.completions.create(**params)
+        上下文（除最后一条用户消息外的全部请求参数）相同的条目才参与匹配；带工具的请求不使用语义缓存。
+        
+        Returns:
+            Optional[Tuple]: (提问向量, 上下文标识, 命中的回复或None)，不适用语义缓存时返回None
+        """
+        if "tools" in params or "functions" in params:
+            return None
+        prompt = last_user_prompt(params["messages"])
+        if prompt is None:
+            return None
+        context = {**params, "messages": params["messages"][:-1]}
+        scope = scope_of(make_cache_key(context, api_base=self.model_config.api_base))
+        vector = await self.semantic_cache.embed(prompt)
+        return vector, scope, self.semantic_cache.lookup(vector, scope)
+    
+    async def _fetch_completion(
+        self,
+        key: Optional[str],
+        params: Dict[str, Any],
+        prompt_tokens: Optional[int] = None
+    ) -> Any:
+        """向上游发起请求（经过重试、熔断和对冲），并在开启缓存时写入缓存
+        
+        Args:
+            key: 请求的缓存键，未开启缓存时为None
+            params: 请求参数
+            prompt_tokens: 消息Token数，用于限流预估，为None时现场计算
+        
+        Returns:
+            OpenAI API的响应
+        """
+        if self.router is not None:
+            admissions: Dict[str, Optional[Admission]] = {}
+
+            def admission(endpoint: Endpoint) -> Optional[Admission]:
+                # 同一端点在本次调用中的多次尝试共用一个准入
+                if endpoint.name not in admissions:
+                    admissions[endpoint.name] = self._admission(
+                        params, prompt_tokens, get_rate_limiter(endpoint.api_base, endpoint.model)
+                    )
+                return admissions[endpoint.name]
+
+            response = await self.router.call(
+                lambda endpoint: self._call_endpoint(endpoint, params, admission(endpoint)),
+                admit=admission,
+            )
+        else:
+            admission = self._admission(params, prompt_tokens, self.rate_limiter)
+            response = await self.resilience.call(lambda: self._call_upstream(params, admission), admit=admission)
+        if self.cache is None:
+            return response
+        if params["stream"]:
+            return self.cache.record_stream(key, response)
+        await self.cache.set(key, response.model_dump())
+        return response
+    
+    def _admission(
+        self,
+        params: Dict[str, Any],
+        prompt_tokens: Optional[int],
+        rate_limiter: Optional[RateLimiter]
+    ) -> Optional[Admission]:
+        """创建本次调用的限流准入，由容错执行器在计时和对冲之外调用，重试时每次都会重新准入
+        
+        Args:
+            params: 请求参数
+            prompt_tokens: 消息Token数，为None时现场计算
+            rate_limiter: 限流器，为None时不限流
+        
+        Returns:
+            Optional[Admission]: 未开启限流时返回None
+        """
+        if rate_limiter is None:
+            return None
+        if prompt_tokens is None:
+            if self._token_counter is None:
+                self._token_counter = TokenCounter(self.model_config.model)
+            prompt_tokens = sum(self._token_counter.count_message(m) for m in params["messages"])
+        estimated = prompt_tokens + (params.get("max_tokens") or default_completion_tokens())
+        return Admission(rate_limiter, estimated, self.agent_id, self.priority)
+    
+    async def _call_endpoint(
+        self,
+        endpoint: Endpoint,
+        params: Dict[str, Any],
+        admission: Optional[Admission] = None
+    ) -> Any:
+        """向路由器选中的端点发起一次调用，使用该端点的共享客户端"""
+        return await self._call_upstream(
+            {**params, "model": endpoint.model},
+            admission,
+            client=client_registry.get_client(endpoint.api_base, endpoint.api_key),
+        )
+    
+    async def _call_upstream(
+        self,
+        params: Dict[str, Any],
+        admission: Optional[Admission] = None,
+        client: Optional[Any] = None
+    ) -> Any:
+        """单次上游调用，限流准入已由容错执行器完成
+        
+        Args:
+            params: 请求参数
+            admission: 本次调用的限流准入，请求按实际用量结算其预留
+            client: 使用的客户端，默认为Agent自身的客户端
+        
+        Returns:
+            OpenAI API的响应
+        """
+        client = client or self.client
+        reservation = admission.take() if admission is not None else None
+        with start_span("llm.request", SPAN_KIND_CLIENT, model=params.get("model"), api_base=str(client.base_url)):
+            response = await client.chat.completions.create(**params)
+        # 非流式响应带有实际用量，按实际用量结算；流式响应保留预估值
+        usage = getattr(response, "usage", None)
+        if reservation is not None and usage is not None:
+            reservation.settle(usage.total_tokens)
+        return response
     
     async def generate(
         self,
@@ -109,7 +469,7 @@ class BaseAgent:
         
         Args:
             prompt: 提示词
-            stream: 是否使用流式响应，覆盖配置中的设置
+            stream: 是否使用流式响应，只对本次请求覆盖配置中的设置，不修改 model_config
             **kwargs: 其他参数
         
         Returns:
@@ -117,29 +477,181 @@ class BaseAgent:
         """
         self.add_message("user", prompt)
         
-        if stream is not None:
-            self.model_config.stream = stream
+        if stream is None:
+            stream = self.model_config.stream
         
-        response = await self._create_chat_completion(**kwargs)
+        metrics = GenerationMetrics(self.model_config.model, stream)
+        with start_span(
+            "agent.generate", agent=self.agent_id, model=self.model_config.model, stream=stream
+        ) as span:
+            try:
+                response = await self._create_chat_completion(**{**kwargs, "stream": stream})
+            except BaseException as e:
+                metrics.fail(e)
+                raise
+            if stream:
+                # 流式响应读取完毕时才结束
+                span.detach()
         
-        if self.model_config.stream:
+        if stream:
             full_content = []  # 使用列表存储内容片段，避免频繁的字符串拼接
             async def response_generator() -> AsyncGenerator[str, None]:
                 nonlocal full_content
-                async for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        yield content  # 先yield确保实时性
-                        full_content.append(content)  # 后存储内容
+                completed = False
+                try:
+                    async for chunk in response:
+                        # 开启 stream_options.include_usage 时最后一个分片带有用量且没有 choices
+                        metrics.usage(getattr(chunk, "usage", None))
+                        if chunk.choices and chunk.choices[0].delta.content is not None:
+                            content = chunk.choices[0].delta.content
+                            metrics.token()
+                            yield content  # 先yield确保实时性
+                            full_content.append(content)  # 后存储内容
+                    completed = True
+                    metrics.finish()
+                except BaseException as e:
+                    metrics.fail(e)
+                    span.record_exception(e)
+                    raise
+                finally:
+                    span.end()
+                    if not completed:
+                        # 调用方中途放弃（如客户端断开），关闭上游流以释放连接
+                        await aclose_quietly(response)
                 # 流式响应结束后，将完整内容添加到消息历史
                 self.add_message("assistant", "".join(full_content))
-            return response_generator()
+
+            async def abandon() -> None:
+                metrics.fail(GeneratorExit())
+                span.end()
+                await aclose_quietly(response)
+
+            return StreamReply(response_generator(), abandon)
         else:
+            metrics.token()
+            metrics.usage(getattr(response, "usage", None))
+            metrics.finish()
             content = response.choices[0].message.content
             self.add_message("assistant", content)
             return content
-            
+
+    async def generate_with_tools(
+        self,
+        prompt: str,
+        tools: Union[ToolRegistry, ToolExecutor],
+        max_rounds: Optional[int] = None,
+        **kwargs
+    ) -> str:
+        """带工具调用的生成（非流式）
+
+        模型一轮返回的多个工具调用并发执行，全部结果在下一次请求中一起回传；
+        最后一轮禁止继续调用工具，强制模型给出回答。
+
+        Args:
+            prompt: 提示词
+            tools: 工具注册表或执行器（传入执行器可跨调用共享幂等结果缓存）
+            max_rounds: 最多调用工具的轮数，默认取 agents.tools.max_rounds
+            **kwargs: 其他参数（其中的 stream、tools、tool_choice 会被忽略）
+
+        Returns:
+            str: 最终回复
+        """
+        executor = as_executor(tools)
+        if max_rounds is None:
+            max_rounds = (config.get("agents", {}).get("tools", {}) or {}).get("max_rounds", 5)
+        schemas = executor.registry.schemas()
+        self.add_message("user", prompt)
+
+        with start_span("agent.generate_with_tools", agent=self.agent_id, model=self.model_config.model) as span:
+            for round_index in range(max_rounds + 1):
+                metrics = GenerationMetrics(self.model_config.model, False)
+                try:
+                    response = await self._create_chat_completion(**{
+                        **kwargs,
+                        "stream": False,
+                        "tools": schemas,
+                        "tool_choice": "auto" if round_index < max_rounds else "none",
+                    })
+                except BaseException as e:
+                    metrics.fail(e)
+                    raise
+                metrics.token()
+                metrics.usage(getattr(response, "usage", None))
+                metrics.finish()
+
+                message = response.choices[0].message
+                calls = _tool_calls_of(message)
+                if not calls:
+                    span.set_attribute("rounds", round_index)
+                    content = message.content or ""
+                    self.add_message("assistant", content)
+                    return content
+
+                # 全部工具结果就绪后再与工具调用消息一起写入历史：执行失败或被取消时
+                # 不留下没有结果的工具调用消息，否则之后的请求会被服务端拒绝
+                results = await executor.execute_many(calls)
+                # 中间的工具调用和结果只进入内存历史，不经过 add_message
+                self._buffer.append(_assistant_tool_message(message))
+                for result in results:
+                    if message.tool_calls:
+                        self._buffer.append(
+                            Message(role="tool", content=result.content, tool_call_id=result.call.id)
+                        )
+                    else:
+                        self._buffer.append(Message(role="function", content=result.content, name=result.call.name))
+        raise RuntimeError(f"超过最大工具调用轮数: {max_rounds}")
+
+    def map(
+        self,
+        prompts: Iterable[str],
+        concurrency: Optional[int] = None,
+        checkpoint_path: Optional[Union[str, Path]] = None,
+        ordered: bool = False,
+        **kwargs
+    ) -> AsyncGenerator[BatchResult, None]:
+        """对一组独立的提示词并发执行无状态补全，流式返回结果
+        
+        每条提示词只携带系统提示词，不读取也不修改对话历史。
+        结果只通过生成器返回，不在内存中累积；需要全部结果时使用 generate_batch()。
+        
+        Args:
+            prompts: 提示词序列
+            concurrency: 最大并发数，默认取 agents.max_agents
+            checkpoint_path: JSONL 检查点路径，重新运行时跳过已成功的条目
+            ordered: 为True时按输入顺序返回，否则按完成顺序返回
+            **kwargs: 其他请求参数
+        
+        Returns:
+            AsyncGenerator[BatchResult, None]: 结果异步生成器
+        """
+        return BatchRunner(self, prompts, concurrency, checkpoint_path, ordered, **kwargs).stream()
+    
+    async def generate_batch(
+        self,
+        prompts: Iterable[str],
+        concurrency: Optional[int] = None,
+        checkpoint_path: Optional[Union[str, Path]] = None,
+        **kwargs
+    ) -> BatchReport:
+        """批量生成并返回按输入顺序排列的全部结果及吞吐统计
+        
+        Args:
+            prompts: 提示词序列
+            concurrency: 最大并发数，默认取 agents.max_agents
+            checkpoint_path: JSONL 检查点路径，重新运行时跳过已成功的条目
+            **kwargs: 其他请求参数
+        
+        Returns:
+            BatchReport: 批量生成报告
+        """
+        runner = BatchRunner(self, prompts, concurrency, checkpoint_path, keep_results=True, **kwargs)
+        async for _ in runner.stream():
+            pass
+        return runner.report
+    
     async def close(self):
-        """关闭客户端"""
-        await self.client.close()        # 关闭底层的httpx客户端
-        await self.client.http_client.aclose()
+        """释放Agent资源
+
+        共享客户端及连接池由 client_registry 统一管理（在应用 lifespan 中关闭），
+        此处不会关闭，避免影响其他Agent。
+        """
@@ -0,0 +1,230 @@
+"""
+批量生成
+- 对大量相互独立的提示词并发执行无状态补全，不修改Agent的对话历史
+- 使用固定数量的工作协程（默认 agents.max_agents）控制并发，结果队列容量与并发数相同，调用方读取慢时工作协程暂停
+- map() 只保留统计计数，内存占用与输入规模无关（ordered=True 时另需暂存先于前序条目完成的结果）；
+  generate_batch() 需要返回全部结果，内存随输入规模增长
+- 结果可按完成顺序或输入顺序流式返回，并可写入 JSONL 检查点，中断后重新运行会跳过已完成的条目
+- 结束时输出吞吐量统计
+"""
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, Iterable, List, Optional, Union
+
+from app.config.config_loader import config
+from app.utils.logger import logger
+
+if TYPE_CHECKING:
+    from app.core.agents.base_agent import BaseAgent
+
+
+@dataclass
+class BatchResult:
+    """单条提示词的生成结果"""
+    index: int
+    prompt: str
+    content: Optional[str] = None
+    error: Optional[str] = None
+    resumed: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchReport:
+    """批量生成报告
+
+    results 只在 generate_batch() 中收集，map() 的报告只有统计计数。
+    """
+    results: List[BatchResult] = field(default_factory=list)
+    elapsed: float = 0.0
+    completed: int = 0
+    failed: int = 0
+    resumed: int = 0
+
+    def add(self, result: BatchResult, keep: bool) -> None:
+        """计入一条结果，keep 为True时保留结果本身"""
+        if result.ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        if result.resumed:
+            self.resumed += 1
+        if keep:
+            self.results.append(result)
+
+    @property
+    def throughput(self) -> float:
+        """本次实际执行的条目每秒完成数（不含从检查点恢复的条目）"""
+        executed = self.completed + self.failed - self.resumed
+        return executed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+class _Checkpoint:
+    """JSONL 检查点，每完成一条追加一行"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = None
+
+    def load(self) -> Dict[int, Dict[str, Any]]:
+        """读取已成功完成的条目"""
+        done: Dict[int, Dict[str, Any]] = {}
+        if not self.path.exists():
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程中断时最后一行可能不完整
+                    continue
+                if record.get("error") is None:
+                    done[record["index"]] = record
+        return done
+
+    def write(self, result: BatchResult) -> None:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        record = {
+            "index": result.index,
+            "prompt_hash": _prompt_hash(result.prompt),
+            "content": result.content,
+            "error": result.error,
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BatchRunner:
+    """批量生成执行器
+
+    通过 BaseAgent.map() / BaseAgent.generate_batch() 使用。
+    """
+
+    def __init__(
+        self,
+        agent: "BaseAgent",
+        prompts: Iterable[str],
+        concurrency: Optional[int] = None,
+        checkpoint_path: Optional[Union[str, Path]] = None,
+        ordered: bool = False,
+        keep_results: bool = False,
+        **kwargs
+    ):
+        """
+        Args:
+            agent: 执行补全的Agent，只使用其系统提示词和模型配置
+            prompts: 提示词序列
+            concurrency: 最大并发数，默认取 agents.max_agents
+            checkpoint_path: JSONL 检查点路径，为None时不写检查点
+            ordered: 是否按输入顺序返回结果
+            keep_results: 是否在报告中保留全部结果
+            **kwargs: 传给 chat.completions.create 的其他参数
+        """
+        self.agent = agent
+        self.prompts = prompts
+        self.concurrency = concurrency or config.get("agents", {}).get("max_agents", 10)
+        self.checkpoint = _Checkpoint(checkpoint_path) if checkpoint_path else None
+        self.ordered = ordered
+        self.keep_results = keep_results
+        self.kwargs = kwargs
+        self.report = BatchReport()
+
+    async def _complete(self, index: int, prompt: str, system: List[Dict[str, Any]]) -> BatchResult:
+        try:
+            response = await self.agent._create_chat_completion(
+                messages=system + [{"role": "user", "content": prompt}],
+                **{**self.kwargs, "stream": False},
+            )
+            return BatchResult(index=index, prompt=prompt, content=response.choices[0].message.content)
+        except Exception as e:
+            logger.warning(f"批量生成第 {index} 条失败: {e}")
+            return BatchResult(index=index, prompt=prompt, error=str(e) or e.__class__.__name__)
+
+    async def stream(self) -> AsyncGenerator[BatchResult, None]:
+        """执行批量生成并流式返回结果
+
+        Yields:
+            BatchResult: 按完成顺序（ordered=True 时按输入顺序）返回的结果
+        """
+        done = self.checkpoint.load() if self.checkpoint else {}
+        # 无状态补全只携带开头的系统提示词
+        system = []
+        for message in self.agent._buffer.serialized():
+            if message["role"] != "system":
+                break
+            system.append(message)
+
+        # 有界队列：调用方读取慢时工作协程阻塞在 put 上，不再继续发起请求
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        items = enumerate(self.prompts)
+        failures: List[BaseException] = []
+
+        async def worker() -> None:
+            try:
+                for index, prompt in items:
+                    record = done.get(index)
+                    if record is not None and record.get("prompt_hash") == _prompt_hash(prompt):
+                        result = BatchResult(index=index, prompt=prompt, content=record["content"], resumed=True)
+                    else:
+                        result = await self._complete(index, prompt, system)
+                        if self.checkpoint:
+                            self.checkpoint.write(result)
+                    await queue.put(result)
+            except Exception as e:
+                failures.append(e)
+            # 每个工作协程结束时放入一个结束标记
+            await queue.put(None)
+
+        start = time.perf_counter()
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+
+        pending: Dict[int, BatchResult] = {}
+        next_index = 0
+        running = len(workers)
+        try:
+            while running:
+                result = await queue.get()
+                if result is None:
+                    running -= 1
+                    continue
+                self.report.add(result, self.keep_results)
+                if not self.ordered:
+                    yield result
+                    continue
+                pending[result.index] = result
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+            # 传播工作协程中的意外异常
+            if failures:
+                raise failures[0]
+        finally:
+            for task in workers:
+                task.cancel()
+            if self.checkpoint:
+                self.checkpoint.close()
+            self.report.elapsed = time.perf_counter() - start
+            self.report.results.sort(key=lambda r: r.index)
+            logger.info(
+                f"批量生成结束: 成功 {self.report.completed} 条, 失败 {self.report.failed} 条, "
+                f"从检查点恢复 {self.report.resumed} 条, 耗时 {self.report.elapsed:.2f}s, "
+                f"吞吐 {self.report.throughput:.2f} 条/秒"
+            )
@@ -0,0 +1,144 @@
+"""
+绑定会话的Agent
+- 历史在首次生成前从会话后端懒加载（最近 session.history_limit 条）
+- 一轮对话（用户消息 + 助手回复）完整结束后才写入后端并等待其对其他进程可见，
+  下一轮可以由任意工作进程处理；失败或中途取消的轮次不会写入
+- 系统提示词不写入会话
+- fork(session_id) 创建写入新会话的分支，分支首次保存时先写入继承的历史；
+  不传 session_id 时分支只在内存中继续对话，不写入任何会话（如 serve_agent 为每个请求创建的分支）
+"""
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from app.config.config_loader import config
+from app.core.agents.base_agent import BaseAgent, StreamReply
+from app.core.agents.model_config import ModelConfig
+from app.core.agents.session_backend import SessionBackend, get_session_backend
+
+
+class ConversationAgent(BaseAgent):
+    """绑定持久化会话的Agent"""
+
+    def __init__(
+        self,
+        model_config: ModelConfig,
+        session_id: str,
+        system_prompt: Optional[str] = None,
+        backend: Optional[SessionBackend] = None,
+        history_limit: Optional[int] = None,
+        **kwargs
+    ):
+        """
+        Args:
+            model_config: 模型配置
+            session_id: 会话ID
+            system_prompt: 系统提示词
+            backend: 会话后端，默认根据配置 session.backend 使用共享后端
+            history_limit: 懒加载的最近消息条数，默认取 session.history_limit
+            **kwargs: 传给 BaseAgent 的其他参数
+        """
+        self.session_id = session_id
+        self.backend = backend or get_session_backend()
+        if history_limit is None:
+            history_limit = (config.get("session", {}) or {}).get("history_limit", 50)
+        self.history_limit = history_limit
+        self._loaded = False
+        # 懒加载历史的来源会话，分支在加载前沿用原会话
+        self._history_source = session_id
+        # 分支首次保存时需要先写入继承的历史
+        self._copy_history = False
+        # 本轮新增、尚未写入后端的消息
+        self._unsaved: List[Dict[str, Any]] = []
+        super().__init__(model_config, system_prompt=system_prompt, **kwargs)
+
+    async def load_history(self) -> None:
+        """从会话后端加载历史，只执行一次"""
+        if self._loaded:
+            return
+        for message in await self.backend.load(self._history_source, self.history_limit):
+            super().add_message(message["role"], message["content"], message.get("name"))
+        self._loaded = True
+
+    def add_message(self, role: str, content: str, name: Optional[str] = None) -> None:
+        super().add_message(role, content, name)
+        if self._loaded:
+            message = {"role": role, "content": content}
+            if name is not None:
+                message["name"] = name
+            self._unsaved.append(message)
+
+    def fork(self, session_id: Optional[str] = None) -> "ConversationAgent":
+        """创建分支
+
+        分支与当前Agent共享已有的对话历史；首次保存时将继承的历史（不含系统消息和中间的工具调用消息）
+        连同本轮消息一起写入新会话，之后只写入新增的轮次。
+
+        Args:
+            session_id: 分支使用的新会话ID，为None时分支不写入任何会话
+        """
+        child = super().fork()
+        child.session_id = session_id
+        child._unsaved = []
+        child._copy_history = session_id is not None
+        return child
+
+    def history_checkpoint(self):
+        return super().history_checkpoint(), self._loaded
+
+    def restore_history(self, checkpoint) -> None:
+        """回滚对话历史；检查点在懒加载之前记录时，下次生成重新加载"""
+        base, self._loaded = checkpoint
+        super().restore_history(base)
+        self._unsaved.clear()
+
+    def _persisted_history(self) -> List[Dict[str, Any]]:
+        """缓冲区中会写入会话的消息"""
+        messages = []
+        for message in self._buffer:
+            if message.role in ("system", "tool", "function") or message.tool_calls:
+                continue
+            entry = {"role": message.role, "content": message.content}
+            if message.name is not None:
+                entry["name"] = message.name
+            messages.append(entry)
+        return messages
+
+    async def save(self) -> None:
+        """写入本轮新增的消息，并等待其对其他进程可见"""
+        messages, self._unsaved = self._unsaved, []
+        if self.session_id is None:
+            # 不写入会话的分支
+            return
+        if self._copy_history:
+            # 分支的新会话中还没有继承的历史，本轮消息已包含在缓冲区中
+            messages = self._persisted_history()
+            self._copy_history = False
+        if messages:
+            await self.backend.append(self.session_id, messages)
+            await self.backend.flush(self.session_id)
+
+    async def generate(self, prompt: str, stream: Optional[bool] = None, **kwargs):
+        await self.load_history()
+        # 上一轮未完成时留下的消息不写入后端
+        self._unsaved.clear()
+        result = await super().generate(prompt, stream=stream, **kwargs)
+        if self.model_config.stream if stream is None else stream:
+            return StreamReply(self._save_when_done(result), result.aclose)
+        await self.save()
+        return result
+
+    async def generate_with_tools(self, prompt: str, tools, max_rounds: Optional[int] = None, **kwargs) -> str:
+        """带工具调用的生成，只写入用户消息和最终回复，中间的工具调用和结果不写入会话"""
+        await self.load_history()
+        self._unsaved.clear()
+        result = await super().generate_with_tools(prompt, tools, max_rounds=max_rounds, **kwargs)
+        await self.save()
+        return result
+
+    async def _save_when_done(self, chunks: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+        """流式回复完整结束后写入本轮消息"""
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+        await self.save()
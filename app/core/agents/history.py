@@ -0,0 +1,278 @@
+"""
+对话历史策略
+- 在每次调用 _create_chat_completion 前决定发送哪些历史消息
+- 支持滑动窗口、Token预算、摘要压缩三种策略，均默认置顶开头的系统提示词
+- 裁剪和压缩不拆开工具调用消息与其工具结果
+- Token数按消息缓存在 BaseAgent 中（前缀和），新增消息只需计算增量，裁剪通过二分查找完成
+- 优先使用 tiktoken 本地分词，未安装时使用按字符估算的方式
+"""
+import json
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.llm.cache import make_cache_key
+from app.utils.logger import logger
+
+if TYPE_CHECKING:
+    from app.core.agents.base_agent import BaseAgent
+
+
+# 每条消息的格式开销（role、分隔符等），参考 OpenAI 的计数方式
+_TOKENS_PER_MESSAGE = 4
+# 工具（函数）调用结果消息的角色，必须紧跟在请求调用的 assistant 消息之后
+_RESULT_ROLES = ("tool", "function")
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """获取模型对应的 tiktoken 编码，未安装 tiktoken 或无法加载编码文件（如离线环境）时返回None"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"加载 tiktoken 编码失败，使用字符估算Token数: {e}")
+        return None
+
+
+class TokenCounter:
+    """本地Token计数器"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self._encoding = _get_encoding(model)
+        if self._encoding is None:
+            logger.debug("tiktoken 不可用，使用字符估算Token数")
+
+    def count_text(self, text: Optional[str]) -> int:
+        """计算文本的Token数
+
+        Args:
+            text: 文本内容
+
+        Returns:
+            int: Token数
+        """
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        # 估算：CJK字符约1个Token，其余字符约4个字符1个Token
+        cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        """计算单条消息的Token数
+
+        Args:
+            message: 序列化后的消息字典
+
+        Returns:
+            int: Token数
+        """
+        tokens = _TOKENS_PER_MESSAGE + self.count_text(message.get("content"))
+        if message.get("name"):
+            tokens += self.count_text(message["name"])
+        if message.get("function_call"):
+            tokens += self.count_text(json.dumps(message["function_call"], ensure_ascii=False))
+        if message.get("tool_calls"):
+            tokens += self.count_text(json.dumps(message["tool_calls"], ensure_ascii=False))
+        return tokens
+
+
+class HistoryPolicy(ABC):
+    """历史策略基类
+
+    select 返回 (置顶消息数, 保留起始下标)，
+    实际发送的消息为 messages[:pinned] + messages[start:]。
+    """
+
+    def __init__(self, pin_system: bool = True):
+        self.pin_system = pin_system
+
+    def _pinned(self, agent: "BaseAgent") -> int:
+        """开头的系统提示词数量"""
+        if not self.pin_system:
+            return 0
+        pinned = 0
+        for message in agent._buffer:
+            if message.role != "system":
+                break
+            pinned += 1
+        return pinned
+
+    @staticmethod
+    def _align(agent: "BaseAgent", pinned: int, start: int) -> int:
+        """调整保留起点，使工具结果与产生它们的工具调用消息一起保留或一起丢弃
+
+        起点落在工具结果上时跳过这组结果；这组结果是最新的消息（模型正要读取）时，
+        改为退回到对应的工具调用消息。否则请求以没有工具调用的工具结果开头，会被服务端拒绝。
+        """
+        buffer = agent._buffer
+        end = start
+        while end < len(buffer) and buffer[end].role in _RESULT_ROLES:
+            end += 1
+        if end == start or end < len(buffer):
+            return end
+        while start > pinned and buffer[start].role in _RESULT_ROLES:
+            start -= 1
+        return start
+
+    @abstractmethod
+    async def select(self, agent: "BaseAgent") -> Tuple[int, int]:
+        """返回 (置顶消息数, 保留起始下标)"""
+
+
+class SlidingWindowPolicy(HistoryPolicy):
+    """滑动窗口策略，只保留最近的若干条消息"""
+
+    def __init__(self, max_messages: int, pin_system: bool = True):
+        super().__init__(pin_system)
+        self.max_messages = max_messages
+
+    async def select(self, agent: "BaseAgent") -> Tuple[int, int]:
+        pinned = self._pinned(agent)
+        start = max(pinned, len(agent._buffer) - self.max_messages)
+        return pinned, self._align(agent, pinned, start)
+
+
+class TokenBudgetPolicy(HistoryPolicy):
+    """Token预算策略，在预算内保留尽可能多的最近消息"""
+
+    def __init__(self, max_tokens: int, reserve_tokens: Optional[int] = None, pin_system: bool = True):
+        """
+        Args:
+            max_tokens: 上下文窗口Token上限
+            reserve_tokens: 为回复预留的Token数，为None时使用 ModelConfig.max_tokens
+            pin_system: 是否始终保留开头的系统提示词
+        """
+        super().__init__(pin_system)
+        self.max_tokens = max_tokens
+        self.reserve_tokens = reserve_tokens
+
+    def _budget(self, agent: "BaseAgent") -> int:
+        reserve = self.reserve_tokens
+        if reserve is None:
+            reserve = agent.model_config.max_tokens or 0
+        return self.max_tokens - reserve
+
+    async def select(self, agent: "BaseAgent") -> Tuple[int, int]:
+        pinned = self._pinned(agent)
+        prefix = agent.token_prefix()
+        total = len(prefix) - 1
+        budget = self._budget(agent) - prefix[pinned]
+        # 二分查找满足 prefix[total] - prefix[start] <= budget 的最小 start
+        start = bisect_left(prefix, prefix[total] - budget, lo=pinned, hi=total)
+        # 至少保留最后一条消息
+        if total > pinned:
+            start = min(start, total - 1)
+        return pinned, self._align(agent, pinned, start)
+
+
+SummarizeFunc = Callable[["BaseAgent", List[Dict[str, Any]]], Awaitable[str]]
+
+
+async def summarize_with_agent(agent: "BaseAgent", messages: List[Dict[str, Any]]) -> str:
+    """默认摘要函数：使用Agent自身的模型总结对话
+
+    与普通请求一样经过限流、重试熔断和多端点路由。
+    """
+    transcript = "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in messages)
+    params = {
+        "model": agent.model_config.model,
+        "messages": [
+            {"role": "system", "content": "请用简洁的中文总结以下对话的要点，保留关键事实、结论和未完成的事项。"},
+            {"role": "user", "content": transcript},
+        ],
+        "stream": False,
+    }
+    key = make_cache_key(params, api_base=agent.model_config.api_base) if agent.cache is not None else None
+    response = await agent._fetch_completion(key, params)
+    return response.choices[0].message.content or ""
+
+
+class SummarizingPolicy(TokenBudgetPolicy):
+    """摘要压缩策略
+
+    历史超出预算时，将较早的对话压缩成一条摘要消息写回历史，
+    之后再按Token预算裁剪，保证请求不超出上下文窗口。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        keep_recent_tokens: Optional[int] = None,
+        summarizer: Optional[SummarizeFunc] = None,
+        reserve_tokens: Optional[int] = None,
+        pin_system: bool = True,
+    ):
+        """
+        Args:
+            max_tokens: 上下文窗口Token上限
+            keep_recent_tokens: 不参与压缩的最近消息Token数，默认为预算的一半
+            summarizer: 摘要函数，默认使用Agent自身的模型
+            reserve_tokens: 为回复预留的Token数
+            pin_system: 是否始终保留开头的系统提示词
+        """
+        super().__init__(max_tokens, reserve_tokens, pin_system)
+        self.keep_recent_tokens = keep_recent_tokens
+        self.summarizer = summarizer or summarize_with_agent
+
+    async def select(self, agent: "BaseAgent") -> Tuple[int, int]:
+        pinned = self._pinned(agent)
+        prefix = agent.token_prefix()
+        total = len(prefix) - 1
+        budget = self._budget(agent) - prefix[pinned]
+        if prefix[total] - prefix[pinned] > budget:
+            keep_recent = self.keep_recent_tokens or budget // 2
+            split = bisect_left(prefix, prefix[total] - keep_recent, lo=pinned, hi=total)
+            # 工具调用消息和它的结果一起压缩或一起保留
+            split = self._align(agent, pinned, split)
+            if split - pinned >= 2:
+                older = agent._buffer.serialized(pinned, split)
+                try:
+                    summary = await self.summarizer(agent, older)
+                    agent.compact_history(pinned, split, f"以下是之前对话的摘要：\n{summary}")
+                    logger.info(f"历史消息已压缩: {split - pinned} 条消息合并为摘要")
+                except Exception as e:
+                    logger.warning(f"历史消息压缩失败，改为直接裁剪: {e}")
+        return await super().select(agent)
+
+
+def build_history_policy(settings: Optional[Dict[str, Any]]) -> Optional[HistoryPolicy]:
+    """根据配置 agents.history 创建历史策略
+
+    Args:
+        settings: 配置字典，如 {"policy": "token_budget", "max_tokens": 6000}
+
+    Returns:
+        Optional[HistoryPolicy]: 未配置时返回None（发送全部历史）
+    """
+    if not settings or not settings.get("policy"):
+        return None
+    policy = settings["policy"]
+    pin_system = settings.get("pin_system", True)
+    if policy == "sliding_window":
+        return SlidingWindowPolicy(settings.get("max_messages", 20), pin_system=pin_system)
+    if policy == "token_budget":
+        return TokenBudgetPolicy(
+            settings.get("max_tokens", 4096),
+            reserve_tokens=settings.get("reserve_tokens"),
+            pin_system=pin_system,
+        )
+    if policy == "summarize":
+        return SummarizingPolicy(
+            settings.get("max_tokens", 4096),
+            keep_recent_tokens=settings.get("keep_recent_tokens"),
+            reserve_tokens=settings.get("reserve_tokens"),
+            pin_system=pin_system,
+        )
+    raise ValueError(f"未知的历史策略: {policy}")
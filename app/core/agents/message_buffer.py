@@ -0,0 +1,186 @@
+"""
+对话消息与追加写消息缓冲区
+- Message 在追加时只序列化一次，之后的每次请求直接复用预序列化的字典
+- 请求热路径按下标切片取用，不再逐条调用 pydantic 序列化
+- 分支（fork）与原缓冲区结构共享分叉点之前的消息，每个分支只保存分叉后新增的消息
+- TokenPrefix 以同样的写时复制方式保存消息Token数的前缀和，分支不复制已计算的部分
+"""
+from itertools import chain, islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+class Message(BaseModel):
+    """对话消息类"""
+    role: str
+    content: str
+    name: Optional[str] = None
+    function_call: Optional[Dict[str, Any]] = None
+    # 模型请求的工具调用（assistant 消息）及工具结果对应的调用ID（tool 消息）
+    tool_calls: Optional[List[Dict[str, Any]]] = None
+    tool_call_id: Optional[str] = None
+
+
+class MessageBuffer:
+    """追加写的消息缓冲区
+
+    同时保存 Message 对象及其序列化结果。序列化字典在缓冲区内共享，
+    调用方不应修改 serialized() 返回的字典。
+
+    fork() 得到的缓冲区与原缓冲区共享分叉点之前的消息（写时复制）：
+    共享的列表只会被追加，分叉后各自新增的消息互不可见；
+    replace / clear 等非追加修改会先复制出独立的列表，不影响其他分支。
+    """
+
+    def __init__(self):
+        self._messages: List[Message] = []
+        self._serialized: List[Dict[str, Any]] = []
+        # 分叉时继承的前缀：(消息列表, 序列化列表, 长度)，列表与其他缓冲区共享
+        self._base: Optional[Tuple[List[Message], List[Dict[str, Any]], int]] = None
+        # 自身的列表是否被分支引用为前缀
+        self._shared = False
+
+    def append(self, message: Message) -> None:
+        """追加一条消息"""
+        self._messages.append(message)
+        self._serialized.append(message.model_dump(exclude_none=True))
+
+    def fork(self) -> "MessageBuffer":
+        """创建共享当前全部消息的分支，不复制消息对象和序列化字典"""
+        if self._messages and self._base is not None:
+            # 前缀和自身消息合并为一个列表（只复制引用），之后的分支直接共享该列表
+            self._own()
+        child = MessageBuffer()
+        if self._messages:
+            child._base = (self._messages, self._serialized, len(self._messages))
+            self._shared = True
+        else:
+            child._base = self._base
+        return child
+
+    def _own(self) -> None:
+        """复制出不与其他缓冲区共享的列表"""
+        self._messages = list(self)
+        self._serialized = self.serialized(0, len(self))
+        self._base = None
+        self._shared = False
+
+    def replace(self, start: int, end: int, messages: List[Message]) -> None:
+        """将 [start, end) 范围内的消息替换为新消息"""
+        if self._base is not None or self._shared:
+            self._own()
+        self._messages[start:end] = messages
+        self._serialized[start:end] = [m.model_dump(exclude_none=True) for m in messages]
+
+    def clear(self) -> None:
+        """清空缓冲区"""
+        self._messages = []
+        self._serialized = []
+        self._base = None
+        self._shared = False
+
+    def serialized(self, start: int = 0, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取预序列化的消息字典
+
+        Args:
+            start: 起始下标
+            end: 结束下标（不含），为None表示到末尾
+
+        Returns:
+            List[Dict[str, Any]]: 消息字典列表；没有继承前缀且不带参数时直接返回内部列表，避免复制
+        """
+        if self._base is None:
+            if start == 0 and end is None:
+                return self._serialized
+            return self._serialized[start:end]
+        _, base, length = self._base
+        end = len(self) if end is None else end
+        if end <= length:
+            return base[start:end]
+        return base[start:length] + self._serialized[max(start - length, 0):end - length]
+
+    def __len__(self) -> int:
+        return len(self._messages) + (self._base[2] if self._base is not None else 0)
+
+    def __getitem__(self, index):
+        if self._base is None:
+            return self._messages[index]
+        if isinstance(index, slice):
+            return list(self)[index]
+        base, _, length = self._base
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        return base[index] if index < length else self._messages[index - length]
+
+    def __iter__(self):
+        if self._base is None:
+            return iter(self._messages)
+        base, _, length = self._base
+        return chain(islice(base, length), self._messages)
+
+
+class TokenPrefix:
+    """消息Token数的前缀和，prefix[i] 为前 i 条消息的Token总数
+
+    与 MessageBuffer 一样写时复制：fork() 得到的对象与原对象共享分叉点之前的前缀和，
+    之后各自追加的部分互不可见；truncate 不修改共享的列表。支持下标访问，可直接用于 bisect。
+    """
+
+    def __init__(self):
+        self._values: List[int] = [0]
+        # 分叉时继承的前缀：(列表, 长度)，列表与其他对象共享
+        self._base: Optional[Tuple[List[int], int]] = None
+        # 自身的列表是否被分支引用为前缀
+        self._shared = False
+
+    def append(self, value: int) -> None:
+        self._values.append(value)
+
+    def fork(self) -> "TokenPrefix":
+        """创建共享当前全部前缀和的分支"""
+        if self._values and self._base is not None:
+            self._values = list(self)
+            self._base = None
+        child = TokenPrefix()
+        child._values = []
+        if self._values:
+            child._base = (self._values, len(self._values))
+            self._shared = True
+        else:
+            child._base = self._base
+        return child
+
+    def truncate(self, length: int) -> None:
+        """只保留前 length 项"""
+        base_length = self._base[1] if self._base is not None else 0
+        if length <= base_length:
+            self._base = (self._base[0], length)
+            self._values = []
+            self._shared = False
+        elif self._shared:
+            self._values = self._values[:length - base_length]
+            self._shared = False
+        else:
+            del self._values[length - base_length:]
+
+    def __len__(self) -> int:
+        return len(self._values) + (self._base[1] if self._base is not None else 0)
+
+    def __getitem__(self, index: int) -> int:
+        if self._base is None:
+            return self._values[index]
+        base, length = self._base
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("prefix index out of range")
+        return base[index] if index < length else self._values[index - length]
+
+    def __iter__(self):
+        if self._base is None:
+            return iter(self._values)
+        base, length = self._base
+        return chain(islice(base, length), self._values)
@@ -0,0 +1,641 @@
+"""
+进程内异步消息总线（Agent 之间通信）
+- 发布/订阅：主题以 "." 分段，订阅时可使用通配符（fnmatch 语法，如 "agents.*"）
+- 每个订阅者一个有界队列，队列满时的策略：
+  - block：发布方等待队列有空位（背压，默认）；跨进程传输无法背压，满后消息暂存在订阅者的积压列表中
+  - drop_oldest：丢弃最早的消息
+  - drop_new：丢弃新消息
+- 请求/应答：request 发送请求并等待对应的应答，respond 注册处理函数并将返回值作为应答；
+  应答直接完成等待中的请求，不经过订阅者队列
+- 关闭订阅时唤醒等待中的读取方（读完已入队的消息后迭代结束）和阻塞的发布方
+- 消息携带发布时上下文中的 trace_id，处理函数和迭代订阅时恢复到当前上下文，日志可跨Agent关联
+- 传输层可替换：local 在进程内直接投递；redis 经 Redis 协议的 pub/sub 跨进程投递（消息内容需可 JSON 序列化），
+  接口不变
+- 通过配置 bus 选择传输层和队列参数
+"""
+import asyncio
+import fnmatch
+import itertools
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from app.config.config_loader import config
+from app.utils.logger import get_trace_id, logger, set_trace_id
+
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEW = "drop_new"
+
+_ids = itertools.count(1)
+
+
+@dataclass
+class Envelope:
+    """总线上的一条消息"""
+    topic: str
+    payload: Any
+    id: str = ""
+    trace_id: Optional[str] = None
+    reply_to: Optional[str] = None
+    correlation_id: Optional[str] = None
+    # 应答消息中的错误信息，请求方收到后抛出 RemoteError
+    error: Optional[str] = None
+    headers: Dict[str, Any] = field(default_factory=dict)
+    timestamp: float = 0.0
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False, default=str)
+
+    @classmethod
+    def from_json(cls, data: str) -> "Envelope":
+        return cls(**json.loads(data))
+
+
+class RemoteError(RuntimeError):
+    """应答方处理请求失败"""
+
+
+Handler = Callable[[Envelope], Awaitable[Any]]
+Deliver = Callable[[Envelope], Awaitable[None]]
+
+
+class Transport(ABC):
+    """传输层接口：将发布的消息投递给各进程中总线的 deliver 函数"""
+
+    # 投递时是否等待订阅者队列空位；为 False 时总线不阻塞投递，block 策略的订阅者满后暂存积压消息
+    backpressure = True
+
+    @abstractmethod
+    async def start(self, deliver: Deliver) -> None:
+        """开始接收消息，收到的每条消息调用 deliver"""
+
+    @abstractmethod
+    async def publish(self, envelope: Envelope) -> None:
+        """发布一条消息"""
+
+    async def close(self) -> None:
+        """停止接收并释放资源"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class LocalTransport(Transport):
+    """进程内传输：发布时直接投递，订阅者队列满时背压直达发布方"""
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, envelope: Envelope) -> None:
+        await self._deliver(envelope)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"transport": "local"}
+
+
+class RedisTransport(Transport):
+    """Redis 协议 pub/sub 传输
+
+    所有主题发布到同一前缀下的频道，每个进程订阅该前缀并在本地按主题分发；
+    Redis pub/sub 不持久化，进程离线期间（包括断线重连期间）的消息会丢失。
+    读取循环为所有订阅者和请求应答共用，投递时不等待订阅者队列（背压无法跨进程传到发布方），
+    一个处理缓慢的订阅者不会阻塞其他订阅者和应答。
+    """
+
+    backpressure = False
+
+    def __init__(self, url: str, prefix: str = "lithium:bus:", reconnect_delay: float = 1.0):
+        """
+        Args:
+            url: 连接URL，如 redis://localhost:6379/0
+            prefix: 频道前缀
+            reconnect_delay: 读取出错后重新订阅前等待的秒数
+        """
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError("使用 redis 消息总线传输需要安装 redis 包") from e
+        self._redis = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.reconnect_delay = reconnect_delay
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self.received = 0
+        self.reconnects = 0
+
+    async def start(self, deliver: Deliver) -> None:
+        await self._subscribe()
+        self._reader = asyncio.create_task(self._read(deliver))
+
+    async def _subscribe(self) -> None:
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.psubscribe(f"{self.prefix}*")
+
+    async def _reset(self) -> None:
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except Exception as e:
+                logger.debug(f"关闭总线订阅连接失败: {e}")
+
+    async def _read(self, deliver: Deliver) -> None:
+        """读取循环：单条消息处理失败只记录日志，连接出错时重新订阅"""
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                async for message in self._pubsub.listen():
+                    try:
+                        envelope = Envelope.from_json(message["data"])
+                    except (TypeError, ValueError) as e:
+                        logger.warning(f"忽略无法解析的总线消息: {e}")
+                        continue
+                    self.received += 1
+                    try:
+                        await deliver(envelope)
+                    except Exception as e:
+                        logger.exception(f"总线消息投递失败: topic={envelope.topic}, error={e}")
+                logger.warning("总线订阅连接已结束，重新订阅")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"总线读取失败，{self.reconnect_delay}秒后重新订阅: {e}")
+            await self._reset()
+            self.reconnects += 1
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def publish(self, envelope: Envelope) -> None:
+        await self._redis.publish(f"{self.prefix}{envelope.topic}", envelope.to_json())
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        await self._reset()
+        await self._redis.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"transport": "redis", "received": self.received, "reconnects": self.reconnects}
+
+
+class SubscriptionClosed(RuntimeError):
+    """订阅已关闭且队列中的消息已读完"""
+
+
+# 关闭订阅时放入队列末尾的哨兵，唤醒等待中的读取方
+_CLOSED = object()
+
+
+class Subscription:
+    """一个订阅者：有界队列，可异步迭代读取消息
+
+    关闭后等待中的读取方在读完已入队的消息后结束（迭代停止，get 抛出 SubscriptionClosed），
+    阻塞等待空位的发布方立即返回，其消息计入 dropped。
+    """
+
+    def __init__(self, bus: "MessageBus", pattern: str, maxsize: int, overflow: str):
+        self.bus = bus
+        self.pattern = pattern
+        self.overflow = overflow
+        self.maxsize = maxsize
+        # 容量由 maxsize 控制，队列本身不限容量，保证关闭时总能放入哨兵
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.dropped = 0
+        self.closed = False
+        self._tasks: List[asyncio.Task] = []
+        # 等待队列空位的发布方
+        self._putters: Deque[asyncio.Future] = deque()
+        # 不等待背压的传输层投递时，block 策略下队列满后暂存的消息，由 _pump 按序放入队列
+        self._backlog: Deque[Envelope] = deque()
+        self._pump: Optional[asyncio.Task] = None
+
+    def matches(self, topic: str) -> bool:
+        return self.pattern == topic or fnmatch.fnmatchcase(topic, self.pattern)
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self.queue.qsize()
+
+    async def put(self, envelope: Envelope) -> None:
+        """放入消息，block 策略下队列满时等待空位"""
+        if self.overflow != OVERFLOW_BLOCK:
+            self._put_or_drop(envelope)
+            return
+        await self._wait_for_space()
+        if self.closed:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(envelope)
+
+    async def _wait_for_space(self) -> None:
+        """等待队列有空位或订阅关闭"""
+        while not self.closed and self.full():
+            waiter = asyncio.get_running_loop().create_future()
+            self._putters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._putters:
+                    self._putters.remove(waiter)
+                elif not self.full():
+                    # 已被唤醒却取消，把空位让给下一个发布方
+                    self._wakeup_putter()
+                raise
+
+    def offer(self, envelope: Envelope) -> None:
+        """不等待地放入消息：block 策略下队列满时暂存到积压列表，由后台任务按序放入"""
+        if self.closed:
+            return
+        if self.overflow != OVERFLOW_BLOCK:
+            self._put_or_drop(envelope)
+            return
+        if not self._backlog and not self.full():
+            self.queue.put_nowait(envelope)
+            return
+        self._backlog.append(envelope)
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._drain_backlog())
+
+    async def _drain_backlog(self) -> None:
+        # 有空位后再从积压列表取出，关闭时剩余的积压消息统一计入 dropped
+        while self._backlog and not self.closed:
+            await self._wait_for_space()
+            if not self.closed:
+                self.queue.put_nowait(self._backlog.popleft())
+
+    def _put_or_drop(self, envelope: Envelope) -> None:
+        if self.closed:
+            return
+        if self.full():
+            self.dropped += 1
+            if self.overflow == OVERFLOW_DROP_NEW:
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(envelope)
+
+    def _wakeup_putter(self) -> None:
+        while self._putters:
+            waiter = self._putters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def get(self) -> Envelope:
+        """读取下一条消息，并将当前上下文的 trace_id 设为消息的 trace_id
+
+        Raises:
+            SubscriptionClosed: 订阅已关闭且没有剩余消息
+        """
+        envelope = await self.queue.get()
+        if envelope is _CLOSED:
+            # 哨兵放回队列，唤醒其他读取方
+            self.queue.put_nowait(_CLOSED)
+            raise SubscriptionClosed(f"订阅已关闭: {self.pattern}")
+        self._wakeup_putter()
+        if envelope.trace_id:
+            set_trace_id(envelope.trace_id)
+        return envelope
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Envelope:
+        try:
+            return await self.get()
+        except SubscriptionClosed:
+            raise StopAsyncIteration from None
+
+    def close(self) -> None:
+        """取消订阅，停止处理函数，唤醒等待中的读取方和发布方"""
+        if self.closed:
+            return
+        self.closed = True
+        self.bus._remove(self)
+        for task in self._tasks:
+            task.cancel()
+        if self._pump is not None:
+            self._pump.cancel()
+        self.dropped += len(self._backlog)
+        self._backlog.clear()
+        self.queue.put_nowait(_CLOSED)
+        while self._putters:
+            waiter = self._putters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def queued(self) -> int:
+        """队列中等待读取的消息数"""
+        return self.queue.qsize() - (1 if self.closed else 0) + len(self._backlog)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued(),
+            "maxsize": self.maxsize,
+            "dropped": self.dropped,
+            "backlog": len(self._backlog),
+        }
+
+
+class MessageBus:
+    """异步消息总线"""
+
+    def __init__(
+        self,
+        transport: Optional[Transport] = None,
+        queue_size: int = 1000,
+        overflow: str = OVERFLOW_BLOCK,
+        request_timeout: float = 30.0,
+    ):
+        """
+        Args:
+            transport: 传输层，默认进程内传输
+            queue_size: 订阅者队列的默认容量
+            overflow: 队列满时的默认策略：block / drop_oldest / drop_new
+            request_timeout: request 的默认超时（秒）
+        """
+        self.transport = transport or LocalTransport()
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.request_timeout = request_timeout
+        self._subscriptions: List[Subscription] = []
+        # 主题 -> 匹配的订阅者，订阅变化时清空
+        self._routes: Dict[str, List[Subscription]] = {}
+        self._inbox = f"_inbox.{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        self._start_task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+        self.unroutable = 0
+
+    async def start(self) -> None:
+        """启动传输层，首次发布、请求或订阅时自动调用"""
+        if self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                await self.transport.start(self._deliver)
+                self._started = True
+
+    def _match(self, topic: str) -> List[Subscription]:
+        routes = self._routes.get(topic)
+        if routes is None:
+            routes = [s for s in self._subscriptions if s.matches(topic)]
+            self._routes[topic] = routes
+        return routes
+
+    async def _deliver(self, envelope: Envelope) -> None:
+        """将消息放入匹配的订阅者队列；发往本总线收件箱的应答直接完成对应的请求"""
+        if envelope.topic.startswith("_inbox."):
+            # 其他进程的收件箱消息（跨进程传输时所有进程都会收到）直接忽略
+            future = self._pending.pop(envelope.correlation_id, None) if envelope.topic == self._inbox else None
+            if future is not None and not future.done():
+                future.set_result(envelope)
+            return
+        routes = self._match(envelope.topic)
+        if not routes:
+            self.unroutable += 1
+            return
+        if self.transport.backpressure:
+            for subscription in routes:
+                await subscription.put(envelope)
+        else:
+            for subscription in routes:
+                subscription.offer(envelope)
+        self.delivered += len(routes)
+
+    async def publish(
+        self,
+        topic: str,
+        payload: Any = None,
+        headers: Optional[Dict[str, Any]] = None,
+        reply_to: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> Envelope:
+        """发布消息，订阅者队列满且策略为 block 时等待
+
+        Returns:
+            Envelope: 发布的消息
+        """
+        if not self._started:
+            await self.start()
+        envelope = Envelope(
+            topic=topic,
+            payload=payload,
+            id=f"{self._inbox}.{next(_ids)}",
+            trace_id=get_trace_id(),
+            reply_to=reply_to,
+            correlation_id=correlation_id,
+            error=error,
+            headers=headers or {},
+            timestamp=time.time(),
+        )
+        self.published += 1
+        await self.transport.publish(envelope)
+        return envelope
+
+    def subscribe(
+        self,
+        pattern: str,
+        handler: Optional[Handler] = None,
+        maxsize: Optional[int] = None,
+        overflow: Optional[str] = None,
+        concurrency: int = 1,
+    ) -> Subscription:
+        """订阅主题
+
+        Args:
+            pattern: 主题或通配符模式
+            handler: 处理函数；指定时由后台任务读取队列并调用，否则由调用方迭代返回的订阅读取
+            maxsize: 队列容量，默认取总线配置
+            overflow: 队列满时的策略，默认取总线配置
+            concurrency: 处理函数的并发数，为1时按顺序处理
+
+        Returns:
+            Subscription: 订阅，调用 close() 取消
+        """
+        subscription = Subscription(
+            self, pattern, maxsize if maxsize is not None else self.queue_size, overflow or self.overflow
+        )
+        self._subscriptions.append(subscription)
+        self._routes.clear()
+        if not self._started and self._start_task is None:
+            # 只订阅不发布的进程也需要启动传输层才能收到其他进程的消息
+            self._start_task = asyncio.get_running_loop().create_task(self.start())
+        if handler is not None:
+            subscription._tasks = [
+                asyncio.create_task(self._consume(subscription, handler)) for _ in range(concurrency)
+            ]
+        return subscription
+
+    def _remove(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            self._routes.clear()
+
+    async def _consume(self, subscription: Subscription, handler: Handler) -> None:
+        while True:
+            try:
+                envelope = await subscription.get()
+            except SubscriptionClosed:
+                return
+            try:
+                await handler(envelope)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"总线消息处理失败: topic={envelope.topic}, error={e}")
+
+    def respond(
+        self,
+        pattern: str,
+        handler: Callable[[Any], Awaitable[Any]],
+        concurrency: int = 1,
+        **kwargs
+    ) -> Subscription:
+        """注册请求处理函数：以请求内容调用 handler，返回值作为应答，异常作为错误应答
+
+        Args:
+            pattern: 主题或通配符模式
+            handler: 处理函数，参数为请求内容
+            concurrency: 并发处理的请求数
+            **kwargs: 传给 subscribe 的其他参数
+        """
+        async def serve(envelope: Envelope) -> None:
+            try:
+                result, error = await handler(envelope.payload), None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result, error = None, str(e) or type(e).__name__
+                logger.warning(f"总线请求处理失败: topic={envelope.topic}, error={error}")
+            if envelope.reply_to:
+                await self.publish(envelope.reply_to, result, correlation_id=envelope.id, error=error)
+
+        return self.subscribe(pattern, serve, concurrency=concurrency, **kwargs)
+
+    async def request(
+        self,
+        topic: str,
+        payload: Any = None,
+        timeout: Optional[float] = None,
+        headers: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """发送请求并等待应答
+
+        Returns:
+            应答内容
+
+        Raises:
+            asyncio.TimeoutError: 超时未收到应答
+            RemoteError: 应答方处理失败
+            LookupError: 没有订阅者接收该请求（仅进程内传输可判断）
+        """
+        if not self._started:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        # 消息ID在发布前生成，以便应答先于 publish 返回时也能找到等待者
+        correlation_id = f"{self._inbox}.{next(_ids)}"
+        self._pending[correlation_id] = future
+        try:
+            envelope = Envelope(
+                topic=topic,
+                payload=payload,
+                id=correlation_id,
+                trace_id=get_trace_id(),
+                reply_to=self._inbox,
+                headers=headers or {},
+                timestamp=time.time(),
+            )
+            if isinstance(self.transport, LocalTransport) and not self._match(topic):
+                raise LookupError(f"没有订阅者接收请求: {topic}")
+            self.published += 1
+            await self.transport.publish(envelope)
+            reply: Envelope = await asyncio.wait_for(future, timeout or self.request_timeout)
+        finally:
+            self._pending.pop(correlation_id, None)
+        if reply.error is not None:
+            raise RemoteError(reply.error)
+        return reply.payload
+
+    async def close(self) -> None:
+        """取消所有订阅和等待中的请求，关闭传输层"""
+        for subscription in list(self._subscriptions):
+            subscription.close()
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        await self.transport.close()
+        self._started = False
+        self._start_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.transport.stats(),
+            "published": self.published,
+            "delivered": self.delivered,
+            "unroutable": self.unroutable,
+            "subscriptions": len(self._subscriptions),
+            "queued": sum(s.queued() for s in self._subscriptions),
+            "dropped": sum(s.dropped for s in self._subscriptions),
+            "pending_requests": len(self._pending),
+        }
+
+
+def serve_agent(bus: MessageBus, topic: str, agent: Any, concurrency: int = 1) -> Subscription:
+    """将Agent注册为请求处理者：请求内容为提示词（或含 prompt 字段的字典），应答为完整回复
+
+    每个请求在Agent的分支（fork）上处理，共享其系统提示词等已有历史，请求之间互不影响，可以并发处理。
+    """
+    async def handle(payload: Any) -> str:
+        prompt = payload["prompt"] if isinstance(payload, dict) else str(payload)
+        return await agent.fork().generate(prompt, stream=False)
+
+    return bus.respond(topic, handle, concurrency=concurrency)
+
+
+_default_bus: Optional[MessageBus] = None
+
+
+def get_message_bus() -> MessageBus:
+    """根据配置 bus 获取进程级共享总线"""
+    global _default_bus
+    if _default_bus is None:
+        bus_config = config.get("bus", {}) or {}
+        transport_name = bus_config.get("transport", "local")
+        if transport_name == "local":
+            transport = LocalTransport()
+        elif transport_name == "redis":
+            transport = RedisTransport(
+                bus_config.get("redis_url", "redis://localhost:6379/0"),
+                reconnect_delay=bus_config.get("redis_reconnect_delay", 1.0),
+            )
+        else:
+            raise ValueError(f"未知的消息总线传输: {transport_name}")
+        _default_bus = MessageBus(
+            transport,
+            queue_size=bus_config.get("queue_size", 1000),
+            overflow=bus_config.get("overflow", OVERFLOW_BLOCK),
+            request_timeout=bus_config.get("request_timeout", 30.0),
+        )
+        logger.info(f"消息总线传输: {transport_name}")
+    return _default_bus
+
+
+async def close_message_bus() -> None:
+    """关闭共享总线"""
+    global _default_bus
+    if _default_bus is not None:
+        bus, _default_bus = _default_bus, None
+        await bus.close()
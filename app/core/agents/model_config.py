@@ -1,5 +1,5 @@
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 
 class ModelConfig(BaseModel):
@@ -21,6 +21,29 @@ class ModelConfig(BaseModel):
     functions: Optional[List[Dict[str, Any]]] = Field(default=None, description="可用的函数列表")
     function_call: Optional[Dict[str, Any]] = Field(default=None, description="函数调用配置")
     
+    # 配置版本号，字段的值改变时递增，供调用方判断缓存的请求参数是否失效
+    _version: int = PrivateAttr(default=0)
+    
     class Config:
         """Pydantic配置类"""
-        arbitrary_types_allowed = True
\ No newline at end of file
+        arbitrary_types_allowed = True
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+            return
+        old = getattr(self, name, None)
+        # 原地修改后重新赋值同一个列表或字典时无法比较出变化，视为已变化
+        changed = old != value or (old is value and isinstance(value, (list, dict)))
+        super().__setattr__(name, value)
+        if changed:
+            self._version += 1
+    
+    @property
+    def version(self) -> int:
+        """配置版本号
+        
+        只跟踪改变了值的字段赋值，赋相同的值不会改变版本号；
+        原地修改列表或字典类型的字段（如 stop.append）不会改变版本号，这种情况应重新赋值该字段。
+        """
+        return self._version
\ No newline at end of file
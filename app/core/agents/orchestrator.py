@@ -0,0 +1,418 @@
+"""
+多智能体任务编排器
+- 接收由 AgentTask 组成的有向无环图（DAG），无依赖关系的节点在 asyncio 上并发执行
+- 全局并发上限取自配置 agents.max_agents，单任务超时取自 agents.timeout，重试次数取自 agents.retry_attempts，
+  重试前按 agents.retry_delay 做带抖动的指数退避（退避期间不占用并发名额）
+- 节点完成即通过 run_stream 流式返回结果，总耗时趋近于关键路径而非所有LLM调用之和
+- 上游节点失败时，其所有下游节点被标记为 skipped
+- 结构化输出的节点（from_agent 指定 schema）每完成一个字段即发布，依赖 "任务名.字段名" 的下游节点
+  无需等待上游整体结束即可开始（流水线执行）；上游最终失败时，已开始的这些下游节点被取消并标记为 skipped。
+  上游的一次执行失败、将要重试时，已发布的字段作废，据此开始的下游被取消，待重试发布新值后重新开始；
+  先于上游结束的这类下游，其结果暂存到上游成功后才返回，不会返回基于作废字段的结果
+"""
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from app.config.config_loader import config
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.structured_output import parse_structured, schema_instruction, set_field_publisher
+from app.core.llm.resilience import RetryPolicy
+from app.utils.logger import logger
+from app.utils.tracing import start_span
+
+
+TaskFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+_MISSING = object()
+
+
+def _field_of(result: Any, field_name: str) -> Any:
+    """从任务结果（模型实例或字典）中取字段，不存在时返回 _MISSING"""
+    if isinstance(result, dict):
+        return result.get(field_name, _MISSING)
+    return getattr(result, field_name, _MISSING)
+
+
+@dataclass
+class AgentTask:
+    """DAG中的一个任务节点
+
+    Attributes:
+        name: 任务名称，在同一DAG内唯一
+        run: 任务函数，接收依赖任务的结果字典 {依赖名称: 结果}
+        depends_on: 依赖的任务名称列表；"任务名.字段名" 表示只依赖上游结构化输出中的一个字段
+        timeout: 单次执行超时（秒），为None时使用 agents.timeout
+        retry_attempts: 失败重试次数，为None时使用 agents.retry_attempts
+    """
+    name: str
+    run: TaskFunc
+    depends_on: List[str] = field(default_factory=list)
+    timeout: Optional[float] = None
+    retry_attempts: Optional[int] = None
+
+    @classmethod
+    def from_agent(
+        cls,
+        name: str,
+        agent: BaseAgent,
+        prompt: Union[str, Callable[[Dict[str, Any]], str]],
+        depends_on: Optional[List[str]] = None,
+        schema: Optional[Type[BaseModel]] = None,
+        **kwargs
+    ) -> "AgentTask":
+        """基于 BaseAgent 构建任务节点
+
+        同一个Agent会维护对话历史，不应被多个可并发执行的节点共用。
+        失败或超时的一次执行会回滚该次写入Agent的历史，重试时按原历史重新发送提示词。
+
+        Args:
+            name: 任务名称
+            agent: 执行任务的Agent
+            prompt: 提示词；若为可调用对象，则以依赖结果字典为参数生成提示词
+            depends_on: 依赖的任务名称列表
+            schema: 结构化输出模型；指定时要求模型按其 JSON Schema 输出，流式解析并逐字段发布，结果为模型实例
+            **kwargs: 传给 AgentTask 的其他参数（timeout、retry_attempts）
+
+        Returns:
+            AgentTask: 任务节点
+        """
+        async def run(deps: Dict[str, Any]) -> Any:
+            text = prompt(deps) if callable(prompt) else prompt
+            checkpoint = agent.history_checkpoint()
+            try:
+                if schema is None:
+                    return await agent.generate(text, stream=False)
+                chunks = await agent.generate(f"{text}\n\n{schema_instruction(schema)}", stream=True)
+                return await parse_structured(chunks, schema)
+            except BaseException:
+                agent.restore_history(checkpoint)
+                raise
+
+        return cls(name=name, run=run, depends_on=list(depends_on or []), **kwargs)
+
+
+@dataclass
+class TaskResult:
+    """任务执行结果"""
+    name: str
+    status: str  # success / failed / skipped
+    result: Any = None
+    error: Optional[str] = None
+    attempts: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "success"
+
+
+class Orchestrator:
+    """DAG任务编排器
+
+    同一个编排器实例上并发运行的所有DAG共享同一个并发上限。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        retry_attempts: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+    ):
+        """初始化编排器
+
+        Args:
+            max_concurrency: 最大并发任务数，默认取 agents.max_agents
+            timeout: 默认单任务超时（秒），默认取 agents.timeout
+            retry_attempts: 默认重试次数，默认取 agents.retry_attempts
+            retry_delay: 重试退避基础时间（秒），第 n 次重试前最多等待 retry_delay * 2^(n-1) 秒，默认取 agents.retry_delay
+        """
+        agents_config = config.get("agents", {}) or {}
+        self.max_concurrency = max_concurrency or agents_config.get("max_agents", 10)
+        self.timeout = timeout if timeout is not None else agents_config.get("timeout", 300)
+        self.retry_attempts = (
+            retry_attempts if retry_attempts is not None else agents_config.get("retry_attempts", 3)
+        )
+        self.backoff = RetryPolicy(
+            base_delay=retry_delay if retry_delay is not None else agents_config.get("retry_delay", 1.0)
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    @staticmethod
+    def upstream_of(dep: str, graph: Dict[str, AgentTask]) -> Optional[str]:
+        """解析依赖项对应的上游任务名：任务名本身，或 "任务名.字段名" 中的任务名"""
+        if dep in graph:
+            return dep
+        name, _, field_name = dep.rpartition(".")
+        return name if name in graph and field_name else None
+
+    @staticmethod
+    def validate(tasks: List[AgentTask]) -> Dict[str, AgentTask]:
+        """校验任务名称唯一、依赖存在且无环
+
+        只读取任务的 name 和 depends_on，也可以直接传入接口层的任务描述（如 AgentTaskSpec），
+        在创建Agent之前校验任务图。
+
+        Raises:
+            ValueError: 任务图不合法
+        """
+        graph: Dict[str, AgentTask] = {}
+        for task in tasks:
+            if task.name in graph:
+                raise ValueError(f"任务名称重复: {task.name}")
+            graph[task.name] = task
+        for task in tasks:
+            missing = [dep for dep in task.depends_on if Orchestrator.upstream_of(dep, graph) is None]
+            if missing:
+                raise ValueError(f"任务 {task.name} 依赖不存在的任务: {missing}")
+
+        # Kahn 算法检测环，依赖字段视为依赖其所属任务
+        upstreams = {
+            task.name: {Orchestrator.upstream_of(dep, graph) for dep in task.depends_on} for task in tasks
+        }
+        in_degree = {name: len(deps) for name, deps in upstreams.items()}
+        dependents = defaultdict(list)
+        for name, deps in upstreams.items():
+            for dep in deps:
+                dependents[dep].append(name)
+        queue = [name for name, degree in in_degree.items() if degree == 0]
+        visited = 0
+        while queue:
+            name = queue.pop()
+            visited += 1
+            for child in dependents[name]:
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    queue.append(child)
+        if visited != len(graph):
+            raise ValueError("任务图中存在循环依赖")
+        return graph
+
+    async def _execute(
+        self,
+        task: AgentTask,
+        deps: Dict[str, Any],
+        publish: Optional[Callable[[str, str, Any], None]] = None
+    ) -> TaskResult:
+        """在并发上限内执行单个任务，处理超时和重试（重试前退避，退避期间释放并发名额）
+
+        Args:
+            task: 任务节点
+            deps: 依赖结果
+            publish: 字段发布函数 (任务名, 字段名, 值)；字段名为None表示一次执行失败、将要重试，之前发布的字段作废
+        """
+        timeout = task.timeout if task.timeout is not None else self.timeout
+        retries = task.retry_attempts if task.retry_attempts is not None else self.retry_attempts
+        start = time.perf_counter()
+        error = None
+        if publish is not None:
+            # 任务函数在当前上下文的副本中运行，发布的字段带上任务名
+            set_field_publisher(lambda field_name, value: publish(task.name, field_name, value))
+        with start_span("agent.task", task=task.name) as span:
+            for attempt in range(1, retries + 2):
+                if attempt > 1:
+                    await asyncio.sleep(self.backoff.backoff(attempt - 2))
+                async with self._semaphore:
+                    if attempt == 1:
+                        span.set_attribute("queue_wait_seconds", time.perf_counter() - start)
+                    try:
+                        with start_span("agent.attempt", task=task.name, attempt=attempt):
+                            result = await asyncio.wait_for(task.run(deps), timeout=timeout)
+                        span.set_attribute("attempts", attempt)
+                        return TaskResult(
+                            name=task.name,
+                            status="success",
+                            result=result,
+                            attempts=attempt,
+                            elapsed=time.perf_counter() - start,
+                        )
+                    except asyncio.TimeoutError:
+                        error = f"执行超时（{timeout}秒）"
+                    except Exception as e:
+                        error = str(e) or e.__class__.__name__
+                logger.warning(f"任务 {task.name} 第{attempt}次执行失败: {error}")
+                if publish is not None and attempt <= retries:
+                    publish(task.name, None, None)
+            span.set_attribute("attempts", retries + 1)
+            span.record_exception(RuntimeError(error))
+        return TaskResult(
+            name=task.name,
+            status="failed",
+            error=error,
+            attempts=retries + 1,
+            elapsed=time.perf_counter() - start,
+        )
+
+    async def run_stream(self, tasks: List[AgentTask]) -> AsyncGenerator[TaskResult, None]:
+        """执行任务图，每个节点结束后立即返回其结果
+
+        Args:
+            tasks: 任务节点列表
+
+        Yields:
+            TaskResult: 按完成顺序返回的任务结果
+        """
+        graph = self.validate(tasks)
+        results: Dict[str, TaskResult] = {}
+        # 已发布的字段，"任务名.字段名" -> 值；同一次执行中同一字段只取首次发布的值
+        fields: Dict[str, Any] = {}
+        waiting = {name: set(task.depends_on) for name, task in graph.items()}
+        dependents = defaultdict(set)
+        for task in tasks:
+            for dep in task.depends_on:
+                dependents[self.upstream_of(dep, graph)].add(task.name)
+        # 各任务依赖其字段的上游任务
+        field_parents = {
+            name: {self.upstream_of(dep, graph) for dep in task.depends_on if dep not in graph}
+            for name, task in graph.items()
+        }
+        # 先于字段上游结束的任务结果，上游成功后才返回
+        held: Dict[str, TaskResult] = {}
+
+        pending: Dict[asyncio.Task, str] = {}
+        running: Dict[str, asyncio.Task] = {}
+        published: asyncio.Queue = asyncio.Queue()
+        getter: Optional[asyncio.Task] = None
+
+        def publish(name: str, field_name: str, value: Any) -> None:
+            published.put_nowait((name, field_name, value))
+
+        def launch(name: str) -> None:
+            task = graph[name]
+            deps = {dep: results[dep].result if dep in graph else fields[dep] for dep in task.depends_on}
+            future = asyncio.create_task(self._execute(task, deps, publish))
+            pending[future] = name
+            running[name] = future
+
+        def satisfy(upstream: str, dep: str) -> None:
+            for child in dependents[upstream]:
+                if dep in waiting[child]:
+                    waiting[child].discard(dep)
+                    if not waiting[child] and child not in results and child not in running:
+                        launch(child)
+
+        def reset(name: str) -> None:
+            """上游的一次执行失败：作废其已发布的字段，取消据此开始的下游，等待重试重新发布"""
+            for dep in [dep for dep in fields if self.upstream_of(dep, graph) == name]:
+                del fields[dep]
+            for child in dependents[name]:
+                stale = [
+                    dep for dep in graph[child].depends_on
+                    if dep not in graph and self.upstream_of(dep, graph) == name
+                ]
+                if not stale or child in results:
+                    continue
+                started = running.pop(child, None)
+                if started is not None:
+                    started.cancel()
+                    pending.pop(started, None)
+                held.pop(child, None)
+                reset(child)
+                waiting[child].update(stale)
+
+        def on_field(name: str, field_name: Optional[str], value: Any) -> None:
+            if name in results:
+                return
+            if field_name is None:
+                reset(name)
+                return
+            dep = f"{name}.{field_name}"
+            if dep in fields:
+                return
+            fields[dep] = value
+            satisfy(name, dep)
+
+        logger.info(f"开始执行任务图: {len(graph)} 个任务, 并发上限 {self.max_concurrency}")
+        for name, deps in waiting.items():
+            if not deps:
+                launch(name)
+
+        try:
+            while pending:
+                if getter is None:
+                    getter = asyncio.create_task(published.get())
+                done, _ = await asyncio.wait([*pending, getter], return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    on_field(*getter.result())
+                    getter = None
+                # 先处理已发布的字段，再处理结束的任务
+                while not published.empty():
+                    on_field(*published.get_nowait())
+
+                for future in done:
+                    if future not in pending:
+                        continue
+                    name = pending.pop(future)
+                    running.pop(name, None)
+                    if any(parent not in results for parent in field_parents[name]):
+                        # 所依赖字段的上游仍在执行，可能重试使这些字段作废，结果暂存到上游成功后返回
+                        held[name] = future.result()
+                        continue
+                    ready = [future.result()]
+                    while ready:
+                        result = ready.pop()
+                        name = result.name
+                        results[name] = result
+                        yield result
+
+                        skip = []
+                        if result.ok:
+                            for child in list(dependents[name]):
+                                for dep in list(waiting[child]):
+                                    if dep == name:
+                                        satisfy(name, dep)
+                                    elif self.upstream_of(dep, graph) == name:
+                                        # 上游结束时仍未发布的字段从最终结果中取
+                                        value = _field_of(result.result, dep[len(name) + 1:])
+                                        if value is _MISSING:
+                                            skip.append((child, f"上游任务 {name} 未输出字段 {dep[len(name) + 1:]}"))
+                                        else:
+                                            fields[dep] = value
+                                            satisfy(name, dep)
+                        else:
+                            # 上游失败，跳过（或取消已开始的）所有下游任务
+                            skip = [(child, f"上游任务 {name} 未成功") for child in dependents[name]]
+
+                        while skip:
+                            child, error = skip.pop()
+                            if child in results:
+                                continue
+                            started = running.pop(child, None)
+                            if started is not None:
+                                started.cancel()
+                                pending.pop(started, None)
+                            held.pop(child, None)
+                            results[child] = TaskResult(name=child, status="skipped", error=error)
+                            yield results[child]
+                            skip.extend((grandchild, f"上游任务 {child} 未成功") for grandchild in dependents[child])
+
+                        # 字段上游都已成功结束的暂存结果可以返回
+                        for child in dependents[name]:
+                            if child in held and all(parent in results for parent in field_parents[child]):
+                                ready.append(held.pop(child))
+        finally:
+            for future in pending:
+                future.cancel()
+            if getter is not None:
+                getter.cancel()
+
+    async def run(self, tasks: List[AgentTask]) -> Dict[str, TaskResult]:
+        """执行任务图并返回全部结果
+
+        Args:
+            tasks: 任务节点列表
+
+        Returns:
+            Dict[str, TaskResult]: 以任务名称为键的结果
+        """
+        results = {}
+        async for result in self.run_stream(tasks):
+            results[result.name] = result
+        failed = sum(1 for r in results.values() if not r.ok)
+        logger.info(f"任务图执行完成: 成功 {len(results) - failed} 个, 失败或跳过 {failed} 个")
+        return results
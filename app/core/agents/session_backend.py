@@ -0,0 +1,143 @@
+"""
+会话状态后端
+- 对话历史保存在共享后端中，任意 API 工作进程都能处理任意会话的任意一轮，无需粘性路由
+- 内置三种实现：
+  - memory：进程内存，仅适用于单进程
+  - database：使用 database.url 的关系数据库（默认 SQLite），写后批量落库，见 app/service/conversation_service.py
+  - redis：Redis 协议存储（Redis、Valkey 等均可在本地运行），每个会话一个列表，追加为原子操作
+- 通过配置 session.backend 选择
+"""
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from app.config.config_loader import config
+from app.utils.logger import logger
+
+
+class SessionBackend(ABC):
+    """会话后端接口
+
+    消息为 {"role", "content", "name"(可选)} 字典，按追加顺序保存。
+    """
+
+    @abstractmethod
+    async def load(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """读取会话最近的消息
+
+        Args:
+            session_id: 会话ID
+            limit: 最多读取的消息条数，为None时读取全部
+
+        Returns:
+            List[Dict[str, Any]]: 按时间正序排列的消息
+        """
+
+    @abstractmethod
+    async def append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """追加一轮对话的消息，同一次调用中的消息保持连续"""
+
+    async def flush(self, session_id: Optional[str] = None) -> None:
+        """等待已追加的消息对其他进程可见，session_id 为None时等待全部会话"""
+
+    async def close(self) -> None:
+        """释放后端资源"""
+
+    def stats(self) -> Dict[str, Any]:
+        """后端统计"""
+        return {}
+
+
+class MemorySessionBackend(SessionBackend):
+    """进程内存后端，仅适用于单进程部署"""
+
+    def __init__(self):
+        self._sessions: Dict[str, List[Dict[str, Any]]] = {}
+
+    async def load(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        messages = self._sessions.get(session_id, [])
+        return list(messages[-limit:] if limit else messages)
+
+    async def append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        self._sessions.setdefault(session_id, []).extend(dict(m) for m in messages)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "sessions": len(self._sessions)}
+
+
+class RedisSessionBackend(SessionBackend):
+    """Redis 协议后端
+
+    每个会话对应一个列表，RPUSH 保证并发追加的原子性和顺序；可为会话设置过期时间。
+    """
+
+    def __init__(self, url: str, ttl: Optional[int] = None, prefix: str = "lithium:session:"):
+        """
+        Args:
+            url: 连接URL，如 redis://localhost:6379/0
+            ttl: 会话最后一次追加后的过期时间（秒），为None时不过期
+            prefix: 键前缀
+        """
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError("使用 redis 会话后端需要安装 redis 包") from e
+        self._redis = redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    async def load(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        items = await self._redis.lrange(self._key(session_id), -limit if limit else 0, -1)
+        return [json.loads(item) for item in items]
+
+    async def append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        if not messages:
+            return
+        key = self._key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *(json.dumps(m, ensure_ascii=False) for m in messages))
+            if self.ttl:
+                pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis"}
+
+
+_default_backend: Optional[SessionBackend] = None
+
+
+def get_session_backend() -> SessionBackend:
+    """获取进程内共享的会话后端，根据配置 session.backend 创建，默认 database"""
+    global _default_backend
+    if _default_backend is None:
+        session_config = config.get("session", {}) or {}
+        backend = session_config.get("backend", "database")
+        if backend == "memory":
+            _default_backend = MemorySessionBackend()
+        elif backend == "redis":
+            _default_backend = RedisSessionBackend(
+                session_config.get("redis_url", "redis://localhost:6379/0"),
+                ttl=session_config.get("ttl"),
+            )
+        elif backend == "database":
+            from app.service.conversation_service import get_conversation_store
+            _default_backend = get_conversation_store()
+        else:
+            raise ValueError(f"未知的会话后端: {backend}")
+        logger.info(f"会话后端: {backend}")
+    return _default_backend
+
+
+async def close_session_backend() -> None:
+    """关闭共享的会话后端，database 后端会先写完待落库的消息"""
+    global _default_backend
+    if _default_backend is not None:
+        await _default_backend.close()
+        _default_backend = None
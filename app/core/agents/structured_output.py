@@ -0,0 +1,240 @@
+"""
+流式结构化输出解析
+- IncrementalJSONParser 增量解析模型流式输出中的顶层 JSON 对象，每个字段的值完整时立即返回，
+  不等待整个对象结束；对象之前的说明文字和代码块标记被忽略，每个字符只扫描一次
+- iter_fields 按 pydantic 模型（如 app/schema 中的模型）逐字段校验并返回，parse_structured 返回完整的模型实例
+- 在编排器中运行时，字段完成后通过 publish_field 发布，依赖 "任务名.字段名" 的下游任务随即开始执行
+"""
+import contextvars
+import json
+from functools import lru_cache
+from typing import Annotated, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+
+FieldCallback = Callable[[str, Any], None]
+
+# 编排器为当前任务设置的字段发布函数
+_field_publisher: contextvars.ContextVar[Optional[FieldCallback]] = contextvars.ContextVar(
+    "field_publisher", default=None
+)
+
+# 解析状态
+_BEFORE_OBJECT, _KEY, _COLON, _VALUE, _DONE = range(5)
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """顶层 JSON 对象的增量解析器
+
+    用法：每收到一段文本调用 feed()，返回其中已完整的 (键, 值)；输出结束时调用 close()。
+    """
+
+    def __init__(self):
+        self._state = _BEFORE_OBJECT
+        self._key: Optional[str] = None
+        # 当前键或值的原始文本
+        self._raw: List[str] = []
+        # 当前值的类型：'"' 字符串、'{' / '[' 容器、'' 标量（数字、true/false/null）
+        self._kind: Optional[str] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        """对象是否已经结束"""
+        return self._state == _DONE
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """输入一段文本
+
+        Returns:
+            List[Tuple[str, Any]]: 本段文本中完成的字段
+
+        Raises:
+            ValueError: JSON 格式错误
+        """
+        fields: List[Tuple[str, Any]] = []
+        for char in text:
+            if self._state == _DONE:
+                break
+            if self._state == _VALUE and self._kind is not None:
+                self._consume_value(char, fields)
+            else:
+                self._structural(char)
+        return fields
+
+    def close(self) -> None:
+        """输出结束，对象未完整结束时抛出 ValueError"""
+        if self._state != _DONE:
+            raise ValueError("JSON 对象不完整")
+
+    def _structural(self, char: str) -> None:
+        """处理值以外的字符（对象边界、键、冒号、逗号）"""
+        state = self._state
+        if state == _BEFORE_OBJECT:
+            if char == "{":
+                self._state = _KEY
+        elif state == _KEY:
+            if self._in_string:
+                self._raw.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._key = json.loads('"' + "".join(self._raw))
+                    self._raw.clear()
+                    self._state = _COLON
+            elif char == '"':
+                self._in_string = True
+            elif char == "}":
+                self._state = _DONE
+            elif char not in _WHITESPACE and char != ",":
+                raise ValueError(f"JSON 键格式错误: {char!r}")
+        elif state == _COLON:
+            if char == ":":
+                self._state = _VALUE
+            elif char not in _WHITESPACE:
+                raise ValueError(f"JSON 键后缺少冒号: {char!r}")
+        elif state == _VALUE:
+            if char in _WHITESPACE:
+                return
+            if char in ",}":
+                raise ValueError(f"JSON 值缺失: {self._key}")
+            self._kind = char if char in '"{[' else ""
+            self._depth = 1 if char in "{[" else 0
+            self._in_string = char == '"'
+            self._raw.append(char)
+
+    def _consume_value(self, char: str, fields: List[Tuple[str, Any]]) -> None:
+        """处理值中的字符，标量在遇到空白、逗号或对象结束时完成"""
+        if self._kind == "":
+            if char in _WHITESPACE or char in ",}":
+                self._emit(fields)
+                if char == "}":
+                    self._state = _DONE
+            else:
+                self._raw.append(char)
+            return
+
+        self._raw.append(char)
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._kind == '"':
+                    self._emit(fields)
+        elif char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._emit(fields)
+
+    def _emit(self, fields: List[Tuple[str, Any]]) -> None:
+        fields.append((self._key, json.loads("".join(self._raw))))
+        self._raw.clear()
+        self._kind = None
+        self._key = None
+        self._state = _KEY
+
+
+@lru_cache(maxsize=256)
+def _field_adapters(schema: Type[BaseModel]) -> Dict[str, Tuple[str, TypeAdapter]]:
+    """字段（含别名）-> (字段名, 带约束的校验器)"""
+    adapters = {}
+    for name, info in schema.model_fields.items():
+        annotation = Annotated[(info.annotation, *info.metadata)] if info.metadata else info.annotation
+        adapter = TypeAdapter(annotation)
+        adapters[name] = (name, adapter)
+        if info.alias:
+            adapters[info.alias] = (name, adapter)
+    return adapters
+
+
+async def iter_fields(
+    chunks: AsyncIterator[str],
+    schema: Type[BaseModel],
+    raw: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """逐字段解析并校验流式输出
+
+    Args:
+        chunks: 文本分片，如 BaseAgent.generate(stream=True) 的返回值
+        schema: 输出对应的 pydantic 模型
+        raw: 传入字典时收集解析出的原始字段，供最终整体校验
+
+    Yields:
+        Tuple[str, Any]: (字段名, 校验后的值)，模型中未定义的字段不返回
+
+    Raises:
+        ValueError: JSON 格式错误或输出不完整
+        pydantic.ValidationError: 字段值不符合模型
+    """
+    parser = IncrementalJSONParser()
+    adapters = _field_adapters(schema)
+    try:
+        # 对象结束后继续读完剩余内容（如代码块结束标记），使Agent记录完整回复
+        async for chunk in chunks:
+            for key, value in parser.feed(chunk):
+                if raw is not None:
+                    raw[key] = value
+                if key in adapters:
+                    name, adapter = adapters[key]
+                    yield name, adapter.validate_python(value)
+        parser.close()
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def parse_structured(
+    chunks: AsyncIterator[str],
+    schema: Type[BaseModel],
+    on_field: Optional[FieldCallback] = None
+) -> BaseModel:
+    """解析流式输出为模型实例，字段完成时立即回调
+
+    Args:
+        chunks: 文本分片
+        schema: 输出对应的 pydantic 模型
+        on_field: 字段完成时的回调 (字段名, 值)，默认发布给编排器（不在编排器中运行时忽略）
+
+    Returns:
+        BaseModel: 整体校验后的模型实例
+    """
+    callback = on_field or publish_field
+    raw: Dict[str, Any] = {}
+    async for name, value in iter_fields(chunks, schema, raw):
+        callback(name, value)
+    return schema.model_validate(raw)
+
+
+def schema_instruction(schema: Type[BaseModel]) -> str:
+    """生成要求模型按 JSON Schema 输出的提示词"""
+    return (
+        "请只输出一个符合以下 JSON Schema 的 JSON 对象，按 Schema 中的字段顺序输出，不要输出其他内容：\n"
+        + json.dumps(schema.model_json_schema(), ensure_ascii=False)
+    )
+
+
+def publish_field(name: str, value: Any) -> None:
+    """向编排器发布当前任务已完成的字段，不在编排器中运行时不做任何事"""
+    publisher = _field_publisher.get()
+    if publisher is not None:
+        publisher(name, value)
+
+
+def set_field_publisher(publisher: Optional[FieldCallback]) -> contextvars.Token:
+    """设置当前上下文的字段发布函数（编排器使用）"""
+    return _field_publisher.set(publisher)
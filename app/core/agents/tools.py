@@ -0,0 +1,279 @@
+"""
+工具（函数调用）注册与并发执行
+- ToolRegistry 注册异步或同步函数，生成 OpenAI tools 参数；未提供参数 JSON Schema 时按函数签名推断
+- ToolExecutor 并发执行模型一轮返回的所有工具调用：
+  - 异步工具直接在事件循环中运行
+  - 同步工具在进程级共享线程池中运行，CPU 密集型工具（cpu_bound=True）在共享进程池中运行
+  - 每个工具单独超时；线程池和进程池中已开始的调用无法中断，超时后结果被丢弃
+  - 幂等工具（idempotent=True）按 (工具名, 参数) 缓存结果
+  - 参数错误、工具不存在、超时和异常都作为工具结果返回给模型，不中断本轮对话
+- BaseAgent.generate_with_tools 在同一轮中把所有工具结果一起回传给模型，减少 LLM 调用轮数
+"""
+import asyncio
+import functools
+import inspect
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union, get_type_hints
+
+from app.config.config_loader import config
+from app.core.llm.cache import MemoryCache
+from app.utils.logger import logger
+from app.utils.tracing import start_span
+
+
+# Python 类型到 JSON Schema 类型
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+def _tool_settings() -> Dict[str, Any]:
+    return (config.get("agents", {}) or {}).get("tools", {}) or {}
+
+
+def infer_parameters(func: Callable) -> Dict[str, Any]:
+    """按函数签名推断参数的 JSON Schema，无默认值的参数为必填"""
+    try:
+        hints = get_type_hints(func)
+    except Exception:
+        hints = {}
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for name, param in inspect.signature(func).parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        annotation = hints.get(name)
+        origin = getattr(annotation, "__origin__", annotation)
+        json_type = _JSON_TYPES.get(origin)
+        properties[name] = {"type": json_type} if json_type else {}
+        if param.default is param.empty:
+            required.append(name)
+    return {"type": "object", "properties": properties, "required": required}
+
+
+@dataclass
+class Tool:
+    """已注册的工具"""
+    name: str
+    func: Callable[..., Any]
+    description: str = ""
+    parameters: Dict[str, Any] = field(default_factory=dict)
+    timeout: Optional[float] = None
+    idempotent: bool = False
+    cpu_bound: bool = False
+
+    @property
+    def is_async(self) -> bool:
+        return asyncio.iscoroutinefunction(self.func)
+
+    def schema(self) -> Dict[str, Any]:
+        """OpenAI tools 参数中的一项"""
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+
+class ToolRegistry:
+    """工具注册表"""
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+
+    def register(
+        self,
+        func: Optional[Callable] = None,
+        *,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        idempotent: bool = False,
+        cpu_bound: bool = False,
+    ):
+        """注册工具，可直接调用或作为装饰器使用
+
+        Args:
+            func: 工具函数，异步或同步；cpu_bound 的函数必须定义在模块顶层（进程池需要序列化）
+            name: 工具名，默认为函数名
+            description: 工具说明，默认取函数文档字符串
+            parameters: 参数的 JSON Schema，默认按函数签名推断
+            timeout: 超时（秒），默认取 agents.tools.timeout
+            idempotent: 是否幂等，幂等工具按参数缓存结果
+            cpu_bound: 是否为 CPU 密集型同步函数，在进程池中执行
+        """
+        def decorator(f: Callable) -> Callable:
+            tool = Tool(
+                name=name or f.__name__,
+                func=f,
+                description=description if description is not None else inspect.getdoc(f) or "",
+                parameters=parameters if parameters is not None else infer_parameters(f),
+                timeout=timeout,
+                idempotent=idempotent,
+                cpu_bound=cpu_bound,
+            )
+            if tool.cpu_bound and tool.is_async:
+                raise ValueError(f"异步工具不能在进程池中执行: {tool.name}")
+            self._tools[tool.name] = tool
+            return f
+
+        if func is not None:
+            return decorator(func)
+        return decorator
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """生成 chat.completions.create 的 tools 参数"""
+        return [tool.schema() for tool in self._tools.values()]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+
+@dataclass
+class ToolCall:
+    """模型请求的一次工具调用"""
+    id: str
+    name: str
+    arguments: str
+
+
+@dataclass
+class ToolResult:
+    """工具调用结果，content 为回传给模型的文本"""
+    call: ToolCall
+    content: str
+    ok: bool = True
+    cached: bool = False
+    elapsed: float = 0.0
+
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=_tool_settings().get("max_workers", 8), thread_name_prefix="agent-tool"
+        )
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn 避免在多线程进程中 fork
+        _process_pool = ProcessPoolExecutor(
+            max_workers=_tool_settings().get("process_workers", 2),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_tool_pools() -> None:
+    """关闭工具使用的共享线程池和进程池"""
+    global _thread_pool, _process_pool
+    pools, _thread_pool, _process_pool = [_thread_pool, _process_pool], None, None
+    for pool in pools:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _to_content(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class ToolExecutor:
+    """工具执行器"""
+
+    def __init__(self, registry: ToolRegistry, default_timeout: Optional[float] = None, cache: Optional[MemoryCache] = None):
+        """
+        Args:
+            registry: 工具注册表
+            default_timeout: 未单独设置超时的工具使用的超时（秒），默认取 agents.tools.timeout
+            cache: 幂等工具的结果缓存，默认按 agents.tools.cache_max_entries / cache_ttl 创建
+        """
+        settings = _tool_settings()
+        self.registry = registry
+        self.default_timeout = default_timeout if default_timeout is not None else settings.get("timeout", 30.0)
+        self.cache = cache or MemoryCache(
+            max_entries=settings.get("cache_max_entries", 1024), ttl=settings.get("cache_ttl", 300)
+        )
+        self.calls = 0
+        self.cache_hits = 0
+        self.failures = 0
+
+    async def _invoke(self, tool: Tool, arguments: Dict[str, Any]) -> Any:
+        if tool.is_async:
+            return await tool.func(**arguments)
+        loop = asyncio.get_running_loop()
+        pool = _get_process_pool() if tool.cpu_bound else _get_thread_pool()
+        return await loop.run_in_executor(pool, functools.partial(tool.func, **arguments))
+
+    async def execute(self, call: ToolCall) -> ToolResult:
+        """执行单个工具调用，错误作为结果返回"""
+        self.calls += 1
+        start = asyncio.get_running_loop().time()
+        tool = self.registry.get(call.name)
+        if tool is None:
+            self.failures += 1
+            return ToolResult(call, _to_content({"error": f"工具不存在: {call.name}"}), ok=False)
+        try:
+            arguments = json.loads(call.arguments or "{}")
+            if not isinstance(arguments, dict):
+                raise ValueError("参数必须是 JSON 对象")
+        except ValueError as e:
+            self.failures += 1
+            return ToolResult(call, _to_content({"error": f"参数解析失败: {e}"}), ok=False)
+
+        key = None
+        if tool.idempotent:
+            key = f"{tool.name}:{json.dumps(arguments, sort_keys=True, ensure_ascii=False)}"
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return ToolResult(call, cached["content"], cached=True)
+
+        timeout = tool.timeout if tool.timeout is not None else self.default_timeout
+        with start_span("tool.call", tool=tool.name) as span:
+            try:
+                value = await asyncio.wait_for(self._invoke(tool, arguments), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.failures += 1
+                span.set_attribute("timeout", True)
+                logger.warning(f"工具执行超时: {tool.name} ({timeout}秒)")
+                return ToolResult(call, _to_content({"error": f"执行超时（{timeout}秒）"}), ok=False,
+                                  elapsed=asyncio.get_running_loop().time() - start)
+            except Exception as e:
+                self.failures += 1
+                span.record_exception(e)
+                logger.warning(f"工具执行失败: {tool.name}, error={e}")
+                return ToolResult(call, _to_content({"error": str(e) or type(e).__name__}), ok=False,
+                                  elapsed=asyncio.get_running_loop().time() - start)
+
+        content = _to_content(value)
+        if key is not None:
+            self.cache.set(key, {"content": content})
+        return ToolResult(call, content, elapsed=asyncio.get_running_loop().time() - start)
+
+    async def execute_many(self, calls: List[ToolCall]) -> List[ToolResult]:
+        """并发执行一轮中的所有工具调用，结果顺序与调用顺序一致"""
+        return list(await asyncio.gather(*(self.execute(call) for call in calls)))
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "cache_hits": self.cache_hits, "failures": self.failures}
+
+
+def as_executor(tools: Union[ToolRegistry, ToolExecutor]) -> ToolExecutor:
+    """注册表按默认参数包装为执行器"""
+    return tools if isinstance(tools, ToolExecutor) else ToolExecutor(tools)
@@ -0,0 +1 @@
+"""LLM调用基础设施包，包含共享客户端、连接池等组件"""
@@ -0,0 +1,356 @@
+"""
+LLM补全结果缓存
+- 缓存键为消息列表与非敏感请求参数的规范化哈希，不包含 api_key，也不区分是否流式
+- 内存层使用 LRU + TTL 淘汰，可选 SQLite 磁盘层（使用配置中的 database.url）
+- 命中时可按非流式或流式两种方式回放，流式调用同样能够受益
+- 缓存为可选功能，通过配置 llm.cache.enabled 或显式传入 BaseAgent 开启
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from app.config.config_loader import config
+from app.core.llm.single_flight import aclose_quietly
+from app.utils.logger import logger
+
+
+# 不参与缓存键计算的请求参数
+_KEY_EXCLUDED_PARAMS = {"stream", "stream_options", "api_key"}
+
+
+def make_cache_key(params: Dict[str, Any], api_base: Optional[str] = None) -> str:
+    """根据请求参数生成规范化的缓存键
+
+    Args:
+        params: 传给 chat.completions.create 的参数
+        api_base: API基础URL，不同服务商的结果互不复用
+
+    Returns:
+        str: sha256 十六进制摘要
+    """
+    payload = {k: v for k, v in params.items() if k not in _KEY_EXCLUDED_PARAMS}
+    payload["api_base"] = api_base
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def accumulate_chunks(chunks: List[ChatCompletionChunk]) -> Dict[str, Any]:
+    """将流式响应的分片合并为完整的 ChatCompletion 数据
+
+    Args:
+        chunks: 流式响应分片
+
+    Returns:
+        Dict[str, Any]: 可用 ChatCompletion.model_validate 还原的字典
+    """
+    choices: Dict[int, Dict[str, Any]] = {}
+    usage = None
+    for chunk in chunks:
+        if chunk.usage is not None:
+            usage = chunk.usage.model_dump()
+        for choice in chunk.choices:
+            entry = choices.setdefault(choice.index, {
+                "index": choice.index,
+                "message": {"role": "assistant", "content": None},
+                "finish_reason": None,
+            })
+            message = entry["message"]
+            delta = choice.delta
+            if delta.content:
+                message["content"] = (message["content"] or "") + delta.content
+            if delta.function_call:
+                call = message.setdefault("function_call", {"name": "", "arguments": ""})
+                call["name"] += delta.function_call.name or ""
+                call["arguments"] += delta.function_call.arguments or ""
+            for tool_delta in delta.tool_calls or []:
+                tool_calls = message.setdefault("tool_calls", [])
+                while len(tool_calls) <= tool_delta.index:
+                    tool_calls.append({"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                tool_call = tool_calls[tool_delta.index]
+                tool_call["id"] += tool_delta.id or ""
+                if tool_delta.function:
+                    tool_call["function"]["name"] += tool_delta.function.name or ""
+                    tool_call["function"]["arguments"] += tool_delta.function.arguments or ""
+            if choice.finish_reason:
+                entry["finish_reason"] = choice.finish_reason
+
+    last = chunks[-1]
+    return {
+        "id": last.id,
+        "object": "chat.completion",
+        "created": last.created,
+        "model": last.model,
+        "choices": [choices[index] for index in sorted(choices)],
+        "usage": usage,
+    }
+
+
+def _replay_chunks(data: Dict[str, Any]) -> List[ChatCompletionChunk]:
+    """将完整的 ChatCompletion 数据拆为流式分片"""
+    base = {
+        "id": data["id"],
+        "object": "chat.completion.chunk",
+        "created": data["created"],
+        "model": data["model"],
+    }
+    chunks = []
+    for choice in data["choices"]:
+        message = choice["message"]
+        delta: Dict[str, Any] = {"role": "assistant", "content": message.get("content")}
+        if message.get("function_call"):
+            delta["function_call"] = message["function_call"]
+        if message.get("tool_calls"):
+            delta["tool_calls"] = [
+                {"index": index, **tool_call} for index, tool_call in enumerate(message["tool_calls"])
+            ]
+        chunks.append({**base, "choices": [{"index": choice["index"], "delta": delta, "finish_reason": None}]})
+    chunks.append({
+        **base,
+        "choices": [
+            {"index": choice["index"], "delta": {}, "finish_reason": choice.get("finish_reason") or "stop"}
+            for choice in data["choices"]
+        ],
+        "usage": data.get("usage"),
+    })
+    return [ChatCompletionChunk.model_validate(chunk) for chunk in chunks]
+
+
+async def replay_stream(data: Dict[str, Any]) -> AsyncIterator[ChatCompletionChunk]:
+    """以流式分片的形式回放缓存结果"""
+    for chunk in _replay_chunks(data):
+        yield chunk
+
+
+def replay_completion(value: Dict[str, Any], stream: bool) -> Any:
+    """按请求方式回放缓存的 ChatCompletion 数据：流式时为分片异步迭代器，否则为 ChatCompletion"""
+    if stream:
+        return replay_stream(value)
+    return ChatCompletion.model_validate(value)
+
+
+class MemoryCache:
+    """内存缓存层，LRU + TTL 淘汰"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCache:
+    """SQLite 磁盘缓存层
+
+    使用标准库 sqlite3，读写放到线程池中执行，避免阻塞事件循环；
+    连接在线程间共享，由锁保证串行访问。
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: float = 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def path_from_url(url: str) -> str:
+        """从 sqlite:///./xxx.db 形式的URL中解析文件路径
+
+        Raises:
+            ValueError: 不是SQLite文件数据库的URL（包括内存数据库 sqlite:// 和 sqlite:///:memory:）
+        """
+        if not url.startswith("sqlite"):
+            raise ValueError(f"磁盘缓存仅支持SQLite数据库: {url}")
+        _, sep, path = url.partition(":///")
+        path = path.split("?", 1)[0]
+        if not sep or not path or path == ":memory:":
+            raise ValueError(f"磁盘缓存需要SQLite文件数据库，形如 sqlite:///./lithium.db: {url}")
+        return path
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completion_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_completion_cache_expires_at ON completion_cache (expires_at)"
+            )
+        return self._conn
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM completion_cache WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completion_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl),
+            )
+            conn.execute("DELETE FROM completion_cache WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM completion_cache WHERE key IN ("
+                "SELECT key FROM completion_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._set, key, value)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CompletionCache:
+    """两级补全缓存：内存 LRU+TTL，可选 SQLite 磁盘层"""
+
+    def __init__(self, memory: Optional[MemoryCache] = None, disk: Optional[SqliteCache] = None):
+        self.memory = memory or MemoryCache()
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查询缓存，磁盘层命中时回填内存层"""
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            try:
+                value = await self.disk.get(key)
+            except Exception as e:
+                logger.error(f"读取磁盘缓存失败: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """写入缓存"""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                await self.disk.set(key, value)
+            except Exception as e:
+                logger.error(f"写入磁盘缓存失败: {e}")
+
+    def replay(self, value: Dict[str, Any], stream: bool) -> Any:
+        """按请求方式回放缓存结果
+
+        Args:
+            value: 缓存中的 ChatCompletion 数据
+            stream: 是否以流式分片回放
+
+        Returns:
+            流式时为分片异步迭代器，否则为 ChatCompletion
+        """
+        return replay_completion(value, stream)
+
+    async def record_stream(
+        self,
+        key: str,
+        response: AsyncIterator[ChatCompletionChunk]
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        """透传流式响应，并在完整结束后写入缓存
+
+        调用方中途放弃读取时不会写入不完整的结果，并关闭上游流以释放连接。
+        """
+        chunks = []
+        finished = False
+        try:
+            async for chunk in response:
+                chunks.append(chunk)
+                finished = finished or any(choice.finish_reason for choice in chunk.choices)
+                yield chunk
+        finally:
+            await aclose_quietly(response)
+        if finished:
+            await self.set(key, accumulate_chunks(chunks))
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+_default_cache: Optional[CompletionCache] = None
+
+
+def get_default_cache() -> Optional[CompletionCache]:
+    """根据配置 llm.cache 获取进程级共享缓存
+
+    Returns:
+        Optional[CompletionCache]: 未开启缓存时返回None
+    """
+    global _default_cache
+    cache_config = config.get("llm", {}).get("cache", {}) or {}
+    if not cache_config.get("enabled", False):
+        return None
+    if _default_cache is None:
+        ttl = cache_config.get("ttl", 3600)
+        disk = None
+        if cache_config.get("persist", False):
+            url = config.get("database", {}).get("url", "sqlite:///./lithium.db")
+            disk = SqliteCache(
+                SqliteCache.path_from_url(url),
+                max_entries=cache_config.get("disk_max_entries", 100000),
+                ttl=cache_config.get("disk_ttl", ttl),
+            )
+        _default_cache = CompletionCache(
+            memory=MemoryCache(max_entries=cache_config.get("max_entries", 1024), ttl=ttl),
+            disk=disk,
+        )
+        logger.info(f"启用LLM补全缓存: ttl={ttl}, 磁盘层={'开启' if disk else '关闭'}")
+    return _default_cache
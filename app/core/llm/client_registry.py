@@ -0,0 +1,301 @@
+"""
+LLM客户端注册表
+- 按 (api_base, api_key) 复用同一个 AsyncOpenAI 客户端及其底层 httpx 连接池
+- 连接池参数（HTTP/2、连接数、保活时间、超时）从配置文件 llm.http_client 读取
+- 通过带计量的 transport 统计连接池占用和排队等待时间
+- 连接池参数变化后旧客户端不再分配新请求，进行中的请求结束（或超过 retire_grace_period）后关闭
+- 暴露全局 client_registry 实例，由 FastAPI lifespan 负责关闭
+"""
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.config.config_loader import config
+from app.utils.logger import logger
+
+
+def _http2_available() -> bool:
+    """检查是否安装了 HTTP/2 所需的 h2 依赖"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _key_fingerprint(api_key: str) -> str:
+    """生成API密钥指纹，用于日志和指标中区分客户端而不泄露密钥"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+@dataclass
+class PoolStats:
+    """连接池统计信息"""
+    max_connections: int
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    requests_total: int = 0
+    wait_count: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        """记录一次获取连接的等待时间"""
+        self.wait_count += 1
+        self.wait_seconds_total += seconds
+        if seconds > self.wait_seconds_max:
+            self.wait_seconds_max = seconds
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    """包装响应体流，在流关闭时释放占用计数"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """带计量功能的transport
+
+    通过 httpcore 的 trace 扩展记录请求从发起到真正拿到连接
+    （开始建连或开始发送请求头）之间的排队时间。
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, stats: PoolStats):
+        self._transport = transport
+        self._stats = stats
+
+    def _release(self) -> None:
+        self._stats.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._stats
+        stats.requests_total += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+
+        start = time.perf_counter()
+        acquired = False
+        upstream_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            nonlocal acquired
+            if not acquired and (
+                event_name.startswith("connection.connect_tcp")
+                or event_name.endswith("send_request_headers.started")
+            ):
+                acquired = True
+                stats.record_wait(time.perf_counter() - start)
+            if upstream_trace is not None:
+                await upstream_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+        response.stream = _MeteredStream(response.stream, self._release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def connection_counts(self) -> Tuple[int, int]:
+        """返回 (当前连接数, 空闲连接数)"""
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return len(connections), idle
+
+
+@dataclass
+class _PooledClient:
+    """注册表中的一项：OpenAI客户端及其连接池"""
+    client: AsyncOpenAI
+    http_client: httpx.AsyncClient
+    transport: _MeteredTransport
+    stats: PoolStats
+    api_base: Optional[str]
+    key_fingerprint: str
+
+
+class ClientRegistry:
+    """进程级LLM客户端注册表
+
+    同一 (api_base, api_key) 的所有Agent共享一个 AsyncOpenAI 客户端和连接池，
+    避免每个Agent各自建池、重复进行TLS握手。
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[Optional[str], str], _PooledClient] = {}
+        # 配置变化后不再分配新请求的旧客户端，进行中的请求继续使用，空闲后由后台任务关闭
+        self._retired: List[_PooledClient] = []
+        self._closing: Set[asyncio.Task] = set()
+        config.subscribe(self._on_config_change, "llm.http_client", in_loop=True)
+
+    def _on_config_change(self, new, old, changed) -> None:
+        """连接池参数变化时停用现有客户端，后续请求按新参数创建连接池"""
+        clients, self._clients = self._clients, {}
+        if not clients:
+            return
+        self._retired.extend(clients.values())
+        logger.info(f"连接池配置已变化 ({', '.join(changed)})，{len(clients)} 个共享LLM客户端将按新配置重建")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环中（如命令行工具），旧客户端在 aclose 时关闭
+            return
+        for pooled in clients.values():
+            task = loop.create_task(self._close_when_idle(pooled))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def _close_when_idle(self, pooled: _PooledClient) -> None:
+        """等待停用客户端上进行中的请求结束后关闭，最多等待 retire_grace_period 秒"""
+        deadline = time.monotonic() + self._pool_settings().get("retire_grace_period", 120.0)
+        while pooled.stats.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        if pooled.stats.in_flight > 0:
+            logger.warning(f"停用的LLM客户端仍有 {pooled.stats.in_flight} 个请求未结束，强制关闭: api_base={pooled.api_base}")
+        self._retired = [item for item in self._retired if item is not pooled]
+        await self._close(pooled)
+
+    @staticmethod
+    async def _close(pooled: _PooledClient) -> None:
+        try:
+            await pooled.client.close()
+            await pooled.http_client.aclose()
+        except Exception as e:
+            logger.error(f"关闭LLM客户端失败: api_base={pooled.api_base}, error={e}")
+
+    @staticmethod
+    def _pool_settings() -> Dict[str, Any]:
+        """从配置文件读取连接池参数"""
+        return config.get("llm", {}).get("http_client", {}) or {}
+
+    def _create(self, api_base: Optional[str], api_key: str) -> _PooledClient:
+        """创建新的客户端和连接池"""
+        settings = self._pool_settings()
+        timeout = settings.get("timeout", 60.0)
+        max_connections = settings.get("max_connections", 100)
+
+        http2 = settings.get("http2", True)
+        if http2 and not _http2_available():
+            logger.warning("未安装 h2 依赖，HTTP/2 不可用，回退到 HTTP/1.1")
+            http2 = False
+
+        stats = PoolStats(max_connections=max_connections)
+        transport = _MeteredTransport(
+            httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=settings.get("max_keepalive_connections", 20),
+                    keepalive_expiry=settings.get("keepalive_expiry", 30),
+                ),
+            ),
+            stats,
+        )
+        http_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(timeout, connect=settings.get("connect_timeout", 10.0)),
+        )
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=api_base,
+            http_client=http_client,
+            timeout=timeout,
+            # 重试由 app.core.llm.resilience 统一处理，关闭SDK内置重试避免重复退避
+            max_retries=0,
+        )
+        fingerprint = _key_fingerprint(api_key)
+        logger.info(
+            f"创建共享LLM客户端: api_base={api_base}, key={fingerprint}, "
+            f"http2={http2}, max_connections={max_connections}"
+        )
+        return _PooledClient(
+            client=client,
+            http_client=http_client,
+            transport=transport,
+            stats=stats,
+            api_base=api_base,
+            key_fingerprint=fingerprint,
+        )
+
+    def get_client(self, api_base: Optional[str], api_key: str) -> AsyncOpenAI:
+        """获取（必要时创建）共享的 AsyncOpenAI 客户端
+
+        Args:
+            api_base: API基础URL
+            api_key: API密钥
+
+        Returns:
+            AsyncOpenAI: 共享客户端
+        """
+        key = (api_base, api_key)
+        pooled = self._clients.get(key)
+        if pooled is None:
+            pooled = self._create(api_base, api_key)
+            self._clients[key] = pooled
+        return pooled.client
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有连接池的占用和等待统计
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 以 "api_base#密钥指纹" 为键的统计信息
+        """
+        result = {}
+        for pooled in self._clients.values():
+            stats = pooled.stats
+            connections, idle = pooled.transport.connection_counts()
+            result[f"{pooled.api_base}#{pooled.key_fingerprint}"] = {
+                "max_connections": stats.max_connections,
+                "connections": connections,
+                "idle_connections": idle,
+                "in_flight": stats.in_flight,
+                "peak_in_flight": stats.peak_in_flight,
+                "requests_total": stats.requests_total,
+                "wait_count": stats.wait_count,
+                "wait_seconds_total": stats.wait_seconds_total,
+                "wait_seconds_max": stats.wait_seconds_max,
+            }
+        return result
+
+    async def aclose(self) -> None:
+        """关闭所有共享客户端及其连接池"""
+        closing = list(self._closing)
+        for task in closing:
+            task.cancel()
+        await asyncio.gather(*closing, return_exceptions=True)
+        clients = list(self._clients.values()) + self._retired
+        self._clients.clear()
+        self._retired = []
+        for pooled in clients:
+            await self._close(pooled)
+        if clients:
+            logger.info(f"已关闭 {len(clients)} 个共享LLM客户端")
+
+
+# 全局客户端注册表实例
+client_registry = ClientRegistry()
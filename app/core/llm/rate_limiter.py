@@ -0,0 +1,339 @@
+"""
+客户端限流调度器
+- 按 (api_base, model) 维护请求数（RPM）和Token数（TPM）两个令牌桶
+- 请求按预估Token数（提示词 + max_tokens）准入，非流式请求完成后按实际用量多退少补
+- 优先级之间严格按优先级调度，同一优先级内在不同Agent之间轮转，避免单个Agent占满配额
+- 队首请求配额不足时按令牌补充速度定时唤醒，不忙等，也不让后来的小请求插队
+- Admission 将准入交给容错执行器在计时和对冲之外完成，排队时间不计入延迟统计；对冲请求只在配额充足时立即准入
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+from app.config.config_loader import config
+from app.utils.logger import logger
+from app.utils.tracing import start_span
+
+
+# 优先级，数值越小越优先
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class TokenBucket:
+    """令牌桶"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """获取 amount 个令牌还需等待的秒数；超过桶容量的请求在桶满时放行"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+    def adjust(self, delta: float) -> None:
+        """按实际用量修正：delta 为正表示退还，为负表示补扣（可透支）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+    def resize(self, per_minute: float) -> None:
+        """修改限额，保留当前剩余令牌（不超过新容量）"""
+        self._refill()
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = min(self.capacity, self.tokens)
+
+
+@dataclass
+class _Waiter:
+    tokens: int
+    future: asyncio.Future
+
+
+@dataclass
+class Reservation:
+    """一次准入的配额预留，请求完成后可按实际用量结算"""
+    limiter: Optional["RateLimiter"]
+    estimated_tokens: int
+    _settled: bool = field(default=False, repr=False)
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """按实际Token用量结算
+
+        Args:
+            actual_tokens: 实际消耗的Token数，为None时保留预估值
+        """
+        if self._settled or self.limiter is None or actual_tokens is None:
+            return
+        self._settled = True
+        if self.limiter.tokens is not None:
+            self.limiter.tokens.adjust(self.estimated_tokens - actual_tokens)
+            self.limiter._wake()
+
+
+class RateLimiter:
+    """单个 (api_base, model) 的限流调度器"""
+
+    def __init__(self, name: str, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        """
+        Args:
+            name: 限流器名称，用于日志
+            rpm: 每分钟请求数上限，为None表示不限制
+            tpm: 每分钟Token数上限，为None表示不限制
+        """
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        # 优先级 -> (agent_id -> 等待队列)，OrderedDict 用于同优先级内轮转
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.queued = 0
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.wait_time(1)
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def _consume(self, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None:
+            self.tokens.consume(tokens)
+        self.admitted += 1
+
+    def _head(self) -> Optional[Tuple[int, str, _Waiter]]:
+        """按优先级和轮转顺序取下一个等待者（跳过已取消的）"""
+        for priority in sorted(self._queues):
+            agents = self._queues[priority]
+            while agents:
+                agent_id, waiters = next(iter(agents.items()))
+                while waiters and waiters[0].future.done():
+                    waiters.popleft()
+                if waiters:
+                    return priority, agent_id, waiters[0]
+                del agents[agent_id]
+            del self._queues[priority]
+        return None
+
+    def _pop(self, priority: int, agent_id: str) -> None:
+        agents = self._queues[priority]
+        waiters = agents.pop(agent_id)
+        waiters.popleft()
+        if waiters:
+            # 该Agent还有等待者时排到本优先级队尾，实现轮转
+            agents[agent_id] = waiters
+
+    def _pump(self) -> None:
+        """尽可能多地放行队首等待者，配额不足时定时唤醒"""
+        self._timer = None
+        while True:
+            head = self._head()
+            if head is None:
+                return
+            priority, agent_id, waiter = head
+            wait = self._wait_time(waiter.tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+            self._consume(waiter.tokens)
+            self._pop(priority, agent_id)
+            waiter.future.set_result(None)
+
+    def _wake(self) -> None:
+        """配额或队列发生变化时重新调度"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._queues:
+            self._pump()
+
+    async def acquire(self, tokens: int, agent_id: str = "default", priority: int = PRIORITY_NORMAL) -> Reservation:
+        """等待配额并预留
+
+        Args:
+            tokens: 预估Token数（提示词 + 最大生成长度）
+            agent_id: 发起请求的Agent标识，用于公平轮转
+            priority: 优先级
+
+        Returns:
+            Reservation: 配额预留
+        """
+        reservation = self.try_acquire(tokens)
+        if reservation is not None:
+            return reservation
+
+        self.queued += 1
+        waiter = _Waiter(tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(priority, OrderedDict()).setdefault(agent_id, deque()).append(waiter)
+        if self._timer is None:
+            self._pump()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已放行但调用方被取消，退还配额
+                Reservation(self, tokens).settle(0)
+                if self.requests is not None:
+                    self.requests.adjust(1)
+            else:
+                waiter.future.cancel()
+                self._wake()
+            raise
+        return Reservation(self, tokens)
+
+    def try_acquire(self, tokens: int) -> Optional[Reservation]:
+        """不等待的准入：没有排队者且配额充足时立即预留，否则返回None
+
+        Args:
+            tokens: 预估Token数
+
+        Returns:
+            Optional[Reservation]: 配额预留，配额不足时为None
+        """
+        if self._queues or self._wait_time(tokens) > 0:
+            return None
+        self._consume(tokens)
+        return Reservation(self, tokens)
+
+    def reconfigure(self, rpm: Optional[int], tpm: Optional[int]) -> None:
+        """就地修改限额，排队中的请求保留，在下次唤醒时按新限额准入"""
+        self.requests = self._resize(self.requests, rpm)
+        self.tokens = self._resize(self.tokens, tpm)
+
+    @staticmethod
+    def _resize(bucket: Optional[TokenBucket], per_minute: Optional[int]) -> Optional[TokenBucket]:
+        if not per_minute:
+            return None
+        if bucket is None:
+            return TokenBucket(per_minute)
+        bucket.resize(per_minute)
+        return bucket
+
+    def stats(self) -> Dict[str, object]:
+        """限流器统计"""
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "waiting": sum(len(w) for agents in self._queues.values() for w in agents.values()),
+            "request_tokens": self.requests.tokens if self.requests else None,
+            "tpm_tokens": self.tokens.tokens if self.tokens else None,
+        }
+
+
+class Admission:
+    """一次逻辑请求的限流准入，作为 ResilientExecutor.call 的 admit 参数
+
+    执行器在每次尝试（含重试）前、计时和对冲之外调用 admission(True) 排队准入；
+    发起对冲前调用 admission(False)，配额不足时放弃对冲而不是排队。
+    每次准入得到的预留由随后发起的请求通过 take() 取出并结算。
+    """
+
+    def __init__(self, limiter: RateLimiter, tokens: int, agent_id: str = "default", priority: int = PRIORITY_NORMAL):
+        """
+        Args:
+            limiter: 限流器
+            tokens: 预估Token数
+            agent_id: 发起请求的Agent标识
+            priority: 优先级
+        """
+        self.limiter = limiter
+        self.tokens = tokens
+        self.agent_id = agent_id
+        self.priority = priority
+        self._reservations: Deque[Reservation] = deque()
+
+    async def __call__(self, wait: bool) -> bool:
+        """准入一次请求
+
+        Args:
+            wait: 配额不足时是否排队等待
+
+        Returns:
+            bool: 是否已准入（wait 为True时总是True）
+        """
+        if wait:
+            with start_span("rate_limit.acquire", limiter=self.limiter.name, estimated_tokens=self.tokens):
+                reservation = await self.limiter.acquire(self.tokens, self.agent_id, self.priority)
+        else:
+            reservation = self.limiter.try_acquire(self.tokens)
+            if reservation is None:
+                return False
+        self._reservations.append(reservation)
+        return True
+
+    def take(self) -> Optional[Reservation]:
+        """取出最早一次准入的预留，由随后发起的请求按实际用量结算"""
+        return self._reservations.popleft() if self._reservations else None
+
+
+_limiters: Dict[Tuple[Optional[str], str], RateLimiter] = {}
+
+
+def default_completion_tokens() -> int:
+    """未设置 max_tokens 时用于预估的生成长度"""
+    return (config.get("llm", {}).get("rate_limit", {}) or {}).get("default_completion_tokens", 512)
+
+
+def _model_limits(settings, model: str) -> Dict[str, object]:
+    """全局限额叠加 llm.rate_limit.models 中的模型覆盖"""
+    return {**settings, **((settings.get("models") or {}).get(model) or {})}
+
+
+def get_rate_limiter(api_base: Optional[str], model: str) -> Optional[RateLimiter]:
+    """获取 (api_base, model) 对应的进程级共享限流器
+
+    限额取配置 llm.rate_limit，llm.rate_limit.models 中可按模型覆盖。
+
+    Returns:
+        Optional[RateLimiter]: 未开启限流时返回None
+    """
+    settings = config.get("llm", {}).get("rate_limit", {}) or {}
+    if not settings.get("enabled", False):
+        return None
+    key = (api_base, model)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limits = _model_limits(settings, model)
+        limiter = RateLimiter(f"{api_base}#{model}", rpm=limits.get("rpm"), tpm=limits.get("tpm"))
+        _limiters[key] = limiter
+        logger.info(f"创建限流器: {limiter.name}, rpm={limits.get('rpm')}, tpm={limits.get('tpm')}")
+    return limiter
+
+
+def _on_config_change(new, old, changed) -> None:
+    """配置 llm.rate_limit 变化时就地调整已创建的限流器"""
+    settings = new.get("llm", {}).get("rate_limit", {}) or {}
+    for (_, model), limiter in list(_limiters.items()):
+        limits = _model_limits(settings, model)
+        limiter.reconfigure(limits.get("rpm"), limits.get("tpm"))
+        logger.info(f"限流器已更新: {limiter.name}, rpm={limits.get('rpm')}, tpm={limits.get('tpm')}")
+
+
+config.subscribe(_on_config_change, "llm.rate_limit", in_loop=True)
+
+
+def rate_limiter_stats() -> Dict[str, Dict[str, object]]:
+    """所有限流器的统计"""
+    return {limiter.name: limiter.stats() for limiter in _limiters.values()}
@@ -0,0 +1,400 @@
+"""
+LLM调用容错
+- 重试：对 429、5xx、连接错误和超时进行带抖动的指数退避重试，优先遵循响应头 Retry-After
+- 熔断：按 api_base 维护熔断器，连续失败达到阈值后短路请求，冷却后半开试探
+- 对冲请求：首个请求超过近期延迟分位数（默认p95）仍未返回时再发起一次，取先成功者，约束尾延迟
+- 准入（如限流排队）在计时和对冲之外完成，排队时间不计入延迟统计，也不会触发对冲
+- 参数从配置 agents.retry_attempts 和 llm.resilience 读取
+"""
+import asyncio
+import email.utils
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, TypeVar
+
+import openai
+
+from app.config.config_loader import config
+from app.core.llm.single_flight import aclose_quietly
+from app.utils.logger import logger
+
+
+T = TypeVar("T")
+
+# 准入函数：参数为是否允许排队等待，返回是否已准入
+Admit = Callable[[bool], Awaitable[bool]]
+
+# 可重试的HTTP状态码
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# 请求内容本身有误的HTTP状态码，说明端点可以正常处理请求
+_REQUEST_ERROR_STATUS = {400, 422}
+
+# 对冲落败后在后台关闭流式响应的任务，保留引用直到关闭完成
+_closing: Set[asyncio.Task] = set()
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被短路"""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"端点 {endpoint} 已熔断，{retry_in:.1f}秒后重试")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def is_retryable(error: BaseException) -> bool:
+    """判断异常是否值得重试
+
+    Args:
+        error: 调用上游时抛出的异常
+
+    Returns:
+        bool: 是否可重试
+    """
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in _RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """从异常响应头中解析服务端建议的等待时间
+
+    支持 retry-after-ms、retry-after（秒数或HTTP日期）两种响应头。
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """带抖动的指数退避重试策略"""
+
+    def __init__(
+        self,
+        retry_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        max_retry_after: float = 60.0,
+    ):
+        """
+        Args:
+            retry_attempts: 最大重试次数（不含首次请求）
+            base_delay: 退避基础时间（秒）
+            max_delay: 单次退避上限（秒）
+            max_retry_after: 遵循 Retry-After 的上限（秒），超过则视为不可重试
+        """
+        self.retry_attempts = retry_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """计算第 attempt 次重试前的等待时间
+
+        Args:
+            attempt: 已失败的次数（从0开始）
+            retry_after: 服务端建议的等待时间
+
+        Returns:
+            Optional[float]: 等待秒数；服务端要求等待过久时返回None
+        """
+        # full jitter，避免大量客户端同时重试
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """熔断器
+
+    closed：正常放行；连续失败达到阈值后进入 open，短路所有请求；
+    冷却时间过后进入 half_open，放行一个试探请求，成功则恢复 closed，失败则重新 open。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before_call(self) -> bool:
+        """请求前检查
+
+        Returns:
+            bool: 本次请求是否为半开状态下的试探请求
+
+        Raises:
+            CircuitOpenError: 熔断器打开或半开试探进行中
+        """
+        if self.state == "closed":
+            return False
+        elapsed = time.monotonic() - self._opened_at
+        if self.state == "open" and elapsed >= self.recovery_timeout:
+            self.state = "half_open"
+            logger.info(f"熔断器进入半开状态: {self.name}")
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        raise CircuitOpenError(self.name, max(0.0, self.recovery_timeout - elapsed))
+
+    def is_open(self) -> bool:
+        """是否处于打开状态且仍在冷却期内"""
+        return self.state == "open" and time.monotonic() - self._opened_at < self.recovery_timeout
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info(f"熔断器恢复: {self.name}")
+        self.state = "closed"
+        self._failures = 0
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """调用被取消（如客户端断开、超时）时释放半开试探名额，不计入成功或失败"""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"熔断器打开: {self.name}, 连续失败 {self._failures} 次")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """最近成功请求的延迟窗口，用于计算对冲阈值"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class ResilientExecutor:
+    """为单个端点提供重试、熔断和对冲请求的执行器"""
+
+    def __init__(
+        self,
+        name: str,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_quantile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.2,
+    ):
+        """
+        Args:
+            name: 端点名称（通常为 api_base）
+            retry: 重试策略
+            breaker: 熔断器
+            hedge_quantile: 触发对冲的延迟分位数，为None时不对冲
+            hedge_min_samples: 延迟样本数达到该值后才开始对冲
+            hedge_min_delay: 对冲等待时间下限（秒）
+        """
+        self.name = name
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.retries = 0
+        self.hedged_requests = 0
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_quantile is None or len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.quantile(self.hedge_quantile))
+
+    @staticmethod
+    def _discard(task: asyncio.Task) -> None:
+        """对冲中落败的请求若已成功返回流式响应，需关闭以释放连接"""
+        if task.cancelled() or task.exception() is not None:
+            return
+        closing = asyncio.ensure_future(aclose_quietly(task.result()))
+        _closing.add(closing)
+        closing.add_done_callback(_closing.discard)
+
+    async def _hedged(self, fn: Callable[[], Awaitable[T]], delay: float, admit: Optional[Admit] = None) -> T:
+        pending = {asyncio.create_task(fn())}
+        winner = None
+        error = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                # 对冲请求不排队：配额不足时放弃对冲，避免在限流时放大负载
+                if admit is None or await admit(False):
+                    self.hedged_requests += 1
+                    logger.debug(f"请求超过 {delay:.2f}s 未返回，发起对冲请求: {self.name}")
+                    pending.add(asyncio.create_task(fn()))
+            while True:
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        self._discard(task)
+                if winner is not None or not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if winner is None:
+                raise error
+            return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(self._discard)
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]], admit: Optional[Admit] = None) -> T:
+        if admit is not None:
+            await admit(True)
+        start = time.perf_counter()
+        delay = self._hedge_delay()
+        result = await (fn() if delay is None else self._hedged(fn, delay, admit))
+        self.latency.record(time.perf_counter() - start)
+        return result
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        retry_attempts: Optional[int] = None,
+        admit: Optional[Admit] = None
+    ) -> T:
+        """带容错地执行上游调用
+
+        Args:
+            fn: 发起一次上游请求的协程函数，每次重试都会重新调用
+            retry_attempts: 覆盖重试策略中的重试次数，为0时只尝试一次
+            admit: 准入函数（如 rate_limiter.Admission），每次尝试前在计时之外调用 admit(True)，
+                   发起对冲前调用 admit(False)，未准入时不对冲
+
+        Returns:
+            上游调用的结果
+
+        Raises:
+            CircuitOpenError: 端点已熔断
+            Exception: 不可重试的错误或重试耗尽后的最后一个错误
+        """
+        if retry_attempts is None:
+            retry_attempts = self.retry.retry_attempts
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            try:
+                result = await self._attempt(fn, admit)
+            except Exception as e:
+                if not is_retryable(e):
+                    if isinstance(e, openai.APIStatusError) and e.status_code in _REQUEST_ERROR_STATUS:
+                        # 请求本身的错误（400/422）说明端点工作正常
+                        self.breaker.record_success()
+                    elif probe:
+                        # 鉴权失败、404、程序错误等不能证明端点已恢复，只释放试探名额，不改变熔断状态
+                        self.breaker.release_probe()
+                    raise
+                self.breaker.record_failure()
+                delay = None
+                if attempt < retry_attempts:
+                    delay = self.retry.backoff(attempt, retry_after_seconds(e))
+                if delay is None:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(
+                    f"LLM请求失败，{delay:.2f}秒后第{attempt}次重试: endpoint={self.name}, error={e}"
+                )
+                await asyncio.sleep(delay)
+            except BaseException:
+                # 取消（客户端断开、外层超时、对冲落败）与端点健康无关，只释放试探名额
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    def stats(self) -> Dict[str, Any]:
+        """执行器统计"""
+        return {
+            "breaker_state": self.breaker.state,
+            "retries": self.retries,
+            "hedged_requests": self.hedged_requests,
+            "latency_p95": self.latency.quantile(0.95),
+        }
+
+
+_executors: Dict[str, ResilientExecutor] = {}
+
+
+def get_executor(endpoint: Optional[str]) -> ResilientExecutor:
+    """获取端点对应的进程级共享执行器，同一端点的所有Agent共享熔断状态
+
+    Args:
+        endpoint: 端点标识（通常为 api_base）
+
+    Returns:
+        ResilientExecutor: 执行器
+    """
+    name = endpoint or "default"
+    executor = _executors.get(name)
+    if executor is None:
+        settings = config.get("llm", {}).get("resilience", {}) or {}
+        hedge = settings.get("hedge", {}) or {}
+        executor = ResilientExecutor(
+            name,
+            retry=RetryPolicy(
+                retry_attempts=config.get("agents", {}).get("retry_attempts", 3),
+                base_delay=settings.get("base_delay", 0.5),
+                max_delay=settings.get("max_delay", 30.0),
+                max_retry_after=settings.get("max_retry_after", 60.0),
+            ),
+            breaker=CircuitBreaker(
+                name,
+                failure_threshold=settings.get("failure_threshold", 5),
+                recovery_timeout=settings.get("recovery_timeout", 30.0),
+            ),
+            hedge_quantile=hedge.get("quantile", 0.95) if hedge.get("enabled", False) else None,
+            hedge_min_samples=hedge.get("min_samples", 20),
+            hedge_min_delay=hedge.get("min_delay", 0.2),
+        )
+        _executors[name] = executor
+    return executor
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    """所有端点执行器的统计"""
+    return {name: executor.stats() for name, executor in _executors.items()}
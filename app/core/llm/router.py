@@ -0,0 +1,258 @@
+"""
+多服务商路由与负载均衡
+- 管理一组 OpenAI 兼容端点（如 DashScope 与自建 vLLM），每次调用选择当前得分最优的端点
+- 得分综合 EWMA 延迟、在途请求数（least-outstanding-requests）、EWMA 错误率和成本
+- 未观测过延迟的端点按先验延迟计分；失败的调用按惩罚延迟计入 EWMA 延迟，只失败过的端点不会一直得分最优
+- 端点出现可重试错误或已熔断时自动切换到下一个端点，所有端点都失败后按退避策略重新轮询
+- 每个端点复用 resilience 中的熔断器与对冲机制，端点列表从配置 llm.router 读取
+"""
+import asyncio
+import random
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, TypeVar
+
+from app.config.config_loader import config
+from app.core.llm.resilience import Admit, CircuitOpenError, RetryPolicy, get_executor, is_retryable
+from app.utils.logger import logger
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class EndpointStats:
+    """端点运行时统计"""
+    outstanding: int = 0
+    ewma_latency: Optional[float] = None
+    ewma_error: float = 0.0
+    requests: int = 0
+    errors: int = 0
+
+    def record(self, latency: Optional[float], ok: bool, alpha: float) -> None:
+        """记录一次调用结果
+
+        Args:
+            latency: 调用耗时（失败时为惩罚延迟），为None时不更新延迟
+            ok: 是否成功
+            alpha: EWMA 平滑系数
+        """
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self.ewma_error = (1 - alpha) * self.ewma_error + alpha * (0.0 if ok else 1.0)
+        if latency is not None:
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = (1 - alpha) * self.ewma_latency + alpha * latency
+
+
+@dataclass
+class Endpoint:
+    """一个 OpenAI 兼容端点"""
+    name: str
+    api_key: str
+    model: str
+    api_base: Optional[str] = None
+    weight: float = 1.0
+    cost_per_1k_tokens: float = 0.0
+    max_outstanding: Optional[int] = None
+    stats: EndpointStats = field(default_factory=EndpointStats)
+
+
+class Router:
+    """端点路由器"""
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        ewma_alpha: float = 0.3,
+        error_penalty: float = 10.0,
+        cost_weight: float = 0.0,
+        retry: Optional[RetryPolicy] = None,
+        initial_latency: float = 1.0,
+        failure_latency: float = 5.0,
+    ):
+        """
+        Args:
+            endpoints: 端点列表
+            ewma_alpha: EWMA 平滑系数，越大越看重最近的观测
+            error_penalty: 错误率惩罚系数，得分乘以 (1 + error_penalty * 错误率)
+            cost_weight: 成本权重，得分加上 cost_weight * 每千Token成本
+            retry: 所有端点都失败后的退避策略，默认重试次数取 agents.retry_attempts
+            initial_latency: 未观测过延迟的端点使用的先验延迟（秒）
+            failure_latency: 可重试错误计入 EWMA 延迟的最小惩罚延迟（秒），实际耗时更长时取实际耗时
+        """
+        if not endpoints:
+            raise ValueError("路由器至少需要一个端点")
+        self.endpoints = endpoints
+        self.ewma_alpha = ewma_alpha
+        self.error_penalty = error_penalty
+        self.cost_weight = cost_weight
+        self.initial_latency = initial_latency
+        self.failure_latency = failure_latency
+        self.retry = retry or RetryPolicy(retry_attempts=config.get("agents", {}).get("retry_attempts", 3))
+
+    def _score(self, endpoint: Endpoint) -> float:
+        stats = endpoint.stats
+        latency = stats.ewma_latency if stats.ewma_latency is not None else self.initial_latency
+        score = latency * (stats.outstanding + 1) / max(endpoint.weight, 1e-6)
+        score *= 1 + self.error_penalty * stats.ewma_error
+        return score + self.cost_weight * endpoint.cost_per_1k_tokens
+
+    def _available(self, endpoint: Endpoint) -> bool:
+        if get_executor(endpoint.name).breaker.is_open():
+            return False
+        return endpoint.max_outstanding is None or endpoint.stats.outstanding < endpoint.max_outstanding
+
+    def choose(self, exclude: Optional[Set[str]] = None) -> Optional[Endpoint]:
+        """选择当前得分最优的可用端点
+
+        Args:
+            exclude: 本次调用中已失败、需要跳过的端点名称
+
+        Returns:
+            Optional[Endpoint]: 没有可用端点时返回None
+        """
+        exclude = exclude or set()
+        candidates = [ep for ep in self.endpoints if ep.name not in exclude and self._available(ep)]
+        if not candidates:
+            return None
+        best = min(self._score(ep) for ep in candidates)
+        return random.choice([ep for ep in candidates if self._score(ep) == best])
+
+    async def _call_endpoint(
+        self,
+        endpoint: Endpoint,
+        fn: Callable[[Endpoint], Awaitable[T]],
+        admit: Optional[Callable[[Endpoint], Optional[Admit]]] = None
+    ) -> T:
+        stats = endpoint.stats
+        stats.outstanding += 1
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            # 同一端点不重试，失败后立即切换端点
+            result = await get_executor(endpoint.name).call(
+                lambda: fn(endpoint), retry_attempts=0, admit=admit(endpoint) if admit is not None else None
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            elapsed = loop.time() - start
+            if is_retryable(e):
+                stats.record(max(elapsed, self.failure_latency), ok=False, alpha=self.ewma_alpha)
+            else:
+                # 请求本身的错误（如400）与端点健康无关
+                stats.record(elapsed, ok=True, alpha=self.ewma_alpha)
+            raise
+        else:
+            stats.record(loop.time() - start, ok=True, alpha=self.ewma_alpha)
+            return result
+        finally:
+            stats.outstanding -= 1
+
+    async def call(
+        self,
+        fn: Callable[[Endpoint], Awaitable[T]],
+        admit: Optional[Callable[[Endpoint], Optional[Admit]]] = None
+    ) -> T:
+        """在端点池上执行一次调用，失败时自动切换端点
+
+        Args:
+            fn: 以选中的端点为参数发起上游请求的协程函数
+            admit: 以端点为参数返回该端点准入函数（如限流）的函数，见 ResilientExecutor.call
+
+        Returns:
+            上游调用的结果
+
+        Raises:
+            Exception: 不可重试的错误，或所有尝试都失败后的最后一个错误
+        """
+        tried: Set[str] = set()
+        error: Optional[BaseException] = None
+        rounds = 0
+        while True:
+            endpoint = self.choose(exclude=tried)
+            if endpoint is None:
+                # 所有端点都已尝试过（或不可用），退避后开始新一轮
+                delay = self.retry.backoff(rounds) if rounds < self.retry.retry_attempts else None
+                if delay is None:
+                    raise error or RuntimeError("没有可用的LLM端点")
+                rounds += 1
+                tried.clear()
+                logger.warning(f"所有LLM端点均失败，{delay:.2f}秒后开始第{rounds}轮重试")
+                await asyncio.sleep(delay)
+                continue
+
+            try:
+                return await self._call_endpoint(endpoint, fn, admit)
+            except Exception as e:
+                if not isinstance(e, CircuitOpenError) and not is_retryable(e):
+                    raise
+                error = e
+                tried.add(endpoint.name)
+                logger.warning(f"LLM端点 {endpoint.name} 调用失败，切换端点: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各端点的路由统计"""
+        return {
+            ep.name: {
+                "model": ep.model,
+                "outstanding": ep.stats.outstanding,
+                "ewma_latency": ep.stats.ewma_latency,
+                "ewma_error": ep.stats.ewma_error,
+                "requests": ep.stats.requests,
+                "errors": ep.stats.errors,
+                "score": self._score(ep),
+            }
+            for ep in self.endpoints
+        }
+
+
+_default_router: Optional[Router] = None
+
+
+def _on_config_change(new, old, changed) -> None:
+    """配置 llm.router 变化时丢弃当前路由器，下次请求按新配置重建"""
+    global _default_router
+    _default_router = None
+    logger.info("路由配置已变化，将按新配置重建路由器")
+
+
+config.subscribe(_on_config_change, "llm.router", in_loop=True)
+
+
+def get_default_router() -> Optional[Router]:
+    """根据配置 llm.router 获取进程级共享路由器
+
+    Returns:
+        Optional[Router]: 未开启路由时返回None
+    """
+    global _default_router
+    settings = config.get("llm", {}).get("router", {}) or {}
+    if not settings.get("enabled", False):
+        return None
+    if _default_router is None:
+        endpoints = [
+            Endpoint(
+                name=item.get("name") or item.get("api_base") or f"endpoint-{index}",
+                api_key=item["api_key"],
+                model=item["model"],
+                api_base=item.get("api_base"),
+                weight=item.get("weight", 1.0),
+                cost_per_1k_tokens=item.get("cost_per_1k_tokens", 0.0),
+                max_outstanding=item.get("max_outstanding"),
+            )
+            for index, item in enumerate(settings.get("endpoints") or [])
+        ]
+        _default_router = Router(
+            endpoints,
+            ewma_alpha=settings.get("ewma_alpha", 0.3),
+            error_penalty=settings.get("error_penalty", 10.0),
+            cost_weight=settings.get("cost_weight", 0.0),
+            initial_latency=settings.get("initial_latency", 1.0),
+            failure_latency=settings.get("failure_latency", 5.0),
+        )
+        logger.info(f"启用LLM路由: {[ep.name for ep in endpoints]}")
+    return _default_router
@@ -0,0 +1,331 @@
+"""
+LLM语义缓存
+- 精确缓存未命中时，按最后一条用户消息的向量相似度查找意思相近的历史提问，相似度达到阈值即复用其回复
+- 只在上下文相同（系统提示词、之前的消息、模型和请求参数均相同）的条目之间匹配，不同对话互不复用
+- 默认使用本地的字符 n-gram 哈希向量（无需联网和模型文件），可传入自定义的同步或异步向量函数；
+  哈希向量只反映字面相似度，只差几个字、意思不同的提问相似度也很高（如 "判断整数是否为素数" 与 "……是否为偶数"
+  的长提问约 0.93，长提问中只改一个数字可达 0.97），因此默认阈值取 0.98，只匹配大小写、空白等几乎相同的提问；
+  需要匹配改写过的提问时应改用语义向量模型，不要直接调低阈值
+- 向量保存在预分配的 NumPy 矩阵中，查找为一次矩阵向量乘；配置 path 时矩阵使用内存映射文件，
+  条目元数据在关闭时写入同目录的 entries.json（含各槽位向量的校验和），重启后继续使用；
+  异常退出后向量文件中已被新条目覆盖的槽位校验和不一致，加载时丢弃，不会把新向量与旧回复配对
+- 条目按 TTL 过期，写满后淘汰最久未命中的条目
+- 缓存为可选功能，通过配置 llm.semantic_cache.enabled 或显式传入 BaseAgent 开启
+"""
+import inspect
+import json
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from openai.types.chat import ChatCompletionChunk
+
+from app.config.config_loader import config
+from app.core.llm.cache import accumulate_chunks
+from app.core.llm.single_flight import aclose_quietly
+from app.utils.logger import logger
+
+
+Embedder = Callable[[str], Union[np.ndarray, Awaitable[np.ndarray]]]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class HashingEmbedder:
+    """字符 n-gram 哈希向量
+
+    文本规范化（小写、合并空白）后取各长度的字符 n-gram，按 crc32 哈希到固定维度并带符号累加，
+    最后做 L2 归一化。结果在进程之间稳定，可以持久化。
+    """
+
+    def __init__(self, dim: int = 256, ngram_range: Tuple[int, int] = (2, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def __call__(self, text: str) -> np.ndarray:
+        text = _WHITESPACE.sub(" ", text.lower()).strip()
+        vector = np.zeros(self.dim, dtype=np.float32)
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(max(len(text) - n + 1, 0)):
+                h = zlib.crc32(text[i:i + n].encode("utf-8"))
+                # 最高位决定符号，减少哈希冲突造成的偏差
+                vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+
+def vector_checksum(vector: np.ndarray) -> int:
+    """向量内容的校验和，用于加载时确认向量文件中的槽位仍是元数据记录的那条"""
+    return zlib.crc32(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+
+
+def scope_of(key: str) -> int:
+    """将上下文的缓存键转为可存入 int64 数组的标识"""
+    return int(key[:15], 16)
+
+
+class VectorIndex:
+    """固定容量的向量索引
+
+    向量按槽位保存在 (capacity, dim) 的 float32 矩阵中，空槽位 scope 为 -1。
+    """
+
+    def __init__(self, dim: int, capacity: int, path: Optional[str] = None):
+        self.dim = dim
+        self.capacity = capacity
+        self.path = Path(path) if path else None
+        self.vectors = self._open_vectors()
+        self.scopes = np.full(capacity, -1, dtype=np.int64)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+
+    def _open_vectors(self) -> np.ndarray:
+        if self.path is None:
+            return np.zeros((self.capacity, self.dim), dtype=np.float32)
+        self.path.mkdir(parents=True, exist_ok=True)
+        file = self.path / "vectors.npy"
+        if file.exists():
+            vectors = np.lib.format.open_memmap(file, mode="r+")
+            if vectors.shape == (self.capacity, self.dim) and vectors.dtype == np.float32:
+                return vectors
+            logger.warning(f"语义缓存向量文件尺寸与配置不一致，重新创建: {file}")
+            del vectors
+        return np.lib.format.open_memmap(file, mode="w+", dtype=np.float32, shape=(self.capacity, self.dim))
+
+    def search(self, vector: np.ndarray, scope: int, now: float) -> Tuple[int, float]:
+        """查找同一上下文中相似度最高的未过期条目
+
+        Returns:
+            Tuple[int, float]: (槽位, 相似度)，没有候选时槽位为 -1
+        """
+        candidates = np.flatnonzero((self.scopes == scope) & (self.expires_at >= now))
+        if candidates.size == 0:
+            return -1, 0.0
+        scores = self.vectors[candidates] @ vector
+        best = int(np.argmax(scores))
+        return int(candidates[best]), float(scores[best])
+
+    def allocate(self, now: float) -> Tuple[int, bool]:
+        """分配一个槽位：优先空槽位或已过期的槽位，否则淘汰最久未命中的条目
+
+        Returns:
+            Tuple[int, bool]: (槽位, 是否淘汰了未过期的条目)
+        """
+        free = np.flatnonzero((self.scopes == -1) | (self.expires_at < now))
+        if free.size:
+            return int(free[0]), False
+        return int(np.argmin(self.last_used)), True
+
+    def put(self, slot: int, vector: np.ndarray, scope: int, expires_at: float, now: float) -> None:
+        self.vectors[slot] = vector
+        self.scopes[slot] = scope
+        self.expires_at[slot] = expires_at
+        self.last_used[slot] = now
+
+    def remove(self, slot: int) -> None:
+        self.scopes[slot] = -1
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.scopes != -1))
+
+
+class SemanticCache:
+    """语义补全缓存"""
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        dim: int = 256,
+        threshold: float = 0.98,
+        max_entries: int = 10000,
+        ttl: float = 3600,
+        path: Optional[str] = None,
+    ):
+        """
+        Args:
+            embedder: 向量函数，输入文本返回归一化的一维向量（可为异步函数），默认使用 HashingEmbedder
+            dim: 向量维度，须与 embedder 输出一致
+            threshold: 命中所需的最低余弦相似度；默认的哈希向量只反映字面相似度，阈值过低会把意思不同的提问判为命中
+            max_entries: 最大条目数，写满后淘汰最久未命中的条目
+            ttl: 条目有效期（秒）
+            path: 持久化目录，为None时只保存在内存中
+        """
+        self.embedder = embedder or HashingEmbedder(dim)
+        self.threshold = threshold
+        self.ttl = ttl
+        self.index = VectorIndex(dim, max_entries, path)
+        # 槽位 -> (提问文本, ChatCompletion 数据)
+        self._entries: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+        self._load_entries()
+
+    async def embed(self, text: str) -> np.ndarray:
+        vector = self.embedder(text)
+        if inspect.isawaitable(vector):
+            vector = await vector
+        return np.asarray(vector, dtype=np.float32)
+
+    def lookup(self, vector: np.ndarray, scope: int) -> Optional[Dict[str, Any]]:
+        """按向量查找缓存的回复"""
+        start = time.perf_counter()
+        now = time.time()
+        slot, score = self.index.search(vector, scope, now)
+        self.lookup_seconds += time.perf_counter() - start
+        if slot < 0 or score < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.index.last_used[slot] = now
+        return self._entries[slot][1]
+
+    def add(self, vector: np.ndarray, scope: int, prompt: str, value: Dict[str, Any]) -> None:
+        """写入一条回复"""
+        now = time.time()
+        slot, evicted = self.index.allocate(now)
+        if evicted:
+            self.evictions += 1
+        self.index.put(slot, vector, scope, now + self.ttl, now)
+        self._entries[slot] = (prompt, value)
+
+    async def record_stream(
+        self,
+        vector: np.ndarray,
+        scope: int,
+        prompt: str,
+        response: AsyncIterator[ChatCompletionChunk]
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        """透传流式响应，并在完整结束后写入缓存；调用方中途放弃读取时关闭上游流"""
+        chunks = []
+        finished = False
+        try:
+            async for chunk in response:
+                chunks.append(chunk)
+                finished = finished or any(choice.finish_reason for choice in chunk.choices)
+                yield chunk
+        finally:
+            await aclose_quietly(response)
+        if finished:
+            self.add(vector, scope, prompt, accumulate_chunks(chunks))
+
+    def _load_entries(self) -> None:
+        if self.index.path is None:
+            return
+        file = self.index.path / "entries.json"
+        if not file.exists():
+            return
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取语义缓存失败: {e}")
+            return
+        if data.get("dim") != self.index.dim or data.get("capacity") != self.index.capacity:
+            return
+        now = time.time()
+        stale = 0
+        for entry in data.get("entries", []):
+            slot = entry["slot"]
+            if entry["expires_at"] < now:
+                continue
+            if entry.get("checksum") != vector_checksum(self.index.vectors[slot]):
+                # 上次保存之后该槽位已写入其他条目的向量（进程异常退出，元数据未更新）
+                stale += 1
+                continue
+            self.index.scopes[slot] = entry["scope"]
+            self.index.expires_at[slot] = entry["expires_at"]
+            self.index.last_used[slot] = entry["last_used"]
+            self._entries[slot] = (entry["prompt"], entry["value"])
+        if stale:
+            logger.warning(f"语义缓存中 {stale} 条的向量与元数据不一致，已丢弃")
+        logger.info(f"加载语义缓存: {len(self._entries)} 条")
+
+    def save(self) -> None:
+        """将向量刷新到磁盘并写入条目元数据（未配置持久化目录时不执行）"""
+        if self.index.path is None:
+            return
+        self.index.vectors.flush()
+        entries = [
+            {
+                "slot": slot,
+                "scope": int(self.index.scopes[slot]),
+                "expires_at": float(self.index.expires_at[slot]),
+                "last_used": float(self.index.last_used[slot]),
+                "checksum": vector_checksum(self.index.vectors[slot]),
+                "prompt": prompt,
+                "value": value,
+            }
+            for slot, (prompt, value) in self._entries.items()
+            if self.index.scopes[slot] != -1
+        ]
+        data = {"dim": self.index.dim, "capacity": self.index.capacity, "entries": entries}
+        tmp = self.index.path / "entries.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        tmp.replace(self.index.path / "entries.json")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中和淘汰统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.index),
+            "capacity": self.index.capacity,
+            "avg_lookup_seconds": self.lookup_seconds / total if total else 0.0,
+        }
+
+
+def last_user_prompt(messages: List[Dict[str, Any]]) -> Optional[str]:
+    """取最后一条用户消息的文本；最后一条不是用户消息时不使用语义缓存"""
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    content = messages[-1].get("content")
+    return content if isinstance(content, str) and content else None
+
+
+_default_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_default_semantic_cache() -> Optional[SemanticCache]:
+    """根据配置 llm.semantic_cache 获取进程级共享语义缓存
+
+    Returns:
+        Optional[SemanticCache]: 未开启时返回None
+    """
+    global _default_semantic_cache
+    cache_config = config.get("llm", {}).get("semantic_cache", {}) or {}
+    if not cache_config.get("enabled", False):
+        return None
+    if _default_semantic_cache is None:
+        dim = cache_config.get("dim", 256)
+        _default_semantic_cache = SemanticCache(
+            embedder=HashingEmbedder(dim, tuple(cache_config.get("ngram_range", (2, 4)))),
+            dim=dim,
+            threshold=cache_config.get("threshold", 0.98),
+            max_entries=cache_config.get("max_entries", 10000),
+            ttl=cache_config.get("ttl", 3600),
+            path=cache_config.get("path"),
+        )
+        logger.info(
+            f"启用LLM语义缓存: threshold={_default_semantic_cache.threshold}, "
+            f"max_entries={_default_semantic_cache.index.capacity}, 持久化={'开启' if cache_config.get('path') else '关闭'}"
+        )
+    return _default_semantic_cache
+
+
+def close_semantic_cache() -> None:
+    """保存共享语义缓存"""
+    if _default_semantic_cache is not None:
+        try:
+            _default_semantic_cache.save()
+        except Exception as e:
+            logger.error(f"保存语义缓存失败: {e}")
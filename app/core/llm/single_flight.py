@@ -0,0 +1,201 @@
+"""
+LLM请求合并（single-flight）
+- 相同请求键的并发调用只向上游发起一次请求，其余调用等待并共享结果
+- 流式请求由后台任务读取上游分片并广播给所有订阅者，晚到的订阅者会先回放已收到的分片
+- 所有订阅者都放弃读取时取消上游流
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.config.config_loader import config
+from app.utils.logger import logger
+
+
+async def aclose_quietly(stream: Any) -> None:
+    """关闭上游流（兼容 openai AsyncStream 和异步生成器）"""
+    close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+    if close is None:
+        return
+    try:
+        result = close()
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception as e:
+        logger.debug(f"关闭上游流失败: {e}")
+
+
+class _StreamBroadcast:
+    """将一个上游流式响应广播给多个订阅者"""
+
+    def __init__(self, source: AsyncIterator[Any], on_done: Callable[[], None]):
+        self._source = source
+        self._on_done = on_done
+        self._chunks: List[Any] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._subscribers = 0
+        self._task = asyncio.create_task(self._pump())
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self) -> None:
+        try:
+            async for chunk in self._source:
+                self._chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self._error = RuntimeError("上游流式响应已被取消")
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+            self._on_done()
+            await aclose_quietly(self._source)
+
+    def subscribe(self) -> "_BroadcastReader":
+        """订阅广播，从第一个分片开始读取
+
+        调用时即登记为订阅者（而不是首次读取时），已拿到广播但尚未开始读取的订阅者
+        不会因为其他订阅者全部放弃而丢失上游流。
+        """
+        self._subscribers += 1
+        return _BroadcastReader(self)
+
+    def _unsubscribe(self) -> None:
+        self._subscribers -= 1
+        if self._subscribers == 0 and not self._done:
+            # 同一轮事件循环中可能还有刚拿到广播、尚未登记的订阅者，稍后再确认；
+            # 订阅者可能在垃圾回收时注销，不一定处于事件循环中
+            loop = self._task.get_loop()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._cancel_if_unused)
+
+    def _cancel_if_unused(self) -> None:
+        """所有订阅者都已放弃时取消上游流"""
+        if self._subscribers == 0 and not self._done:
+            self._task.cancel()
+
+
+class _BroadcastReader:
+    """广播的一个订阅者
+
+    读完、出错、aclose() 或被垃圾回收时注销且只注销一次；
+    与异步生成器不同，从未开始读取的订阅者关闭或被丢弃时也会注销。
+    """
+
+    def __init__(self, broadcast: _StreamBroadcast):
+        self._broadcast = broadcast
+        self._index = 0
+        self._released = False
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._broadcast._unsubscribe()
+
+    def __aiter__(self) -> "_BroadcastReader":
+        return self
+
+    async def __anext__(self) -> Any:
+        broadcast = self._broadcast
+        while not self._released:
+            if self._index < len(broadcast._chunks):
+                chunk = broadcast._chunks[self._index]
+                self._index += 1
+                return chunk
+            if broadcast._done:
+                self._release()
+                if broadcast._error is not None:
+                    raise broadcast._error
+                break
+            await broadcast._changed.wait()
+        raise StopAsyncIteration
+
+    async def aclose(self) -> None:
+        self._release()
+
+    def __del__(self) -> None:
+        self._release()
+
+
+class SingleFlight:
+    """请求合并器
+
+    同一个实例内，键相同的并发请求共享一次上游调用。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], stream: bool = False) -> Any:
+        """执行或加入一次合并请求
+
+        Args:
+            key: 请求键，键相同的请求会被合并
+            fn: 实际发起上游请求的协程函数
+            stream: fn 是否返回流式响应
+
+        Returns:
+            非流式时为共享的响应对象；流式时为独立的分片异步迭代器
+        """
+        key = f"{key}:{'stream' if stream else 'full'}"
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            if stream:
+                async def start() -> _StreamBroadcast:
+                    response = await fn()
+                    return _StreamBroadcast(response, lambda: self._forget(key, task))
+                task = asyncio.create_task(start())
+                # 建立流失败时立即移除；成功时在广播结束后移除
+                task.add_done_callback(
+                    lambda t: self._forget(key, t) if t.cancelled() or t.exception() else None
+                )
+            else:
+                task = asyncio.create_task(fn())
+                task.add_done_callback(lambda t: self._forget(key, t))
+            self._calls[key] = task
+        else:
+            self.followers += 1
+
+        # shield 保证单个调用方被取消时不影响其他等待者
+        result = await asyncio.shield(task)
+        if stream:
+            return result.subscribe()
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """请求合并统计"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+
+_default_single_flight: Optional[SingleFlight] = None
+
+
+def get_default_single_flight() -> Optional[SingleFlight]:
+    """根据配置 llm.single_flight 获取进程级共享的请求合并器
+
+    Returns:
+        Optional[SingleFlight]: 未开启时返回None
+    """
+    global _default_single_flight
+    settings = config.get("llm", {}).get("single_flight", {}) or {}
+    if not settings.get("enabled", False):
+        return None
+    if _default_single_flight is None:
+        _default_single_flight = SingleFlight()
+    return _default_single_flight
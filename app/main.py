@@ -4,7 +4,24 @@
 
 from app.utils.logger import logger
 from app.config.config_loader import config
-from fastapi import FastAPI
+from app.api import chat, jobs
+from app.core.llm.client_registry import client_registry
+from app.model.database import dispose_engine
+from app.core.agents.agent_pool import get_agent_pool
+from app.core.agents.message_bus import close_message_bus, get_message_bus
+from app.core.agents.tools import shutdown_tool_pools
+from app.service.job_worker import start_job_pool, stop_job_pool
+from app.core.agents.session_backend import close_session_backend, get_session_backend
+from app.core.llm.cache import get_default_cache
+from app.core.llm.rate_limiter import rate_limiter_stats
+from app.core.llm.resilience import executor_stats
+from app.core.llm.router import get_default_router
+from app.core.llm.semantic_cache import close_semantic_cache, get_default_semantic_cache
+from app.core.llm.single_flight import get_default_single_flight
+from app.utils.logger import log_stats
+from app.utils.metrics import MetricsMiddleware, register_stats_source, render_metrics
+from app.utils.tracing import TracingMiddleware, shutdown_tracing, tracing_stats
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
@@ -13,8 +30,20 @@ from contextlib import asynccontextmanager
 async def lifespan(app: FastAPI):
     # 应用启动
     logger.info("应用启动")
+    # 配置文件监视只在服务进程中启动，导入 app 模块的命令行工具和工作进程不会启动监视线程
+    config.start_watching()
+    await start_job_pool()
     yield
-    # 应用关闭
+    await stop_job_pool()
+    await close_message_bus()
+    config.stop()
+    # 应用关闭，写完待落库的会话消息，释放共享的LLM连接池和数据库连接池
+    await close_session_backend()
+    await client_registry.aclose()
+    close_semantic_cache()
+    await dispose_engine()
+    shutdown_tracing()
+    shutdown_tool_pools()
     logger.info("应用关闭")
 
 # 创建FastAPI应用
@@ -37,11 +66,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 配置指标
+metrics_config = config.get("metrics", {}) or {}
+metrics_path = metrics_config.get("path", "/metrics")
+if metrics_config.get("enabled", True):
+    app.add_middleware(MetricsMiddleware, exclude=(metrics_path,))
+    register_stats_source("llm_pool", client_registry.stats)
+    register_stats_source("rate_limiter", rate_limiter_stats)
+    register_stats_source("executor", executor_stats)
+    register_stats_source("router", lambda: (router.stats() if (router := get_default_router()) else {}))
+    register_stats_source("cache", lambda: (cache.stats() if (cache := get_default_cache()) else {}), per_instance=False)
+    register_stats_source(
+        "single_flight",
+        lambda: (flight.stats() if (flight := get_default_single_flight()) else {}),
+        per_instance=False,
+    )
+    register_stats_source(
+        "semantic_cache",
+        lambda: (cache.stats() if (cache := get_default_semantic_cache()) else {}),
+        per_instance=False,
+    )
+    register_stats_source("agent_pool", lambda: get_agent_pool().stats(), per_instance=False)
+    register_stats_source("message_bus", lambda: get_message_bus().stats(), per_instance=False)
+    register_stats_source("session", lambda: get_session_backend().stats(), per_instance=False)
+    register_stats_source("log", log_stats, per_instance=False)
+    register_stats_source("tracing", tracing_stats, per_instance=False)
+
+    @app.get(metrics_path, include_in_schema=False)
+    async def metrics(request: Request):
+        """Prometheus 指标"""
+        content, content_type = render_metrics(request.headers.get("accept"))
+        return Response(content=content, media_type=content_type)
+
+# 配置链路追踪：最后添加的中间件位于最外层，先于指标中间件确定请求的 trace_id
+app.add_middleware(TracingMiddleware, exclude=(metrics_path,))
+
+# 注册路由
+app.include_router(chat.router, prefix=config.get("api", {}).get("prefix", "/api/v1"))
+app.include_router(jobs.router, prefix=config.get("api", {}).get("prefix", "/api/v1"))
+
 @app.get(config.get("api", {}).get("prefix", "/api/v1") + "/")
 async def root():
     """根路由"""
     return {"message": f"Welcome to {config.get('app', {}).get('name', 'Lithium')} Multi-Agent Engine"}
 
+@app.get(config.get("api", {}).get("prefix", "/api/v1") + "/llm/pools")
+async def llm_pool_stats():
+    """共享LLM连接池的占用和等待统计"""
+    return client_registry.stats()
+
 if __name__ == "__main__":
     import uvicorn
 
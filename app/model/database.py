@@ -0,0 +1,102 @@
+"""
+异步数据库引擎
+- 使用配置中的 database.url 创建 SQLAlchemy 异步引擎，同步驱动URL自动转换为对应的异步驱动
+  （sqlite -> aiosqlite，postgresql -> asyncpg，mysql -> aiomysql）
+- 引擎在首次使用时创建，应用关闭时通过 dispose_engine() 释放
+- SQLite 启用 WAL 模式，读写互不阻塞
+"""
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
+
+from app.config.config_loader import config
+from app.utils.logger import logger
+
+
+# 同步驱动到异步驱动的映射
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+class Base(DeclarativeBase):
+    """所有ORM模型的基类"""
+
+
+def async_url(url: str) -> str:
+    """将同步数据库URL转换为异步驱动URL，已指定驱动的URL保持不变
+
+    Args:
+        url: 数据库URL，如 sqlite:///./lithium.db
+
+    Returns:
+        str: 异步驱动URL，如 sqlite+aiosqlite:///./lithium.db
+    """
+    scheme, sep, rest = url.partition("://")
+    if not sep or "+" in scheme:
+        return url
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[async_sessionmaker[AsyncSession]] = None
+_schema_ready = False
+
+
+def get_engine() -> AsyncEngine:
+    """获取进程内共享的异步引擎，首次调用时根据配置创建"""
+    global _engine, _sessionmaker
+    if _engine is None:
+        db_config = config.get("database", {}) or {}
+        url = async_url(db_config.get("url", "sqlite:///./lithium.db"))
+        kwargs = {"echo": db_config.get("echo", False), "pool_pre_ping": True}
+        if not url.startswith("sqlite"):
+            kwargs["pool_size"] = db_config.get("pool_size", 10)
+            kwargs["max_overflow"] = db_config.get("max_overflow", 20)
+        _engine = create_async_engine(url, **kwargs)
+        if url.startswith("sqlite"):
+            event.listen(_engine.sync_engine, "connect", _sqlite_pragmas)
+        _sessionmaker = async_sessionmaker(_engine, expire_on_commit=False)
+        logger.info(f"创建数据库引擎: {_engine.url.render_as_string(hide_password=True)}")
+    return _engine
+
+
+def _sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """获取共享的会话工厂"""
+    get_engine()
+    return _sessionmaker
+
+
+async def init_db() -> None:
+    """创建尚不存在的表和索引，进程内只执行一次"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    # 导入模型以注册到 Base.metadata
+    import app.model.conversation  # noqa: F401
+    import app.model.job  # noqa: F401
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    _schema_ready = True
+
+
+async def dispose_engine() -> None:
+    """释放引擎及其连接池"""
+    global _engine, _sessionmaker, _schema_ready
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _sessionmaker = None
+        _schema_ready = False
@@ -0,0 +1,65 @@
+"""
+后台任务模型
+- jobs 保存任务状态，(status, created_at) 索引用于工作进程按提交顺序领取任务
+- job_events 保存任务进度事件，(job_id, seq) 唯一索引用于按序号增量读取，支持跨进程流式推送进度
+- 事件序号通过任务行的 last_event_seq 分配，多个进程并发写入同一任务的事件时在行锁上排队
+"""
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import JSON, Boolean, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.model.conversation import utcnow
+from app.model.database import Base
+
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class Job(Base):
+    """后台任务"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_created", "status", "created_at"),
+    )
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(64))
+    status: Mapped[str] = mapped_column(String(16), default=JOB_QUEUED)
+    payload: Mapped[Any] = mapped_column(JSON, default=dict)
+    result: Mapped[Optional[Any]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # 单任务超时（秒），提交时确定
+    timeout: Mapped[float] = mapped_column(default=300)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+    worker_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # 运行中的任务由工作进程定期刷新，超时未刷新视为工作进程已退出
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # 最后一条进度事件的序号，写入事件时在同一事务中原子递增分配
+    last_event_seq: Mapped[int] = mapped_column(Integer, default=-1)
+
+
+class JobEvent(Base):
+    """任务进度事件，seq 为任务内从0开始的递增序号"""
+    __tablename__ = "job_events"
+    __table_args__ = (
+        Index("ix_job_events_job_seq", "job_id", "seq", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job_id: Mapped[str] = mapped_column(String(32), ForeignKey("jobs.id", ondelete="CASCADE"))
+    seq: Mapped[int] = mapped_column(Integer)
+    type: Mapped[str] = mapped_column(String(32))
+    data: Mapped[Any] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
@@ -0,0 +1,63 @@
+"""
+对话与智能体运行接口的请求/响应模型
+"""
+from typing import Any, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ChatMessage(BaseModel):
+    """对话消息"""
+    role: Literal["system", "user", "assistant"] = Field(..., description="消息角色")
+    content: str = Field(..., description="消息内容")
+    name: Optional[str] = Field(default=None, description="可选的名称")
+
+
+class ChatRequest(BaseModel):
+    """对话请求，最后一条消息必须是用户消息"""
+    messages: List[ChatMessage] = Field(..., min_length=1, description="对话消息列表")
+    session_id: Optional[str] = Field(
+        default=None,
+        max_length=64,
+        description="会话ID；指定后历史从会话后端加载并持久化新轮次，messages 中只需包含系统消息和本轮用户消息",
+    )
+    stream: bool = Field(default=True, description="是否以SSE流式返回")
+    temperature: Optional[float] = Field(default=None, ge=0, le=2, description="采样温度")
+    max_tokens: Optional[int] = Field(default=None, ge=1, description="生成的最大token数")
+
+
+class ChatResponse(BaseModel):
+    """非流式对话响应"""
+    content: str = Field(..., description="回复内容")
+    ttfb_ms: float = Field(..., description="首字节耗时（毫秒）")
+    total_ms: float = Field(..., description="总耗时（毫秒）")
+
+
+class AgentTaskSpec(BaseModel):
+    """智能体任务节点"""
+    name: str = Field(..., description="任务名称，在同一请求内唯一")
+    prompt: str = Field(..., description="提示词，依赖任务的结果会附加在其后")
+    system_prompt: Optional[str] = Field(default=None, description="该任务Agent的系统提示词")
+    depends_on: List[str] = Field(default_factory=list, description="依赖的任务名称")
+
+
+class AgentRunRequest(BaseModel):
+    """多智能体运行请求"""
+    tasks: List[AgentTaskSpec] = Field(..., min_length=1, description="任务DAG")
+    stream: bool = Field(default=True, description="是否以SSE在每个任务完成时推送结果")
+
+
+class AgentTaskResult(BaseModel):
+    """任务执行结果"""
+    name: str
+    status: str
+    result: Any = None
+    error: Optional[str] = None
+    attempts: int = 0
+    elapsed: float = 0.0
+
+
+class SessionMessages(BaseModel):
+    """会话消息"""
+    session_id: str
+    messages: List[ChatMessage]
@@ -0,0 +1,37 @@
+"""
+后台任务接口的请求/响应模型
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobSubmitRequest(BaseModel):
+    """提交任务请求"""
+    kind: str = Field(default="agents.run", description="任务类型")
+    payload: Dict[str, Any] = Field(default_factory=dict, description="任务参数，agents.run 与 /agents/run 的请求体相同")
+    timeout: Optional[float] = Field(default=None, gt=0, description="超时（秒），不超过 agents.timeout")
+
+
+class JobInfo(BaseModel):
+    """任务信息"""
+    id: str
+    kind: str
+    status: str = Field(..., description="queued / running / succeeded / failed / cancelled")
+    result: Any = None
+    error: Optional[str] = None
+    timeout: float
+    attempts: int = 0
+    cancel_requested: bool = False
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class JobEventInfo(BaseModel):
+    """任务进度事件"""
+    seq: int
+    type: str = Field(..., description="status：状态变化；其他类型由任务上报，如 agents.run 的 task")
+    data: Any = None
+    created_at: str
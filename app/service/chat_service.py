@@ -0,0 +1,168 @@
+"""
+对话服务
+- 根据配置文件 llm 部分创建 Agent（共享连接池，相同系统提示词和参数的Agent由模板池分支得到），
+  指定会话ID时创建持久化会话Agent
+- 将 Agent 的流式输出转换为 SSE 事件，并记录首字节耗时（TTFB）
+- 将接口层的任务描述转换为编排器任务
+"""
+import json
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from app.config.config_loader import config
+from app.core.agents.agent_pool import get_agent_pool
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.conversation_agent import ConversationAgent
+from app.core.agents.model_config import ModelConfig
+from app.core.agents.orchestrator import AgentTask, TaskResult
+from app.schema.chat import AgentTaskSpec, ChatMessage
+from app.utils.logger import logger
+
+
+def build_model_config(**overrides) -> ModelConfig:
+    """根据配置文件 llm 部分创建模型配置
+
+    Args:
+        **overrides: 覆盖的字段，值为None的字段会被忽略
+
+    Returns:
+        ModelConfig: 模型配置
+    """
+    llm_config = config.get("llm", {})
+    fields = {
+        "api_key": llm_config.get("api_key"),
+        "api_base": llm_config.get("api_base"),
+        "model": llm_config.get("model", "gpt-3.5-turbo"),
+        "temperature": llm_config.get("temperature", 0.7),
+    }
+    fields.update({k: v for k, v in overrides.items() if v is not None})
+    return ModelConfig(**fields)
+
+
+def create_agent(
+    system_prompt: Optional[str] = None,
+    history: Optional[List[ChatMessage]] = None,
+    session_id: Optional[str] = None,
+    **overrides
+) -> BaseAgent:
+    """创建Agent并载入历史消息
+
+    Args:
+        system_prompt: 系统提示词
+        history: 历史消息
+        session_id: 会话ID，指定时历史从会话后端懒加载，history 中只有系统消息生效
+        **overrides: 覆盖的模型配置字段
+
+    Returns:
+        BaseAgent: Agent实例
+    """
+    if session_id is not None:
+        system = [system_prompt] if system_prompt else []
+        system.extend(m.content for m in history or [] if m.role == "system")
+        return ConversationAgent(
+            build_model_config(**overrides), session_id, system_prompt="\n\n".join(system) or None
+        )
+    # 相同系统提示词和模型参数的Agent复用模板，只创建共享系统提示词的分支
+    template = json.dumps(
+        {"system_prompt": system_prompt, **{k: v for k, v in overrides.items() if v is not None}},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    agent = get_agent_pool().acquire(
+        template,
+        lambda: BaseAgent(model_config=build_model_config(**overrides), system_prompt=system_prompt),
+    )
+    for message in history or []:
+        agent.add_message(message.role, message.content, message.name)
+    return agent
+
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """格式化一条SSE事件"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class StreamTimer:
+    """记录一次流式响应的首字节和总耗时"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_byte: Optional[float] = None
+
+    def mark_first_byte(self) -> None:
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+
+    @property
+    def ttfb_ms(self) -> Optional[float]:
+        if self.first_byte is None:
+            return None
+        return (self.first_byte - self.start) * 1000
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+
+async def stream_chat_events(
+    chunks: AsyncGenerator[str, None],
+    timer: StreamTimer
+) -> AsyncGenerator[str, None]:
+    """将Agent的流式输出转换为SSE事件
+
+    生成器由响应逐条拉取，客户端读取慢时不会提前读取上游（背压）；
+    客户端断开时生成器被取消，Agent会关闭上游流。
+
+    Args:
+        chunks: Agent返回的文本分片生成器
+        timer: 计时器，从接收请求时开始计时
+
+    Yields:
+        str: SSE事件文本
+    """
+    completed = False
+    try:
+        async for chunk in chunks:
+            timer.mark_first_byte()
+            yield sse_event({"delta": chunk})
+        completed = True
+        yield sse_event({"ttfb_ms": timer.ttfb_ms, "total_ms": timer.total_ms}, event="done")
+    except Exception as e:
+        logger.error(f"流式响应失败: {e}")
+        yield sse_event({"error": str(e)}, event="error")
+    finally:
+        await chunks.aclose()
+        logger.info(
+            f"流式响应{'完成' if completed else '中断'}: ttfb_ms={timer.ttfb_ms}, total_ms={timer.total_ms:.1f}"
+        )
+
+
+def build_tasks(specs: List[AgentTaskSpec]) -> List[AgentTask]:
+    """将接口层的任务描述转换为编排器任务，每个任务使用独立的Agent"""
+    tasks = []
+    for spec in specs:
+        def make_prompt(deps: Dict[str, Any], prompt: str = spec.prompt) -> str:
+            if not deps:
+                return prompt
+            upstream = "\n".join(f"【{name}】{result}" for name, result in deps.items())
+            return f"{prompt}\n\n参考以下上游任务的结果：\n{upstream}"
+
+        tasks.append(AgentTask.from_agent(
+            spec.name,
+            create_agent(spec.system_prompt, stream=False),
+            make_prompt,
+            depends_on=spec.depends_on,
+        ))
+    return tasks
+
+
+def task_result_payload(result: TaskResult) -> Dict[str, Any]:
+    """任务结果转换为可序列化的字典"""
+    return {
+        "name": result.name,
+        "status": result.status,
+        "result": result.result,
+        "error": result.error,
+        "attempts": result.attempts,
+        "elapsed": result.elapsed,
+    }
@@ -0,0 +1,277 @@
+"""
+会话持久化服务
+- ConversationStore：基于关系数据库的会话后端（session.backend=database），按 (session_id, seq) 索引读取最近N条消息
+- 新消息进入内存队列后立即返回，由后台写入协程按批合并为一个事务写入（write-behind），
+  而不是每条消息提交一次
+- 消息序号在写入事务中通过会话行的 last_seq 分配，多个工作进程可以并发写入同一会话
+- 重试后仍写入失败的批次被丢弃，之后等待这些会话的 flush() 抛出 ConversationWriteError
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+
+from app.config.config_loader import config
+from app.core.agents.session_backend import SessionBackend
+from app.model.conversation import ConversationMessage, ConversationSession, utcnow
+from app.model.database import get_sessionmaker, init_db
+from app.utils.logger import logger
+
+
+class ConversationWriteError(RuntimeError):
+    """会话消息写入失败并已被丢弃"""
+
+
+@dataclass
+class _PendingMessage:
+    session_id: str
+    role: str
+    content: str
+    name: Optional[str] = None
+
+
+class ConversationStore(SessionBackend):
+    """会话消息仓库（写后批量落库）"""
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        flush_interval: float = 0.2,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+    ):
+        """
+        Args:
+            batch_size: 单个事务最多写入的消息数
+            flush_interval: 攒批等待时间（秒），写入延迟的上限
+            max_queue: 待写入消息上限，超过后 append() 等待写入追上（背压）
+            max_retries: 批量写入失败后的重试次数，仍失败则丢弃并记录错误
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+        self._flush_requested = asyncio.Event()
+        self._batch_written = asyncio.Condition()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        # 各会话尚未落库的消息数
+        self._pending: Dict[str, int] = {}
+        # 有消息被丢弃、尚未通过 flush() 报告的会话 -> 最后一次写入错误
+        self._failed: Dict[str, Exception] = {}
+        self._written = 0
+        self._batches = 0
+        self._dropped = 0
+
+    async def load(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """读取会话最近的消息
+
+        Args:
+            session_id: 会话ID
+            limit: 最多读取的消息条数，为None时读取全部
+
+        Returns:
+            List[Dict[str, Any]]: 按时间正序排列的消息字典
+        """
+        await init_db()
+        if self._pending.get(session_id):
+            # 保证读到本进程已追加但尚未落库的消息
+            await self.flush(session_id)
+        query = (
+            select(
+                ConversationMessage.role,
+                ConversationMessage.content,
+                ConversationMessage.name,
+            )
+            .where(ConversationMessage.session_id == session_id)
+            .order_by(ConversationMessage.seq.desc())
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        async with get_sessionmaker()() as db:
+            rows = (await db.execute(query)).all()
+        messages = []
+        for row in reversed(rows):
+            message = {"role": row.role, "content": row.content}
+            if row.name is not None:
+                message["name"] = row.name
+            messages.append(message)
+        return messages
+
+    async def append(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """追加消息到写入队列，不等待落库；待写入消息超过上限时等待写入追上"""
+        await self._writable.wait()
+        for message in messages:
+            self.enqueue(session_id, message["role"], message["content"], message.get("name"))
+
+    def enqueue(self, session_id: str, role: str, content: str, name: Optional[str] = None) -> None:
+        """追加一条消息到写入队列，立即返回
+
+        Args:
+            session_id: 会话ID
+            role: 消息角色
+            content: 消息内容
+            name: 可选的名称
+        """
+        self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._queue.put_nowait(_PendingMessage(session_id, role, content, name))
+        if self._queue.qsize() >= self.max_queue:
+            self._writable.clear()
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run_writer())
+
+    async def flush(self, session_id: Optional[str] = None) -> None:
+        """等待已追加的消息落库
+
+        Args:
+            session_id: 只等待该会话的消息，为None时等待全部
+
+        Raises:
+            ConversationWriteError: 等待的会话中有消息写入失败被丢弃（每次丢弃只报告一次）
+        """
+        if self._writer is None:
+            return
+        self._flush_requested.set()
+        if session_id is None:
+            await self._queue.join()
+            failed, self._failed = self._failed, {}
+        else:
+            async with self._batch_written:
+                await self._batch_written.wait_for(lambda: not self._pending.get(session_id))
+            error = self._failed.pop(session_id, None)
+            failed = {session_id: error} if error is not None else {}
+        if failed:
+            error = next(iter(failed.values()))
+            raise ConversationWriteError(f"会话 {', '.join(failed)} 的消息写入失败: {error}") from error
+
+    async def close(self) -> None:
+        """写完剩余消息并停止后台写入协程"""
+        try:
+            await self.flush()
+        except ConversationWriteError:
+            # 丢弃的消息在写入失败时已记录错误日志
+            pass
+        finally:
+            if self._writer is not None:
+                self._writer.cancel()
+                await asyncio.gather(self._writer, return_exceptions=True)
+                self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        """写入统计"""
+        return {
+            "backend": "database",
+            "queued": self._queue.qsize(),
+            "written": self._written,
+            "batches": self._batches,
+            "dropped": self._dropped,
+            "avg_batch_size": self._written / self._batches if self._batches else 0.0,
+        }
+
+    async def _run_writer(self) -> None:
+        """后台写入协程：攒够一批或等待 flush_interval 后写入一次"""
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() + 1 < self.batch_size and not self._flush_requested.is_set():
+                try:
+                    await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if self._queue.empty():
+                self._flush_requested.clear()
+            try:
+                await self._write_batch(batch)
+            finally:
+                for message in batch:
+                    remaining = self._pending.get(message.session_id, 0) - 1
+                    if remaining > 0:
+                        self._pending[message.session_id] = remaining
+                    else:
+                        self._pending.pop(message.session_id, None)
+                    self._queue.task_done()
+                if self._queue.qsize() < self.max_queue:
+                    self._writable.set()
+                async with self._batch_written:
+                    self._batch_written.notify_all()
+
+    async def _write_batch(self, batch: List[_PendingMessage]) -> None:
+        """在一个事务中为一批消息分配序号并写入，失败时按退避重试
+
+        序号通过会话行的 last_seq 原子递增分配，其他进程的并发写入会在行锁上排队。
+        """
+        by_session: Dict[str, List[_PendingMessage]] = {}
+        for message in batch:
+            by_session.setdefault(message.session_id, []).append(message)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                # 首次写入可能早于任何 load()，确保表已创建
+                await init_db()
+                now = utcnow()
+                rows = []
+                async with get_sessionmaker()() as db, db.begin():
+                    for session_id, messages in by_session.items():
+                        result = await db.execute(
+                            update(ConversationSession)
+                            .where(ConversationSession.id == session_id)
+                            .values(last_seq=ConversationSession.last_seq + len(messages), updated_at=now)
+                            .execution_options(synchronize_session=False)
+                        )
+                        if result.rowcount:
+                            last_seq = await db.scalar(
+                                select(ConversationSession.last_seq).where(ConversationSession.id == session_id)
+                            )
+                        else:
+                            # 新会话；其他进程同时创建时主键冲突，整批重试后走更新分支
+                            last_seq = len(messages) - 1
+                            await db.execute(insert(ConversationSession).values(
+                                id=session_id, last_seq=last_seq, created_at=now, updated_at=now
+                            ))
+                        first_seq = last_seq - len(messages) + 1
+                        rows.extend(
+                            {
+                                "session_id": session_id,
+                                "seq": first_seq + i,
+                                "role": m.role,
+                                "content": m.content,
+                                "name": m.name,
+                                "created_at": now,
+                            }
+                            for i, m in enumerate(messages)
+                        )
+                    await db.execute(insert(ConversationMessage), rows)
+                self._written += len(batch)
+                self._batches += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self._dropped += len(batch)
+                    for session_id in by_session:
+                        self._failed[session_id] = e
+                    logger.error(f"会话消息批量写入失败，丢弃 {len(batch)} 条: {e}")
+                    return
+                delay = min(0.1 * 2 ** attempt, 5.0)
+                logger.warning(f"会话消息批量写入失败，{delay:.1f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+
+
+_default_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """获取进程内共享的会话仓库，参数从配置 database.conversation 读取"""
+    global _default_store
+    if _default_store is None:
+        store_config = (config.get("database", {}) or {}).get("conversation", {}) or {}
+        _default_store = ConversationStore(
+            batch_size=store_config.get("batch_size", 200),
+            flush_interval=store_config.get("flush_interval", 0.2),
+            max_queue=store_config.get("max_queue", 10000),
+            max_retries=store_config.get("max_retries", 3),
+        )
+    return _default_store
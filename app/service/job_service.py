@@ -0,0 +1,389 @@
+"""
+后台任务服务
+- JobQueue：任务的提交、查询、取消和进度读取，任务状态持久化在 database.url 配置的数据库中
+- 工作进程通过 claim() 原子领取任务，运行中定期心跳；心跳超时的任务视为工作进程已退出，会被重新领取
+- 进度事件写入 job_events 表，stream() 按序号增量读取，同进程内写入时立即唤醒，跨进程时按间隔轮询
+- 任务类型通过 register_job_handler 注册，内置 agents.run（运行多智能体任务DAG）
+- 单任务超时上限取 agents.timeout，任务内并发上限取 agents.max_agents
+"""
+import asyncio
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+from app.config.config_loader import config
+from app.core.agents.orchestrator import Orchestrator
+from app.model.conversation import utcnow
+from app.model.database import get_sessionmaker, init_db
+from app.model.job import (
+    JOB_CANCELLED,
+    JOB_FINISHED_STATUSES,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    Job,
+    JobEvent,
+)
+from app.schema.chat import AgentRunRequest
+from app.service.chat_service import build_tasks, task_result_payload
+from app.utils.logger import logger
+
+
+class JobContext:
+    """任务运行上下文，任务函数通过它上报进度"""
+
+    def __init__(self, queue: "JobQueue", job: Dict[str, Any]):
+        self.queue = queue
+        self.job_id: str = job["id"]
+        self.payload: Dict[str, Any] = job["payload"] or {}
+        # 由心跳在检测到取消请求时设置
+        self.cancel_requested = False
+
+    async def report(self, type: str, data: Any = None) -> None:
+        """上报一条进度事件"""
+        await self.queue.add_event(self.job_id, type, data)
+
+
+JobHandler = Callable[[Dict[str, Any], JobContext], Awaitable[Any]]
+
+
+@dataclass
+class _Registration:
+    handler: JobHandler
+    validate: Optional[Callable[[Dict[str, Any]], Any]] = None
+
+
+_handlers: Dict[str, _Registration] = {}
+
+
+def register_job_handler(kind: str, validate: Optional[Callable[[Dict[str, Any]], Any]] = None):
+    """注册任务类型的装饰器
+
+    Args:
+        kind: 任务类型
+        validate: 提交时校验 payload 的函数，校验失败应抛出 ValueError
+    """
+    def decorator(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = _Registration(handler, validate)
+        return handler
+    return decorator
+
+
+def get_job_handler(kind: str) -> JobHandler:
+    """获取任务类型的处理函数
+
+    Raises:
+        ValueError: 任务类型未注册
+    """
+    registration = _handlers.get(kind)
+    if registration is None:
+        raise ValueError(f"未知的任务类型: {kind}")
+    return registration.handler
+
+
+def _job_dict(job: Job) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "payload": job.payload,
+        "result": job.result,
+        "error": job.error,
+        "timeout": job.timeout,
+        "attempts": job.attempts,
+        "cancel_requested": job.cancel_requested,
+        "worker_id": job.worker_id,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class JobQueue:
+    """持久化任务队列"""
+
+    def __init__(self, poll_interval: float = 0.5):
+        """
+        Args:
+            poll_interval: 跨进程轮询新任务和新事件的间隔（秒）
+        """
+        self.poll_interval = poll_interval
+        # 同进程内提交任务时唤醒工作协程，写入事件时唤醒进度流
+        self._submitted = asyncio.Event()
+        self._event_written = asyncio.Condition()
+        # 同进程内的工作池注册的取消回调，收到取消请求时立即取消运行中的任务
+        self._cancel_listeners: List[Callable[[str], None]] = []
+
+    async def submit(self, kind: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """提交任务
+
+        Args:
+            kind: 任务类型
+            payload: 任务参数
+            timeout: 超时（秒），不能超过 agents.timeout
+
+        Returns:
+            Dict[str, Any]: 任务信息
+
+        Raises:
+            ValueError: 任务类型未注册或参数校验失败
+        """
+        registration = _handlers.get(kind)
+        if registration is None:
+            raise ValueError(f"未知的任务类型: {kind}")
+        if registration.validate is not None:
+            registration.validate(payload)
+        max_timeout = (config.get("agents", {}) or {}).get("timeout", 300)
+        timeout = min(timeout, max_timeout) if timeout else max_timeout
+
+        await init_db()
+        job = Job(
+            id=uuid.uuid4().hex, kind=kind, status=JOB_QUEUED, payload=payload, timeout=timeout, last_event_seq=0
+        )
+        async with get_sessionmaker()() as db, db.begin():
+            db.add(job)
+            db.add(JobEvent(job_id=job.id, seq=0, type="status", data={"status": JOB_QUEUED}))
+        self._submitted.set()
+        logger.info(f"提交任务 {job.id}: kind={kind}, timeout={timeout}")
+        return _job_dict(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务，不存在时返回None"""
+        await init_db()
+        async with get_sessionmaker()() as db:
+            job = await db.get(Job, job_id)
+            return _job_dict(job) if job is not None else None
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """请求取消任务
+
+        排队中的任务直接取消；运行中的任务由所在工作进程在下次心跳时取消（同进程内立即取消）。
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务信息，不存在时返回None
+        """
+        await init_db()
+        async with get_sessionmaker()() as db, db.begin():
+            job = await db.get(Job, job_id, with_for_update=True)
+            if job is None:
+                return None
+            if job.status in JOB_FINISHED_STATUSES:
+                return _job_dict(job)
+            job.cancel_requested = True
+            if job.status == JOB_QUEUED:
+                job.status = JOB_CANCELLED
+                job.finished_at = utcnow()
+                await self._add_event(db, job_id, "status", {"status": JOB_CANCELLED})
+            info = _job_dict(job)
+        await self._notify()
+        for listener in self._cancel_listeners:
+            listener(job_id)
+        logger.info(f"请求取消任务 {job_id}")
+        return info
+
+    async def events(self, job_id: str, after: int = -1, limit: int = 100) -> List[Dict[str, Any]]:
+        """读取序号大于 after 的进度事件"""
+        await init_db()
+        async with get_sessionmaker()() as db:
+            rows = (await db.scalars(
+                select(JobEvent)
+                .where(JobEvent.job_id == job_id, JobEvent.seq > after)
+                .order_by(JobEvent.seq)
+                .limit(limit)
+            )).all()
+        return [
+            {"seq": e.seq, "type": e.type, "data": e.data, "created_at": e.created_at.isoformat()}
+            for e in rows
+        ]
+
+    async def stream(self, job_id: str, after: int = -1) -> AsyncGenerator[Dict[str, Any], None]:
+        """流式读取进度事件，任务结束后停止
+
+        Args:
+            job_id: 任务ID
+            after: 从该序号之后开始读取
+
+        Yields:
+            Dict[str, Any]: 进度事件
+        """
+        while True:
+            events = await self.events(job_id, after)
+            for event in events:
+                after = event["seq"]
+                yield event
+                if event["type"] == "status" and event["data"]["status"] in JOB_FINISHED_STATUSES:
+                    return
+            if events:
+                continue
+            job = await self.get(job_id)
+            if job is None or job["status"] in JOB_FINISHED_STATUSES:
+                return
+            async with self._event_written:
+                try:
+                    await asyncio.wait_for(self._event_written.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def add_event(self, job_id: str, type: str, data: Any = None) -> None:
+        """写入一条进度事件"""
+        async with get_sessionmaker()() as db, db.begin():
+            await self._add_event(db, job_id, type, data)
+        await self._notify()
+
+    async def _add_event(self, db, job_id: str, type: str, data: Any) -> None:
+        """在调用方的事务中写入一条事件
+
+        序号通过任务行的 last_event_seq 原子递增分配，并发写入同一任务的事件在行锁上排队，不会分配到相同的序号。
+        """
+        await db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(last_event_seq=Job.last_event_seq + 1)
+            .execution_options(synchronize_session=False)
+        )
+        seq = await db.scalar(select(Job.last_event_seq).where(Job.id == job_id))
+        db.add(JobEvent(job_id=job_id, seq=seq, type=type, data=data))
+
+    async def _notify(self) -> None:
+        async with self._event_written:
+            self._event_written.notify_all()
+
+    async def wait_submitted(self, timeout: float) -> None:
+        """等待同进程内有新任务提交，最多等待 timeout 秒"""
+        try:
+            await asyncio.wait_for(self._submitted.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._submitted.clear()
+
+    async def claim(self, worker_id: str, stale_after: float) -> Optional[Dict[str, Any]]:
+        """原子领取一个任务：最早提交的排队任务，或心跳超时的运行中任务
+
+        Args:
+            worker_id: 工作协程标识
+            stale_after: 心跳超过该时间（秒）未刷新的运行中任务可被重新领取
+
+        Returns:
+            Optional[Dict[str, Any]]: 领取到的任务，没有可领取的任务时返回None
+        """
+        await init_db()
+        now = utcnow()
+        claimable = or_(
+            Job.status == JOB_QUEUED,
+            and_(Job.status == JOB_RUNNING, Job.heartbeat_at < now - timedelta(seconds=stale_after)),
+        )
+        async with get_sessionmaker()() as db, db.begin():
+            job_id = await db.scalar(select(Job.id).where(claimable).order_by(Job.created_at).limit(1))
+            if job_id is None:
+                return None
+            # 条件更新保证多个工作进程并发领取时只有一个成功
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, claimable)
+                .values(
+                    status=JOB_RUNNING,
+                    worker_id=worker_id,
+                    attempts=Job.attempts + 1,
+                    started_at=now,
+                    heartbeat_at=now,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
+                return None
+            job = await db.get(Job, job_id)
+            await self._add_event(db, job_id, "status", {"status": JOB_RUNNING, "attempt": job.attempts})
+            info = _job_dict(job)
+        await self._notify()
+        return info
+
+    async def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """刷新运行中任务的心跳
+
+        Returns:
+            bool: 任务是否被请求取消（或已不再属于该工作协程）
+        """
+        async with get_sessionmaker()() as db, db.begin():
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.worker_id == worker_id, Job.status == JOB_RUNNING)
+                .values(heartbeat_at=utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
+                return True
+            return bool(await db.scalar(select(Job.cancel_requested).where(Job.id == job_id)))
+
+    async def finish(
+        self,
+        job_id: str,
+        worker_id: str,
+        status: str,
+        result: Any = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """记录任务结束状态；任务已被其他工作协程重新领取时忽略"""
+        async with get_sessionmaker()() as db, db.begin():
+            updated = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.worker_id == worker_id, Job.status == JOB_RUNNING)
+                .values(status=status, result=result, error=error, finished_at=utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            if not updated.rowcount:
+                return
+            data = {"status": status}
+            if error is not None:
+                data["error"] = error
+            await self._add_event(db, job_id, "status", data)
+        await self._notify()
+        logger.info(f"任务 {job_id} 结束: {status}" + (f", {error}" if error else ""))
+
+    async def requeue(self, job_id: str, worker_id: str) -> None:
+        """工作协程退出时将运行中的任务放回队列"""
+        async with get_sessionmaker()() as db, db.begin():
+            updated = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.worker_id == worker_id, Job.status == JOB_RUNNING)
+                .values(status=JOB_QUEUED, worker_id=None, heartbeat_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            if updated.rowcount:
+                await self._add_event(db, job_id, "status", {"status": JOB_QUEUED, "requeued": True})
+        logger.info(f"任务 {job_id} 已放回队列")
+
+
+_default_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """获取进程内共享的任务队列，参数从配置 jobs 读取"""
+    global _default_queue
+    if _default_queue is None:
+        jobs_config = config.get("jobs", {}) or {}
+        _default_queue = JobQueue(poll_interval=jobs_config.get("poll_interval", 0.5))
+    return _default_queue
+
+
+def _validate_agents_run(payload: Dict[str, Any]) -> None:
+    """按请求中的任务名称和依赖校验任务图，不创建Agent"""
+    Orchestrator.validate(AgentRunRequest.model_validate(payload).tasks)
+
+
+@register_job_handler("agents.run", validate=_validate_agents_run)
+async def run_agents_job(payload: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    """运行多智能体任务DAG，每个节点完成时上报一条 task 事件
+
+    payload 与 POST /agents/run 的请求体相同，可额外指定 concurrency（不超过 agents.max_agents）。
+    部分节点失败不会使任务失败，各节点状态见结果。
+    """
+    request = AgentRunRequest.model_validate(payload)
+    max_agents = (config.get("agents", {}) or {}).get("max_agents", 10)
+    concurrency = min(payload.get("concurrency") or max_agents, max_agents)
+    results = {}
+    async for result in Orchestrator(max_concurrency=concurrency).run_stream(build_tasks(request.tasks)):
+        results[result.name] = task_result_payload(result)
+        await ctx.report("task", results[result.name])
+    return results
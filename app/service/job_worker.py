@@ -0,0 +1,215 @@
+"""
+后台任务工作池
+- JobWorkerPool：在当前事件循环中运行固定数量的工作协程，从任务队列领取并执行任务
+  - 单任务超过其超时（不超过 agents.timeout）后标记为失败
+  - 运行中定期心跳，检测到取消请求时取消任务；同进程内提交的取消请求立即生效
+  - 停止时将运行中的任务放回队列，由其他工作进程继续执行
+- ProcessWorkerPool：启动若干独立的工作进程（python -m app.worker），每个进程内运行一个 JobWorkerPool
+- 通过配置 jobs.pool 选择：asyncio（应用进程内）/ process（应用启动独立进程）/ external（单独部署 app.worker）
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+from app.config.config_loader import config
+from app.model.job import JOB_CANCELLED, JOB_FAILED, JOB_SUCCEEDED
+from app.service.job_service import JobContext, JobQueue, get_job_handler, get_job_queue
+from app.utils.logger import logger
+
+
+class JobWorkerPool:
+    """进程内工作协程池"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        workers: int = 4,
+        heartbeat_interval: float = 5.0,
+        stale_after: float = 30.0,
+        max_attempts: int = 3,
+    ):
+        """
+        Args:
+            queue: 任务队列
+            workers: 同时运行的任务数
+            heartbeat_interval: 心跳间隔（秒），也是跨进程取消请求的最大生效延迟
+            stale_after: 心跳超过该时间未刷新的任务可被其他工作协程重新领取
+            max_attempts: 单个任务最多被领取的次数，超过后标记为失败
+        """
+        self.queue = queue
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        # 运行中的任务：job_id -> (任务协程, 上下文)
+        self._running: Dict[str, tuple] = {}
+
+    async def start(self) -> None:
+        """启动工作协程"""
+        if self._tasks:
+            return
+        self.queue._cancel_listeners.append(self._cancel_local)
+        self._tasks = [
+            asyncio.create_task(self._work(f"{self._prefix}-{i}")) for i in range(self.workers)
+        ]
+        logger.info(f"任务工作池启动: {self.workers} 个工作协程")
+
+    async def stop(self) -> None:
+        """停止工作协程，运行中的任务放回队列"""
+        if self._cancel_local in self.queue._cancel_listeners:
+            self.queue._cancel_listeners.remove(self._cancel_local)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("任务工作池已停止")
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.workers, "running": len(self._running)}
+
+    def _cancel_local(self, job_id: str) -> None:
+        entry = self._running.get(job_id)
+        if entry is not None:
+            task, ctx = entry
+            ctx.cancel_requested = True
+            task.cancel()
+
+    async def _work(self, worker_id: str) -> None:
+        while True:
+            try:
+                job = await self.queue.claim(worker_id, self.stale_after)
+            except Exception as e:
+                logger.error(f"领取任务失败: {e}")
+                job = None
+            if job is None:
+                await self.queue.wait_submitted(self.queue.poll_interval)
+                continue
+            await self._run(worker_id, job)
+
+    async def _run(self, worker_id: str, job: Dict) -> None:
+        """执行单个任务并记录结束状态"""
+        job_id = job["id"]
+        if job["cancel_requested"]:
+            await self.queue.finish(job_id, worker_id, JOB_CANCELLED)
+            return
+        if job["attempts"] > self.max_attempts:
+            await self.queue.finish(job_id, worker_id, JOB_FAILED, error=f"任务已被领取 {job['attempts']} 次")
+            return
+        try:
+            handler = get_job_handler(job["kind"])
+        except ValueError as e:
+            await self.queue.finish(job_id, worker_id, JOB_FAILED, error=str(e))
+            return
+
+        ctx = JobContext(self.queue, job)
+        task = asyncio.create_task(asyncio.wait_for(handler(ctx.payload, ctx), job["timeout"]))
+        self._running[job_id] = (task, ctx)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, worker_id, task, ctx))
+        logger.info(f"开始执行任务 {job_id}: kind={job['kind']}, 第{job['attempts']}次")
+        try:
+            result = await task
+            await self.queue.finish(job_id, worker_id, JOB_SUCCEEDED, result=result)
+        except asyncio.TimeoutError:
+            await self.queue.finish(job_id, worker_id, JOB_FAILED, error=f"执行超时（{job['timeout']}秒）")
+        except asyncio.CancelledError:
+            if not ctx.cancel_requested:
+                # 工作池停止：放回队列后继续传播取消
+                await asyncio.shield(self.queue.requeue(job_id, worker_id))
+                raise
+            await self.queue.finish(job_id, worker_id, JOB_CANCELLED)
+        except Exception as e:
+            logger.exception(f"任务 {job_id} 执行失败: {e}")
+            await self.queue.finish(job_id, worker_id, JOB_FAILED, error=str(e) or e.__class__.__name__)
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+
+    async def _heartbeat(self, job_id: str, worker_id: str, task: asyncio.Task, ctx: JobContext) -> None:
+        """定期刷新心跳，检测到取消请求时取消任务"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                cancelled = await self.queue.heartbeat(job_id, worker_id)
+            except Exception as e:
+                logger.warning(f"任务 {job_id} 心跳失败: {e}")
+                continue
+            if cancelled:
+                ctx.cancel_requested = True
+                task.cancel()
+                return
+
+
+class ProcessWorkerPool:
+    """独立工作进程池"""
+
+    def __init__(self, processes: int = 2):
+        self.processes = processes
+        self._procs: List[subprocess.Popen] = []
+
+    async def start(self) -> None:
+        """启动工作进程，工作进程继承当前环境变量（包括 ENV）"""
+        if self._procs:
+            return
+        self._procs = [
+            subprocess.Popen([sys.executable, "-m", "app.worker"], env=os.environ.copy())
+            for _ in range(self.processes)
+        ]
+        logger.info(f"启动 {self.processes} 个任务工作进程: {[p.pid for p in self._procs]}")
+
+    async def stop(self) -> None:
+        """终止工作进程，工作进程收到信号后会将运行中的任务放回队列"""
+        for proc in self._procs:
+            proc.terminate()
+        for proc in self._procs:
+            try:
+                await asyncio.to_thread(proc.wait, 30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        self._procs = []
+        logger.info("任务工作进程已停止")
+
+    def stats(self) -> Dict[str, int]:
+        return {"processes": sum(1 for p in self._procs if p.poll() is None)}
+
+
+def build_worker_pool(queue: Optional[JobQueue] = None) -> JobWorkerPool:
+    """根据配置 jobs 创建进程内工作协程池"""
+    jobs_config = config.get("jobs", {}) or {}
+    return JobWorkerPool(
+        queue or get_job_queue(),
+        workers=jobs_config.get("workers", 4),
+        heartbeat_interval=jobs_config.get("heartbeat_interval", 5.0),
+        stale_after=jobs_config.get("stale_after", 30.0),
+        max_attempts=jobs_config.get("max_attempts", 3),
+    )
+
+
+_default_pool = None
+
+
+async def start_job_pool() -> None:
+    """按配置 jobs.pool 启动应用进程的任务工作池"""
+    global _default_pool
+    mode = (config.get("jobs", {}) or {}).get("pool", "asyncio")
+    if _default_pool is not None or mode == "external":
+        return
+    if mode == "asyncio":
+        _default_pool = build_worker_pool()
+    elif mode == "process":
+        _default_pool = ProcessWorkerPool((config.get("jobs", {}) or {}).get("processes", 2))
+    else:
+        raise ValueError(f"未知的任务工作池类型: {mode}")
+    await _default_pool.start()
+
+
+async def stop_job_pool() -> None:
+    """停止应用进程的任务工作池"""
+    global _default_pool
+    if _default_pool is not None:
+        await _default_pool.stop()
+        _default_pool = None
@@ -1,14 +1,20 @@
 """
 日志模块配置
+- 延迟初始化：导入本模块不读取配置、不添加处理器，首次输出日志时（或显式调用 setup_logger）才完成配置
+- 日志配置取自 app.config.config_loader 的全局配置中的 log 部分，与应用共用一次配置加载
 """
 import os
 import sys
+import json
 import uuid
+import queue
+import atexit
+import threading
+import traceback
 import contextvars
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 
-import yaml
 from loguru import logger as _logger
 
 
@@ -52,48 +58,105 @@ def set_trace_id(trace_id: Optional[str] = None) -> str:
     return trace_id
 
 
+# 标准级别编号
+_DEBUG, _INFO, _WARNING, _ERROR, _CRITICAL = 10, 20, 30, 40, 50
+
+
+class _LevelCache:
+    """所有日志处理器中最低的级别编号，低于该级别的日志在调用处直接丢弃
+
+    sinks 记录经 add_sink 添加的处理器ID及其级别编号，min_no 由其计算，不读取 loguru 的内部状态。
+    """
+    min_no = 0
+    sinks: Dict[int, int] = {}
+
+
+_levels = _LevelCache()
+
+
+class _PendingSetup:
+    """日志尚未初始化时 TracedLogger._opt 的占位对象，首次输出日志时完成初始化并换成真正的 logger"""
+    __slots__ = ("_owner",)
+
+    def __init__(self, owner: "TracedLogger"):
+        self._owner = owner
+
+    def __getattr__(self, name: str):
+        ensure_logger()
+        owner = self._owner
+        if owner._opt is self:
+            owner._opt = owner._logger.opt(depth=1, lazy=owner._lazy is owner)
+        return getattr(owner._opt, name)
+
+
 class TracedLogger:
-    """带有追踪功能的日志记录器"""
-    
-    def __init__(self, logger):
+    """带有追踪功能的日志记录器
+
+    - 低于所有处理器级别的日志在调用处直接返回，不做任何格式化和上下文查找
+    - trace_id 由补丁函数在每条实际输出的日志上读取一次，所有处理器共享
+    - 通过 logger.lazy 使用惰性参数：参数为无参可调用对象，仅在日志实际输出时求值
+    """
+    __slots__ = ("_logger", "_opt", "_lazy")
+
+    def __init__(self, logger, lazy: bool = False):
         self._logger = logger
-        
-    def _log(self, level: str, message: str, *args, **kwargs):
-        """
-        记录日志，自动添加trace_id，并调整depth使caller信息正确显示
-        """
-        # 确保存在trace_id
-        if get_trace_id() is None:
-            set_trace_id()
-        # 使用opt调整深度，跳过包装调用
-        opt_logger = self._logger.opt(depth=2)
-        return getattr(opt_logger, level)(message, *args, **kwargs)
-    
+        self._lazy = self if lazy else None
+        # 预先创建调整调用深度的logger（跳过本包装层），使 name:function:line 显示真实调用位置
+        self._opt = logger.opt(depth=1, lazy=lazy) if _setup_state == _SETUP_DONE else _PendingSetup(self)
+
+    def is_enabled(self, level: str) -> bool:
+        """判断该级别的日志是否会被任一处理器输出"""
+        return _logger.level(level.upper()).no >= _levels.min_no
+
     def debug(self, message: str, *args, **kwargs):
-        return self._log("debug", message, *args, **kwargs)
-        
+        if _levels.min_no <= _DEBUG:
+            self._opt.debug(message, *args, **kwargs)
+
     def info(self, message: str, *args, **kwargs):
-        return self._log("info", message, *args, **kwargs)
-        
+        if _levels.min_no <= _INFO:
+            self._opt.info(message, *args, **kwargs)
+
     def warning(self, message: str, *args, **kwargs):
-        return self._log("warning", message, *args, **kwargs)
-        
+        if _levels.min_no <= _WARNING:
+            self._opt.warning(message, *args, **kwargs)
+
     def error(self, message: str, *args, **kwargs):
-        return self._log("error", message, *args, **kwargs)
-        
+        if _levels.min_no <= _ERROR:
+            self._opt.error(message, *args, **kwargs)
+
     def critical(self, message: str, *args, **kwargs):
-        return self._log("critical", message, *args, **kwargs)
-        
+        if _levels.min_no <= _CRITICAL:
+            self._opt.critical(message, *args, **kwargs)
+
     def exception(self, message: str, *args, **kwargs):
-        return self._log("exception", message, *args, **kwargs)
-    
+        if _levels.min_no <= _ERROR:
+            self._opt.exception(message, *args, **kwargs)
+
+    @property
+    def lazy(self) -> "TracedLogger":
+        """惰性参数日志记录器，如 logger.lazy.debug("统计: {}", lambda: expensive())"""
+        if self._lazy is None:
+            self._lazy = TracedLogger(self._logger, lazy=True)
+        return self._lazy
+
     def bind(self, **kwargs):
         """支持loguru的bind方法"""
         return TracedLogger(self._logger.bind(**kwargs))
 
+    def add(self, sink, level: Union[str, int] = "DEBUG", **kwargs) -> int:
+        """添加处理器并更新级别缓存，参数同 loguru 的 add"""
+        return add_sink(sink, level, **kwargs)
+
+    def remove(self, handler_id: Optional[int] = None) -> None:
+        """移除处理器（为None时移除全部）并更新级别缓存"""
+        remove_sink(handler_id)
+
 
 class TraceIDFilter:
-    """为日志添加trace_id的过滤器"""
+    """为日志添加trace_id的过滤器
+
+    保留用于自定义处理器；内置处理器改用 _patch_trace_id，每条日志只查找一次。
+    """
     
     def __call__(self, record: Dict[str, Any]) -> bool:
         """处理日志记录，添加trace_id"""
@@ -104,55 +167,206 @@ class TraceIDFilter:
         return True
 
 
+def _patch_trace_id(record: Dict[str, Any]) -> None:
+    """为每条实际输出的日志添加trace_id（所有处理器共享），上下文中没有时生成一个"""
+    trace_id = trace_id_var.get()
+    if trace_id is None:
+        trace_id = set_trace_id()
+    record["extra"]["trace_id"] = trace_id
+
+
+class JsonLinesSink:
+    """JSON Lines 日志处理器
+
+    调用方线程只把日志记录放入有界队列，不做序列化也不阻塞；队列满时丢弃该条日志并计数。
+    后台线程批量序列化并写入文件。
+    """
+
+    def __init__(self, path: Union[str, Path], queue_size: int = 10000, flush_interval: float = 1.0):
+        """
+        Args:
+            path: 输出文件路径
+            queue_size: 队列容量
+            flush_interval: 空闲时刷新文件缓冲的间隔（秒）
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-jsonl-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message) -> None:
+        try:
+            self._queue.put_nowait(message.record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    @staticmethod
+    def _serialize(record: Dict[str, Any]) -> str:
+        extra = dict(record["extra"])
+        data = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "message": record["message"],
+            "trace_id": extra.pop("trace_id", None),
+            "name": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+        }
+        if extra:
+            data["extra"] = extra
+        if record["exception"] is not None:
+            data["exception"] = "".join(traceback.format_exception(*record["exception"]))
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while not (self._stopped.is_set() and self._queue.empty()):
+                try:
+                    lines = [self._serialize(self._queue.get(timeout=self.flush_interval))]
+                except queue.Empty:
+                    f.flush()
+                    continue
+                while len(lines) < 1000:
+                    try:
+                        lines.append(self._serialize(self._queue.get_nowait()))
+                    except queue.Empty:
+                        break
+                f.write("\n".join(lines) + "\n")
+                self.written += len(lines)
+            f.flush()
+
+    def stop(self) -> None:
+        """写完队列中剩余的日志并停止后台线程"""
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, int]:
+        """队列统计：已入队、已写入、因队列满丢弃的条数和当前积压"""
+        return {
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "backlog": self._queue.qsize(),
+        }
+
+
+json_sink: Optional[JsonLinesSink] = None
+
+
+def add_sink(sink, level: Union[str, int] = "DEBUG", **kwargs) -> int:
+    """添加日志处理器并记录其级别，参数同 loguru 的 add
+
+    直接通过 loguru 添加的处理器不计入级别缓存，低于已记录的最低级别的日志会在调用处被丢弃。
+
+    Returns:
+        int: 处理器ID
+    """
+    handler_id = _logger.add(sink, level=level, **kwargs)
+    _levels.sinks[handler_id] = level if isinstance(level, int) else _logger.level(level.upper()).no
+    refresh_level_cache()
+    return handler_id
+
+
+def remove_sink(handler_id: Optional[int] = None) -> None:
+    """移除日志处理器，为None时移除全部"""
+    _logger.remove(handler_id)
+    if handler_id is None:
+        _levels.sinks.clear()
+    else:
+        _levels.sinks.pop(handler_id, None)
+    refresh_level_cache()
+
+
+def refresh_level_cache() -> None:
+    """根据 add_sink 记录的处理器级别重新计算最低级别"""
+    # 没有记录的处理器时不在调用处过滤，交给 loguru 判断
+    _levels.min_no = min(_levels.sinks.values(), default=0)
+
+
+def log_stats() -> Dict[str, Any]:
+    """日志统计，包括 JSON Lines 处理器的队列计数"""
+    return {
+        "min_level": _levels.min_no,
+        "json_sink": json_sink.stats() if json_sink is not None else None,
+    }
+
+
 def load_log_config() -> Dict[str, Any]:
     """
     加载日志配置
     
     Returns:
-        Dict[str, Any]: 日志配置字典
+        Dict[str, Any]: 日志配置字典（全局配置中的 log 部分）
     """
-    # 获取环境配置
-    env = os.getenv("ENV", "dev")
-    
-    # 构建配置文件路径
-    config_dir = Path("configs")
-    config_file = config_dir / f"config_{env}.yml"
-    
-    # 如果配置文件不存在，使用示例配置
-    if not config_file.exists():
-        config_file = config_dir / "config.yml.example"
-    
-    # 读取配置文件
-    if not config_file.exists():
-        raise FileNotFoundError(f"配置文件不存在: {config_file}")
-        
-    with open(config_file, 'r', encoding='utf-8') as f:
-        try:
-            config = yaml.safe_load(f)
-            return config.get("log", {})
-        except yaml.YAMLError as e:
-            raise yaml.YAMLError(f"配置文件格式错误: {e}")
-        except Exception as e:
-            raise Exception(f"加载配置文件失败: {e}")
+    # 延迟导入：config_loader 依赖本模块输出日志
+    from app.config.config_loader import config
+
+    try:
+        return config.get("log", {}) or {}
+    except FileNotFoundError as e:
+        # 没有配置文件时按默认配置输出日志，错误由应用读取配置时抛出
+        sys.stderr.write(f"{e}，日志使用默认配置\n")
+        return {}
 
 
-def setup_logger() -> None:
+# 初始化状态
+_SETUP_PENDING, _SETUP_RUNNING, _SETUP_DONE = 0, 1, 2
+_setup_state = _SETUP_PENDING
+_setup_lock = threading.RLock()
+
+
+def ensure_logger() -> None:
+    """首次使用时初始化日志配置，已初始化时直接返回"""
+    if _setup_state == _SETUP_DONE:
+        return
+    with _setup_lock:
+        # 同一线程在初始化过程中重入（如加载配置时输出日志）直接返回，日志走 loguru 默认处理器
+        if _setup_state == _SETUP_PENDING:
+            setup_logger()
+
+
+def setup_logger(config: Optional[Dict[str, Any]] = None) -> None:
     """
-    配置日志记录器
+    配置日志记录器，可重复调用以重新配置
+    
+    Args:
+        config: 日志配置，为None时读取全局配置中的 log 部分
     """
-    # 加载配置
-    config = load_log_config()
+    global _setup_state
+    with _setup_lock:
+        _setup_state = _SETUP_RUNNING
+        try:
+            _configure(load_log_config() if config is None else config)
+        finally:
+            _setup_state = _SETUP_DONE
+
+
+def _configure(config: Dict[str, Any]) -> None:
+    """按日志配置重建处理器"""
+    global json_sink
     
     # 创建日志目录
     log_dir = Path(config.get("dir", "logs"))
     log_dir.mkdir(parents=True, exist_ok=True)
     
     # 移除默认的处理器
-    _logger.remove()
+    remove_sink()
+    if json_sink is not None:
+        json_sink.stop()
+        json_sink = None
+    # trace_id 由补丁函数在每条日志上添加一次，所有处理器共享
+    _logger.configure(patcher=_patch_trace_id)
     
     # 配置控制台输出
     console_config = config.get("console", {})
-    _logger.add(
+    add_sink(
         sys.stdout,
         level=console_config.get("level", "INFO"),
         colorize=console_config.get("colorize", True),
@@ -163,7 +377,6 @@ def setup_logger() -> None:
             "{extra[trace_id]} | "
             "<level>{message}</level>"
         ),
-        filter=TraceIDFilter(),
         # 异步写入会导致控制台输出乱序，在开发阶段还是不建议使用
         # enqueue=True  # 启用异步写入
     )
@@ -172,7 +385,7 @@ def setup_logger() -> None:
     file_config = config.get("file", {})
     if file_config:
         log_file = log_dir / file_config.get("filename", "lithium.log")
-        _logger.add(
+        add_sink(
             str(log_file),
             level=file_config.get("level", "DEBUG"),
             format=file_config.get("format",
@@ -188,12 +401,19 @@ def setup_logger() -> None:
             enqueue=True,  # 启用异步写入
             backtrace=file_config.get("backtrace", True),
             diagnose=file_config.get("diagnose", True),
-            filter=TraceIDFilter()
         )
 
+    # 配置 JSON Lines 输出（有界队列，不阻塞调用方）
+    json_config = config.get("json", {})
+    if json_config.get("enabled", False):
+        json_sink = JsonLinesSink(
+            log_dir / json_config.get("filename", "lithium.jsonl"),
+            queue_size=json_config.get("queue_size", 10000),
+            flush_interval=json_config.get("flush_interval", 1.0),
+        )
+        atexit.register(json_sink.stop)
+        add_sink(json_sink, level=json_config.get("level", "INFO"))
 
-# 初始化日志配置
-setup_logger()
 
 # 创建全局logger实例
 logger = TracedLogger(_logger)
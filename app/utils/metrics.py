@@ -0,0 +1,220 @@
+"""
+指标模块（Prometheus 格式）
+- LLM 调用：首Token延迟（TTFT）、Token间延迟、总耗时直方图，提示词/生成Token数和错误次数计数器，按模型区分
+- HTTP 请求：请求数、耗时直方图和进行中的请求数，按路由模板区分（不使用原始路径，避免标签基数膨胀）
+- 组件统计：连接池、限流器、执行器、缓存等组件已有的 stats() 通过 register_stats_source 注册后以 gauge 导出
+- 与日志关联：每个 HTTP 请求使用请求头 X-Trace-Id（没有时生成）作为 trace_id 并写回响应头；
+  直方图观测值带有 trace_id 样例（exemplar），以 OpenMetrics 格式抓取时输出
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram
+from prometheus_client import generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.openmetrics.exposition import CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE
+from prometheus_client.openmetrics.exposition import generate_latest as generate_openmetrics
+
+from app.utils.logger import get_trace_id, set_trace_id
+
+
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+_TOKEN_LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+_HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LLM_TTFT = Histogram(
+    "lithium_llm_time_to_first_token_seconds", "从发起生成到收到第一个内容分片的耗时",
+    ["model"], buckets=_LATENCY_BUCKETS,
+)
+LLM_INTER_TOKEN = Histogram(
+    "lithium_llm_inter_token_latency_seconds", "流式响应相邻内容分片的间隔",
+    ["model"], buckets=_TOKEN_LATENCY_BUCKETS,
+)
+LLM_DURATION = Histogram(
+    "lithium_llm_generation_duration_seconds", "生成总耗时（流式为读取完最后一个分片）",
+    ["model", "stream", "status"], buckets=_LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("lithium_llm_tokens_total", "LLM Token用量", ["model", "type"])
+LLM_ERRORS = Counter("lithium_llm_errors_total", "LLM生成失败次数", ["model", "error"])
+
+HTTP_REQUESTS = Counter("lithium_http_requests_total", "HTTP请求数", ["method", "route", "status"])
+HTTP_DURATION = Histogram(
+    "lithium_http_request_duration_seconds", "HTTP请求耗时（流式响应为发送完最后一块）",
+    ["method", "route"], buckets=_HTTP_BUCKETS,
+)
+HTTP_IN_PROGRESS = Gauge("lithium_http_requests_in_progress", "进行中的HTTP请求数", ["method"])
+
+
+def _exemplar() -> Optional[Dict[str, str]]:
+    trace_id = get_trace_id()
+    return {"trace_id": trace_id} if trace_id else None
+
+
+class GenerationMetrics:
+    """一次生成的指标记录
+
+    用法：开始生成前创建，收到内容分片时调用 token()，结束时调用 finish()，失败时调用 fail()。
+    """
+    __slots__ = ("model", "stream", "start", "last", "done")
+
+    def __init__(self, model: str, stream: bool):
+        self.model = model
+        self.stream = "true" if stream else "false"
+        self.start = time.perf_counter()
+        self.last: Optional[float] = None
+        self.done = False
+
+    def token(self) -> None:
+        """记录收到一个内容分片（非流式响应在拿到完整结果时调用一次）"""
+        now = time.perf_counter()
+        if self.last is None:
+            LLM_TTFT.labels(self.model).observe(now - self.start, _exemplar())
+        else:
+            LLM_INTER_TOKEN.labels(self.model).observe(now - self.last)
+        self.last = now
+
+    def usage(self, usage: Any) -> None:
+        """记录响应中的Token用量（流式响应仅在上游返回用量时记录）"""
+        if usage is None:
+            return
+        LLM_TOKENS.labels(self.model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels(self.model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+    def finish(self) -> None:
+        self._observe("ok")
+
+    def fail(self, error: BaseException) -> None:
+        # 调用方放弃读取或任务被取消不计为错误
+        if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+            self._observe("cancelled")
+            return
+        LLM_ERRORS.labels(self.model, type(error).__name__).inc()
+        self._observe("error")
+
+    def _observe(self, status: str) -> None:
+        if self.done:
+            return
+        self.done = True
+        LLM_DURATION.labels(self.model, self.stream, status).observe(
+            time.perf_counter() - self.start, _exemplar()
+        )
+
+
+# 组件统计来源：名称 -> (统计函数, 是否按实例分组)
+_stats_sources: Dict[str, Tuple[Callable[[], Dict[str, Any]], bool]] = {}
+
+
+def register_stats_source(name: str, stats: Callable[[], Dict[str, Any]], per_instance: bool = True) -> None:
+    """注册组件统计，抓取指标时调用并将其中的数值导出为 lithium_{name}_{字段} gauge
+
+    Args:
+        name: 指标名前缀，如 "llm_pool"
+        stats: 统计函数，返回 {实例名: {字段: 值}}，per_instance 为False时返回 {字段: 值}
+        per_instance: 是否按实例分组，实例名作为 instance 标签
+    """
+    _stats_sources[name] = (stats, per_instance)
+
+
+def _numeric_fields(stats: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """展开嵌套的统计字典，只保留数值字段"""
+    for key, value in stats.items():
+        field = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _numeric_fields(value, f"{field}_")
+        elif isinstance(value, (int, float)):
+            yield field, float(value)
+
+
+class StatsCollector:
+    """抓取时收集已注册组件的统计"""
+
+    def collect(self):
+        for name, (stats, per_instance) in list(_stats_sources.items()):
+            try:
+                data = stats() or {}
+            except Exception:
+                continue
+            instances = data.items() if per_instance else [("", data)]
+            families: Dict[str, GaugeMetricFamily] = {}
+            for instance, fields in instances:
+                if not isinstance(fields, dict):
+                    continue
+                for field, value in _numeric_fields(fields):
+                    family = families.get(field)
+                    if family is None:
+                        family = GaugeMetricFamily(
+                            f"lithium_{name}_{field}", f"{name} 统计: {field}",
+                            labels=["instance"] if per_instance else [],
+                        )
+                        families[field] = family
+                    family.add_metric([str(instance)] if per_instance else [], value)
+            yield from families.values()
+
+
+REGISTRY.register(StatsCollector())
+
+
+def render_metrics(accept: Optional[str]) -> Tuple[bytes, str]:
+    """按请求头 Accept 输出指标，支持 OpenMetrics 时带 trace_id 样例
+
+    Returns:
+        Tuple[bytes, str]: (内容, Content-Type)
+    """
+    if accept and "application/openmetrics-text" in accept:
+        return generate_openmetrics(REGISTRY), OPENMETRICS_CONTENT_TYPE
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI 中间件：记录HTTP请求指标，并为每个请求设置 trace_id
+
+    使用纯 ASGI 实现，不缓冲流式响应；耗时统计到响应最后一块发送完成。
+    """
+
+    def __init__(self, app, header: str = "x-trace-id", exclude: Tuple[str, ...] = ()):
+        """
+        Args:
+            app: ASGI 应用
+            header: 传递 trace_id 的请求/响应头
+            exclude: 不记录的路径，如指标接口自身
+        """
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = next(
+            (value.decode("latin-1")[:64] for key, value in scope.get("headers", []) if key == self.header), None
+        )
+        # 外层的追踪中间件可能已根据 traceparent 设置了 trace_id
+        trace_id = set_trace_id(trace_id or get_trace_id())
+        if scope["type"] == "websocket" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        header = self.header
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (header, trace_id.encode("latin-1"))]
+            await send(message)
+
+        HTTP_IN_PROGRESS.labels(method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.labels(method).dec()
+            # 路由匹配后 FastAPI 在 scope 中写入 route，使用路由模板作为标签
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            HTTP_DURATION.labels(method, route).observe(time.perf_counter() - start, _exemplar())
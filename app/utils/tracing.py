@@ -0,0 +1,524 @@
+"""
+链路追踪模块
+- span 使用当前日志 trace_id 作为链路ID，嵌套的 span 通过上下文变量自动建立父子关系
+- 用法：
+    with start_span("agent.task", task=name) as span:
+        span.set_attribute("attempts", 2)
+  或装饰器 @traced("name")（支持同步和异步函数）
+- 采样：链路的根 span 按 trace_id 的哈希和 tracing.sample_rate 决定是否记录，同一链路在所有进程中结论一致；
+  未采样的链路只做一次上下文切换，不计时也不导出；关闭追踪时 start_span 不做任何事
+- TracingMiddleware 从请求头 traceparent（W3C）或 X-Trace-Id 读取链路ID，为每个HTTP请求创建根 span
+- 结束的 span 投递到有界队列，由后台线程批量导出为 OTLP/JSON：写入文件（每行一个 ExportTraceServiceRequest）
+  或 POST 到 OTLP/HTTP 收集器；队列满时丢弃并计数
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import queue
+import random
+import re
+import threading
+import time
+import zlib
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from app.config.config_loader import config
+from app.utils.logger import get_trace_id, logger, set_trace_id
+
+
+# OTLP span 类型
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+# OTLP 状态码
+_STATUS_OK, _STATUS_ERROR = 1, 2
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_HEX_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_current_span: ContextVar[Optional["_BaseSpan"]] = ContextVar("current_span", default=None)
+
+
+class _BaseSpan:
+    """不记录的 span：未采样时使用，只负责把未采样的结论传给子 span"""
+    __slots__ = ("_token",)
+    recording = False
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+    def detach(self) -> "_BaseSpan":
+        return self
+
+    def end(self) -> None:
+        pass
+
+
+class _DisabledSpan(_BaseSpan):
+    """关闭追踪时使用的共享对象，不修改上下文"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_DISABLED = _DisabledSpan()
+
+
+class Span(_BaseSpan):
+    """记录中的 span"""
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "events", "status", "status_message", "_detached",
+    )
+    recording = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.events: Optional[List[Dict[str, Any]]] = None
+        self.status = _STATUS_OK
+        self.status_message: Optional[str] = None
+        self._detached = False
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.record_exception(exc)
+        if not self._detached:
+            self.end()
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes) -> None:
+        if self.events is None:
+            self.events = []
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+    def record_exception(self, error: BaseException) -> None:
+        """记录异常；取消和调用方放弃读取不视为错误"""
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            self.set_attribute("cancelled", True)
+            return
+        self.status = _STATUS_ERROR
+        self.status_message = str(error) or type(error).__name__
+        self.add_event("exception", **{"exception.type": type(error).__name__, "exception.message": str(error)})
+
+    def detach(self) -> "Span":
+        """离开 with 块时不结束，由调用方稍后调用 end()（如流式响应读取完毕时）"""
+        self._detached = True
+        return self
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        _tracer.export(self)
+
+
+class _RemoteParent(_BaseSpan):
+    """来自请求头 traceparent 的上游 span"""
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def _otlp_trace_id(trace_id: str) -> str:
+    """OTLP 要求 32 位十六进制链路ID，其他格式（如自定义 X-Trace-Id）取其哈希"""
+    if _HEX_TRACE_ID.match(trace_id):
+        return trace_id
+    return hashlib.md5(trace_id.encode("utf-8")).hexdigest()
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    attributes = dict(span.attributes)
+    if not _HEX_TRACE_ID.match(span.trace_id):
+        attributes["lithium.trace_id"] = span.trace_id
+    data = {
+        "traceId": _otlp_trace_id(span.trace_id),
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(attributes),
+        "status": {"code": span.status},
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    if span.status_message:
+        data["status"]["message"] = span.status_message
+    if span.events:
+        data["events"] = [
+            {"timeUnixNano": str(event["time_ns"]), "name": event["name"],
+             "attributes": _otlp_attributes(event["attributes"])}
+            for event in span.events
+        ]
+    return data
+
+
+class SpanExporter:
+    """后台线程批量导出 span
+
+    调用方只向有界队列投递，队列满时丢弃并计数；后台线程攒够 batch_size 个或等待 flush_interval 后导出一次。
+    """
+
+    def __init__(
+        self,
+        target: Union[str, Path],
+        mode: str = "file",
+        service_name: str = "lithium",
+        queue_size: int = 10000,
+        batch_size: int = 512,
+        flush_interval: float = 2.0,
+    ):
+        """
+        Args:
+            target: file 模式为文件路径，otlp_http 模式为收集器地址（如 http://127.0.0.1:4318/v1/traces）
+            mode: file 或 otlp_http
+            service_name: 资源属性 service.name
+            queue_size: 队列容量
+            batch_size: 单次导出的最大 span 数
+            flush_interval: 导出间隔（秒）
+        """
+        if mode not in ("file", "otlp_http"):
+            raise ValueError(f"未知的 span 导出方式: {mode}")
+        self.target = target
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._resource = {"attributes": _otlp_attributes({"service.name": service_name})}
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=queue_size)
+        self.enqueued = 0
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._client = None
+        if mode == "file":
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def put(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._export(batch)
+
+    def _export(self, batch: List[Span]) -> None:
+        request = {
+            "resourceSpans": [{
+                "resource": self._resource,
+                "scopeSpans": [{"scope": {"name": "lithium"}, "spans": [_otlp_span(span) for span in batch]}],
+            }]
+        }
+        try:
+            if self.mode == "file":
+                with open(self.target, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            else:
+                if self._client is None:
+                    import httpx
+                    self._client = httpx.Client(timeout=10.0)
+                self._client.post(str(self.target), json=request).raise_for_status()
+            self.exported += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning(f"导出 span 失败: {e}")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """导出剩余的 span 后停止后台线程"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        if self._client is not None:
+            self._client.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enqueued": self.enqueued,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "backlog": self._queue.qsize(),
+        }
+
+
+class Tracer:
+    """进程级追踪器，首次使用时读取配置 tracing，配置变化时更新开关和采样率"""
+
+    def __init__(self):
+        self._loaded = False
+        self.enabled = False
+        self.sample_rate = 1.0
+        self._exporter: Optional[SpanExporter] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        self._apply(config.snapshot)
+        config.subscribe(lambda new, old, changed: self._apply(new), "tracing")
+        self._loaded = True
+
+    def _apply(self, settings) -> None:
+        tracing_config = settings.get("tracing", {}) or {}
+        self.enabled = bool(tracing_config.get("enabled", False))
+        self.sample_rate = float(tracing_config.get("sample_rate", 1.0))
+
+    def _sampled(self, trace_id: str) -> bool:
+        """按 trace_id 哈希采样，同一链路在所有进程中结论一致"""
+        if self.sample_rate >= 1.0:
+            return True
+        if self.sample_rate <= 0.0:
+            return False
+        return zlib.crc32(trace_id.encode("utf-8")) < self.sample_rate * 0x100000000
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        parent: Optional[_BaseSpan] = None,
+        **attributes,
+    ) -> _BaseSpan:
+        if not self._loaded:
+            self._load()
+        if not self.enabled:
+            return _DISABLED
+        parent = parent if parent is not None else _current_span.get()
+        if parent is None:
+            trace_id = get_trace_id() or set_trace_id()
+            if not self._sampled(trace_id):
+                return _BaseSpan()
+            return Span(name, trace_id, None, kind, attributes)
+        if isinstance(parent, _RemoteParent):
+            if not parent.sampled:
+                return _BaseSpan()
+            return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+        if not parent.recording:
+            return _BaseSpan()
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+
+    def _get_exporter(self) -> SpanExporter:
+        with self._lock:
+            if self._exporter is None:
+                tracing_config = config.get("tracing", {}) or {}
+                mode = tracing_config.get("exporter", "file")
+                if mode == "file":
+                    log_dir = Path((config.get("log", {}) or {}).get("dir", "logs"))
+                    target = log_dir / tracing_config.get("filename", "traces.jsonl")
+                else:
+                    target = tracing_config.get("endpoint", "http://127.0.0.1:4318/v1/traces")
+                self._exporter = SpanExporter(
+                    target,
+                    mode=mode,
+                    service_name=tracing_config.get("service_name", "lithium"),
+                    queue_size=tracing_config.get("queue_size", 10000),
+                    batch_size=tracing_config.get("batch_size", 512),
+                    flush_interval=tracing_config.get("flush_interval", 2.0),
+                )
+                logger.info(f"span 导出: {mode} -> {target}")
+            return self._exporter
+
+    def export(self, span: Span) -> None:
+        exporter = self._exporter or self._get_exporter()
+        exporter.put(span)
+
+    def shutdown(self) -> None:
+        """导出剩余的 span 并停止后台线程"""
+        with self._lock:
+            exporter, self._exporter = self._exporter, None
+        if exporter is not None:
+            exporter.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "exporter": self._exporter.stats() if self._exporter is not None else None,
+        }
+
+
+_tracer = Tracer()
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> _BaseSpan:
+    """创建 span，作为上下文管理器使用时成为当前 span，退出时结束
+
+    Args:
+        name: span 名称，如 "agent.task"
+        kind: span 类型（SPAN_KIND_*）
+        **attributes: span 属性
+    """
+    return _tracer.start_span(name, kind, **attributes)
+
+
+def current_span() -> Optional[_BaseSpan]:
+    """当前 span，没有时返回None"""
+    return _current_span.get()
+
+
+def traced(name: Optional[str] = None, **attributes) -> Callable:
+    """为函数创建 span 的装饰器，支持同步和异步函数
+
+    Args:
+        name: span 名称，默认为函数的限定名
+        **attributes: span 属性
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def tracing_stats() -> Dict[str, Any]:
+    """追踪统计，包括导出队列计数"""
+    return _tracer.stats()
+
+
+def shutdown_tracing() -> None:
+    """导出剩余的 span 并停止后台线程"""
+    _tracer.shutdown()
+
+
+class TracingMiddleware:
+    """ASGI 中间件：为每个HTTP请求设置 trace_id 并创建根 span
+
+    链路ID优先取请求头 traceparent（W3C Trace Context，同时继承上游的采样结论），其次取 X-Trace-Id，都没有时生成。
+    """
+
+    def __init__(self, app, header: str = "x-trace-id", exclude: tuple = ()):
+        """
+        Args:
+            app: ASGI 应用
+            header: 传递 trace_id 的请求头
+            exclude: 不创建 span 的路径，如指标接口
+        """
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        trace_id = None
+        for key, value in scope.get("headers", []):
+            if key == b"traceparent":
+                match = _TRACEPARENT.match(value.decode("latin-1").strip().lower())
+                if match:
+                    parent = _RemoteParent(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+            elif key == self.header:
+                trace_id = value.decode("latin-1")[:64]
+        set_trace_id(parent.trace_id if parent is not None else trace_id)
+        if scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        with _tracer.start_span(
+            f"HTTP {method}", SPAN_KIND_SERVER, parent, **{"http.method": method, "http.target": scope["path"]}
+        ) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.set_attribute("http.route", route)
+                span.set_attribute("http.status_code", status)
+                if span.recording:
+                    span.name = f"HTTP {method} {route or scope['path']}"
+                    if status >= 500:
+                        span.status = _STATUS_ERROR
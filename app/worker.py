@@ -0,0 +1,43 @@
+"""
+后台任务工作进程入口
+从 database.url 配置的数据库中领取并执行任务，可与 API 进程分开部署、按需启动多个
+
+运行方式（项目根目录）：
+    python -m app.worker
+"""
+import asyncio
+import signal
+
+from app.core.agents.session_backend import close_session_backend
+from app.core.llm.client_registry import client_registry
+from app.model.database import dispose_engine
+from app.service.job_worker import build_worker_pool
+from app.utils.logger import logger
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows 不支持 add_signal_handler，依赖 KeyboardInterrupt 退出
+            pass
+
+    pool = build_worker_pool()
+    await pool.start()
+    logger.info("任务工作进程已启动")
+    try:
+        await stop.wait()
+    finally:
+        # 运行中的任务放回队列，由其他工作进程继续执行
+        await pool.stop()
+        await close_session_backend()
+        await client_registry.aclose()
+        await dispose_engine()
+        logger.info("任务工作进程退出")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,6 +3,7 @@ from typing import AsyncGenerator
 from app.core.agents.model_config import ModelConfig
 from app.core.agents.base_agent import BaseAgent
 from app.config.config_loader import config
+from app.core.llm.client_registry import client_registry
 
 
 async def test_basic_chat(agent: BaseAgent) -> None:
@@ -117,6 +118,8 @@ async def main() -> None:
     finally:
         if agent:
             await agent.close()
+        # 关闭共享连接池
+        await client_registry.aclose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+"""
+任务编排器使用示例
+演示如何用 DAG 描述多个智能体之间的依赖关系，并在节点完成时流式获取结果
+"""
+import asyncio
+from typing import Any, Dict
+
+from app.config.config_loader import config
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.model_config import ModelConfig
+from app.core.agents.orchestrator import AgentTask, Orchestrator
+from app.core.llm.client_registry import client_registry
+
+
+def build_agent(system_prompt: str) -> BaseAgent:
+    """根据配置文件创建一个Agent"""
+    llm_config = config.get("llm", {})
+    model_config = ModelConfig(
+        api_key=llm_config.get("api_key"),
+        api_base=llm_config.get("api_base"),
+        model=llm_config.get("model", "gpt-3.5-turbo"),
+        stream=False,
+    )
+    return BaseAgent(model_config=model_config, system_prompt=system_prompt)
+
+
+def summary_prompt(deps: Dict[str, Any]) -> str:
+    """根据上游结果生成汇总提示词"""
+    return (
+        "请将以下两部分内容整合为一份简短的技术方案：\n"
+        f"【需求分析】{deps['requirements']}\n"
+        f"【风险评估】{deps['risks']}"
+    )
+
+
+async def main() -> None:
+    """主函数"""
+    # requirements 和 risks 相互独立，会并发执行；summary 等待二者完成后执行
+    tasks = [
+        AgentTask.from_agent(
+            "requirements",
+            build_agent("你是一名需求分析师。"),
+            "列出一个在线文档协作系统的三个核心需求。",
+        ),
+        AgentTask.from_agent(
+            "risks",
+            build_agent("你是一名架构师。"),
+            "列出一个在线文档协作系统的三个主要技术风险。",
+        ),
+        AgentTask.from_agent(
+            "summary",
+            build_agent("你是一名技术负责人。"),
+            summary_prompt,
+            depends_on=["requirements", "risks"],
+        ),
+    ]
+
+    orchestrator = Orchestrator()
+    try:
+        async for result in orchestrator.run_stream(tasks):
+            print(f"\n=== {result.name} [{result.status}] 耗时 {result.elapsed:.2f}s ===")
+            print(result.result if result.ok else result.error)
+    finally:
+        await client_registry.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
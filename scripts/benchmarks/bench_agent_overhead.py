@@ -0,0 +1,81 @@
+"""
+BaseAgent 请求组装开销微基准
+对比不同历史长度下，每次请求组装消息和参数的耗时：
+- 当前实现：复用预序列化消息缓冲区和请求参数模板
+- 逐条序列化：每次请求对所有消息和 ModelConfig 调用 pydantic 序列化（旧实现）
+当前实现的单次耗时应基本不随历史长度增长。
+
+运行方式（项目根目录）：
+    python scripts/benchmarks/bench_agent_overhead.py
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List
+
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.model_config import ModelConfig
+
+
+HISTORY_SIZES = [10, 100, 1000, 5000]
+ITERATIONS = 2000
+
+
+def build_agent(history_size: int) -> BaseAgent:
+    """创建带有指定条数历史消息的Agent（不会发起网络请求）"""
+    agent = BaseAgent(
+        model_config=ModelConfig(api_key="sk-benchmark", model="gpt-3.5-turbo"),
+        system_prompt="你是一个乐于助人的助手。",
+    )
+    for i in range(history_size):
+        role = "user" if i % 2 == 0 else "assistant"
+        agent.add_message(role, f"第{i}条消息，包含一些用于测试的普通文本内容。")
+    return agent
+
+
+def legacy_params(agent: BaseAgent) -> Dict[str, Any]:
+    """旧实现：每次请求逐条序列化消息并序列化 ModelConfig"""
+    messages = [msg.model_dump(exclude_none=True) for msg in agent._buffer]
+    return {
+        "model": agent.model_config.model,
+        "messages": messages,
+        "stream": agent.model_config.stream,
+        **{k: v for k, v in agent.model_config.model_dump().items()
+           if k not in ["model", "stream", "api_key", "api_base"] and v is not None},
+    }
+
+
+async def current_params(agent: BaseAgent) -> Dict[str, Any]:
+    """当前实现：复用预序列化消息和参数模板（与 generate 一样按请求传入 stream）"""
+    messages, _ = await agent._history_for_request()
+    return agent._build_params(messages, stream=False)
+
+
+async def measure(func: Callable[[BaseAgent], Any], agent: BaseAgent, iterations: int) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = func(agent)
+        if asyncio.iscoroutine(result):
+            await result
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main() -> None:
+    """主函数"""
+    rows: List[Dict[str, Any]] = []
+    for size in HISTORY_SIZES:
+        agent = build_agent(size)
+        iterations = max(20, ITERATIONS // max(1, size // 100))
+        rows.append({
+            "history": size,
+            "current_us": await measure(current_params, agent, ITERATIONS),
+            "legacy_us": await measure(legacy_params, agent, iterations),
+        })
+
+    print(f"{'历史条数':>8} | {'当前实现(us)':>12} | {'逐条序列化(us)':>14}")
+    for row in rows:
+        print(f"{row['history']:>10} | {row['current_us']:>14.2f} | {row['legacy_us']:>16.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""
+导入耗时基准
+在独立的子进程中分别导入各模块，输出：
+- 导入耗时（多次运行取中位数）
+- 导入后的线程数（导入不应启动监视线程等后台线程）
+- 导入后配置是否已加载、日志是否已初始化（只有 app.main 构建路由时需要读取配置）
+- python -X importtime 统计的累计耗时最高的依赖模块
+
+应用运行在临时目录中（独立的配置文件和日志），不会修改项目目录。
+
+运行方式（项目根目录）：
+    python scripts/benchmarks/bench_import.py
+    python scripts/benchmarks/bench_import.py --modules app.config.config_loader app.worker --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import yaml
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_MODULES = [
+    "app.utils.logger",
+    "app.config.config_loader",
+    "app.core.llm.client_registry",
+    "app.core.agents.base_agent",
+    "app.worker",
+    "app.main",
+]
+
+# 子进程中执行：导入模块并报告耗时和副作用
+PROBE = """
+import json, sys, threading, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - start
+from app.config.config_loader import config
+from app.utils import logger as log_module
+print(json.dumps({
+    "elapsed": elapsed,
+    "threads": threading.active_count(),
+    "config_loaded": config._data is not None,
+    "logger_ready": log_module._setup_state == log_module._SETUP_DONE,
+    "watching": config.observer is not None,
+}))
+"""
+
+
+def write_config(workdir: Path) -> None:
+    """在临时目录写入配置文件 configs/config_benchimport.yml"""
+    settings = {
+        "app": {"name": "lithium-bench"},
+        "api": {"prefix": "/api/v1"},
+        "database": {"url": f"sqlite:///{workdir / 'bench.db'}"},
+        "log": {"dir": str(workdir / "logs"), "console": {"level": "WARNING"}},
+        "llm": {"api_key": "sk-bench", "model": "mock"},
+    }
+    config_dir = workdir / "configs"
+    config_dir.mkdir(parents=True, exist_ok=True)
+    with open(config_dir / "config_benchimport.yml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(settings, f, allow_unicode=True)
+
+
+def run_probe(module: str, workdir: Path, importtime: bool = False) -> Tuple[Dict[str, Any], str]:
+    """在新的解释器中导入模块，返回 (探测结果, importtime 输出)"""
+    env = {**os.environ, "ENV": "benchimport", "PYTHONPATH": str(PROJECT_ROOT)}
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    result = subprocess.run(
+        cmd + ["-c", PROBE, module], cwd=workdir, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def top_imports(importtime_output: str, limit: int) -> List[Tuple[int, str]]:
+    """解析 -X importtime 输出，返回累计耗时最高的模块 (微秒, 模块名)"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="导入耗时基准")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="lithium-bench-import-") as tmp:
+        workdir = Path(tmp)
+        write_config(workdir)
+        print(f"{'模块':<32} {'导入耗时(ms)':>12} {'线程数':>6} {'已加载配置':>10} {'日志已初始化':>12} {'监视配置':>8}")
+        for module in args.modules:
+            samples = [run_probe(module, workdir)[0] for _ in range(args.runs)]
+            last = samples[-1]
+            elapsed = statistics.median(sample["elapsed"] for sample in samples) * 1000
+            print(
+                f"{module:<32} {elapsed:>12.1f} {last['threads']:>6d} {str(last['config_loaded']):>10} "
+                f"{str(last['logger_ready']):>12} {str(last['watching']):>8}"
+            )
+
+        print(f"\n累计导入耗时最高的模块（{args.modules[-1]}）：")
+        _, output = run_probe(args.modules[-1], workdir, importtime=True)
+        for cumulative, name in top_imports(output, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
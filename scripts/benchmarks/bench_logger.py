@@ -0,0 +1,134 @@
+"""
+TracedLogger 单次调用开销基准
+对比旧实现（每次调用 opt(depth=2)、getattr、查找/生成 trace_id，每个处理器的过滤器重复查找上下文）
+与当前实现（调用处按缓存的级别直接丢弃，trace_id 每条日志只查找一次）：
+1. 未启用级别的日志（DEBUG，处理器级别为 INFO）
+2. 输出到两个处理器的日志（同步文件处理器 + JSON Lines 处理器）
+3. 多线程并发写入有界队列的 JSON Lines 处理器，统计调用方耗时和丢弃条数
+
+运行方式（项目根目录）：
+    python scripts/benchmarks/bench_logger.py
+"""
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger as _logger
+
+from app.utils import logger as log_module
+from app.utils.logger import JsonLinesSink, TracedLogger, TraceIDFilter, get_trace_id, set_trace_id
+
+
+ITERATIONS = 100_000
+THREADS = 8
+PER_THREAD = 20_000
+
+
+class LegacyTracedLogger:
+    """旧实现"""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level: str, message: str, *args, **kwargs):
+        if get_trace_id() is None:
+            set_trace_id()
+        opt_logger = self._logger.opt(depth=2)
+        return getattr(opt_logger, level)(message, *args, **kwargs)
+
+    def debug(self, message: str, *args, **kwargs):
+        return self._log("debug", message, *args, **kwargs)
+
+    def info(self, message: str, *args, **kwargs):
+        return self._log("info", message, *args, **kwargs)
+
+
+def per_call_ns(fn: Callable[[], None], iterations: int = ITERATIONS) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def configure(workdir: Path, legacy: bool, queue_size: int = 100_000) -> JsonLinesSink:
+    """配置一个 INFO 级别的同步文件处理器和一个 JSON Lines 处理器"""
+    log_module.remove_sink()
+    sink = JsonLinesSink(workdir / f"bench-{legacy}-{queue_size}.jsonl", queue_size=queue_size)
+    if legacy:
+        _logger.configure(patcher=None)
+        log_module.add_sink(str(workdir / "bench-legacy.log"), level="INFO", filter=TraceIDFilter(),
+                            format="{time} | {level} | {extra[trace_id]} | {message}")
+        log_module.add_sink(sink, level="INFO", filter=TraceIDFilter())
+    else:
+        _logger.configure(patcher=log_module._patch_trace_id)
+        log_module.add_sink(str(workdir / "bench-current.log"), level="INFO",
+                            format="{time} | {level} | {extra[trace_id]} | {message}")
+        log_module.add_sink(sink, level="INFO")
+    return sink
+
+
+def run_threads(logger, count: int) -> float:
+    """多线程并发写日志，返回调用方平均单次耗时（纳秒）"""
+    durations = []
+
+    def work(index: int) -> None:
+        set_trace_id(f"thread-{index}")
+        start = time.perf_counter_ns()
+        for i in range(count):
+            logger.info("并发日志 {} {}", index, i)
+        durations.append((time.perf_counter_ns() - start) / count)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(durations) / len(durations)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory(prefix="lithium-bench-log-") as tmp:
+        workdir = Path(tmp)
+        # 先完成日志初始化，避免首次输出日志时按项目配置重建处理器
+        log_module.setup_logger({"dir": str(workdir)})
+        print(f"{'场景':<28} {'旧实现(ns/次)':>14} {'当前实现(ns/次)':>16} {'加速比':>8}")
+
+        rows = []
+        for legacy in (True, False):
+            sink = configure(workdir, legacy)
+            logger = LegacyTracedLogger(_logger) if legacy else TracedLogger(_logger)
+            set_trace_id("bench")
+            disabled = per_call_ns(lambda: logger.debug("调试信息 {}", 1))
+            enabled = per_call_ns(lambda: logger.info("业务日志 {}", 1), ITERATIONS // 10)
+            sink.stop()
+            rows.append((disabled, enabled))
+
+        (old_disabled, old_enabled), (new_disabled, new_enabled) = rows
+        print(f"{'未启用级别 (DEBUG)':<28} {old_disabled:>14.0f} {new_disabled:>16.0f} {old_disabled / new_disabled:>7.1f}x")
+        print(f"{'输出到两个处理器 (INFO)':<28} {old_enabled:>14.0f} {new_enabled:>16.0f} {old_enabled / new_enabled:>7.1f}x")
+
+        lazy_logger = TracedLogger(_logger).lazy
+        configure(workdir, legacy=False).stop()
+        lazy = per_call_ns(lambda: lazy_logger.debug("统计 {}", lambda: sum(range(1000))))
+        print(f"{'惰性参数 (DEBUG, 未求值)':<28} {'-':>14} {lazy:>16.0f}")
+
+        print(f"\n并发写入：{THREADS} 个线程 × {PER_THREAD} 条，JSON Lines 处理器")
+        for queue_size in (100_000, 1_000):
+            log_module.remove_sink()
+            sink = JsonLinesSink(workdir / f"load-{queue_size}.jsonl", queue_size=queue_size)
+            _logger.configure(patcher=log_module._patch_trace_id)
+            log_module.add_sink(sink, level="INFO")
+            cost = run_threads(TracedLogger(_logger), PER_THREAD)
+            sink.stop()
+            stats = sink.stats()
+            print(
+                f"  队列容量={queue_size:<7d} 调用方耗时={cost:8.0f} ns/次 "
+                f"已写入={stats['written']:<7d} 丢弃={stats['dropped']}"
+            )
+        log_module.remove_sink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+消息总线吞吐基准
+- 发布/订阅：多个发布者向同一主题发布，多个订阅者各自收到全部消息，测量每秒投递的消息数
+- 请求/应答：多个并发请求方向同一个处理者发送请求，测量每秒完成的请求数和延迟分位数
+- 背压：订阅者队列较小且处理较慢时，发布方被限速而队列不会无限增长
+
+默认使用进程内传输；--transport redis 时经本地 Redis 协议服务（--redis-url）跨进程传输。
+
+运行方式（项目根目录）：
+    python scripts/benchmarks/bench_message_bus.py
+    python scripts/benchmarks/bench_message_bus.py --messages 200000 --subscribers 4 --queue-size 256
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from app.core.agents.message_bus import LocalTransport, MessageBus, RedisTransport
+
+
+def make_bus(args: argparse.Namespace) -> MessageBus:
+    transport = RedisTransport(args.redis_url) if args.transport == "redis" else LocalTransport()
+    return MessageBus(transport, queue_size=args.queue_size)
+
+
+async def bench_pubsub(args: argparse.Namespace) -> None:
+    bus = make_bus(args)
+    subscriptions = [bus.subscribe("bench.pubsub") for _ in range(args.subscribers)]
+    await bus.start()
+    per_publisher = args.messages // args.publishers
+    total = per_publisher * args.publishers
+    max_queued = 0
+
+    async def publish() -> None:
+        for i in range(per_publisher):
+            await bus.publish("bench.pubsub", i)
+
+    async def consume(subscription) -> None:
+        nonlocal max_queued
+        for _ in range(total):
+            await subscription.get()
+            max_queued = max(max_queued, subscription.queue.qsize())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(publish() for _ in range(args.publishers)), *(consume(s) for s in subscriptions))
+    elapsed = time.perf_counter() - start
+    await bus.close()
+    print(
+        f"发布/订阅: {total} 条 x {args.subscribers} 订阅者, {elapsed:.2f}s, "
+        f"发布 {total / elapsed:,.0f} 条/秒, 投递 {total * args.subscribers / elapsed:,.0f} 条/秒, "
+        f"最大队列长度 {max_queued}"
+    )
+
+
+async def bench_request_reply(args: argparse.Namespace) -> None:
+    bus = make_bus(args)
+
+    async def echo(payload):
+        return payload
+
+    bus.respond("bench.echo", echo, concurrency=args.handlers)
+    await bus.start()
+    latencies: List[float] = []
+    per_client = args.requests // args.clients
+
+    async def client() -> None:
+        for i in range(per_client):
+            start = time.perf_counter()
+            await bus.request("bench.echo", i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    await bus.close()
+    latencies.sort()
+    print(
+        f"请求/应答: {len(latencies)} 次, {args.clients} 并发, {len(latencies) / elapsed:,.0f} 次/秒, "
+        f"p50 {statistics.median(latencies) * 1e6:.0f}us, p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f}us"
+    )
+
+
+async def bench_backpressure(args: argparse.Namespace) -> None:
+    bus = MessageBus(LocalTransport(), queue_size=16)
+    subscription = bus.subscribe("bench.slow")
+    count = 200
+    max_queued = 0
+
+    async def consume() -> None:
+        nonlocal max_queued
+        for _ in range(count):
+            await subscription.get()
+            max_queued = max(max_queued, subscription.queue.qsize())
+            await asyncio.sleep(0.001)
+
+    async def publish() -> None:
+        for i in range(count):
+            await bus.publish("bench.slow", i)
+
+    start = time.perf_counter()
+    await asyncio.gather(publish(), consume())
+    elapsed = time.perf_counter() - start
+    await bus.close()
+    print(f"背压: 慢订阅者(1ms/条) {count} 条, 耗时 {elapsed:.2f}s, 最大队列长度 {max_queued}（容量 16）")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="消息总线吞吐基准")
+    parser.add_argument("--transport", choices=["local", "redis"], default="local")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--publishers", type=int, default=4)
+    parser.add_argument("--subscribers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--handlers", type=int, default=4)
+    args = parser.parse_args()
+
+    await bench_pubsub(args)
+    await bench_request_reply(args)
+    await bench_backpressure(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
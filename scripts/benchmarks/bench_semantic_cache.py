@@ -0,0 +1,73 @@
+"""
+语义缓存查找微基准
+在不同条目数下测量 SemanticCache 的向量化（HashingEmbedder）和查找耗时，以及改写后的提问正确命中和误命中（命中了其他提问的回复）的比例，用于选择相似度阈值。
+条目分布在多个上下文中，查找只在同一上下文的条目之间计算相似度。
+
+运行方式（项目根目录）：
+    python scripts/benchmarks/bench_semantic_cache.py
+    python scripts/benchmarks/bench_semantic_cache.py --sizes 1000 10000 --scopes 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.core.llm.semantic_cache import SemanticCache
+
+
+TEMPLATES = [
+    "如何重置第{i}号账户的密码？",
+    "第{i}号订单什么时候发货？",
+    "怎样申请第{i}号发票的退款",
+    "What is the refund policy for order {i}?",
+]
+PARAPHRASES = [
+    "第{i}号账户的密码如何重置",
+    "第{i}号订单何时发货？",
+    "怎样申请第{i}号发票退款？",
+    "what's the refund policy for order {i}",
+]
+
+
+async def run(size: int, scopes: int, lookups: int, threshold: float) -> None:
+    cache = SemanticCache(threshold=threshold, max_entries=size)
+    for i in range(size):
+        text = TEMPLATES[i % len(TEMPLATES)].format(i=i)
+        cache.add(await cache.embed(text), i % scopes, text, {"answer": i})
+
+    embed_times, lookup_times = [], []
+    hits = wrong = 0
+    for n in range(lookups):
+        i = (n * 7919) % size
+        start = time.perf_counter()
+        vector = await cache.embed(PARAPHRASES[i % len(PARAPHRASES)].format(i=i))
+        embed_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        value = cache.lookup(vector, i % scopes)
+        lookup_times.append(time.perf_counter() - start)
+        if value is not None:
+            hits += value["answer"] == i
+            wrong += value["answer"] != i
+
+    print(
+        f"{size:>8d} {statistics.median(embed_times) * 1e6:>12.1f} "
+        f"{statistics.median(lookup_times) * 1e6:>12.1f} "
+        f"{sorted(lookup_times)[int(len(lookup_times) * 0.99)] * 1e6:>12.1f} {hits / lookups:>8.1%} {wrong / lookups:>8.1%}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="语义缓存查找微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--scopes", type=int, default=1, help="条目分布的上下文数")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.98)
+    args = parser.parse_args()
+
+    print(f"{'条目数':>8} {'向量化(us)':>12} {'查找p50(us)':>12} {'查找p99(us)':>12} {'正确命中':>8} {'误命中':>8}")
+    for size in args.sizes:
+        await run(size, args.scopes, args.lookups, args.threshold)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,352 @@
+"""
+基准测试套件（不访问真实服务商）
+启动本地 OpenAI 模拟服务（mock_openai_server.py，可配置延迟、生成速度和错误注入），在不同并发度下测量：
+- agent_throughput：BaseAgent.generate 非流式吞吐和延迟
+- stream_ttft：BaseAgent.generate 流式首Token延迟和总耗时
+- memory：每个会话（多轮对话的 BaseAgent）占用的内存
+- api_rps：POST /api/v1/chat/completions 接口的每秒请求数（应用以单个 uvicorn 工作进程运行）
+
+结果保存为 JSON，可通过 --compare 与之前保存的结果对比，变差超过阈值的指标标记为回归。
+应用运行在临时目录中（独立的配置文件、数据库和日志），不会修改项目目录。
+
+运行方式（项目根目录）：
+    python scripts/benchmarks/bench_suite.py --output bench-baseline.json
+    python scripts/benchmarks/bench_suite.py --concurrency 1 10 50 --compare bench-baseline.json --output bench-new.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import yaml
+
+from load_test_workers import API_PREFIX, MOCK_SERVER, PROJECT_ROOT, free_port, start_process, stop_process, wait_ready
+
+
+# 指标方向：True 表示越大越好
+HIGHER_IS_BETTER = {"throughput": True, "rps": True}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(len(ordered) * q) - 1))]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    """汇总一轮压测的吞吐和延迟（毫秒）"""
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else 0.0,
+    }
+
+
+def write_config(workdir: Path, mock_port: int) -> None:
+    """在临时目录写入配置文件 configs/config_loadtest.yml，关闭缓存和请求合并，使每次请求都到达模拟服务"""
+    settings: Dict[str, Any] = {
+        "app": {"name": "lithium-bench", "debug": False},
+        "api": {"prefix": API_PREFIX},
+        "database": {"url": f"sqlite:///{workdir / 'bench.db'}"},
+        "log": {"dir": str(workdir / "logs"), "console": {"level": "WARNING"}, "file": {"level": "WARNING"}},
+        "agents": {"max_agents": 1000, "retry_attempts": 3},
+        "llm": {
+            "api_key": "sk-bench",
+            "api_base": f"http://127.0.0.1:{mock_port}/v1",
+            "model": "mock",
+            "stream": False,
+            "http_client": {"http2": False, "max_connections": 1000, "max_keepalive_connections": 200},
+        },
+        "jobs": {"pool": "external"},
+        "session": {"backend": "memory"},
+    }
+    config_dir = workdir / "configs"
+    config_dir.mkdir(parents=True, exist_ok=True)
+    with open(config_dir / "config_loadtest.yml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(settings, f, allow_unicode=True)
+
+
+async def run_concurrent(total: int, concurrency: int, one: Callable[[int], Awaitable[None]]) -> float:
+    """以固定并发度执行 total 次 one(i)，返回总耗时"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded(index: int) -> None:
+        async with semaphore:
+            await one(index)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(guarded(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+class Suite:
+    """在当前进程中运行 Agent 相关场景"""
+
+    def __init__(self, api_base: str, requests_per_level: int):
+        # 延迟导入：需要先切换到临时目录并设置 ENV，应用才会读取压测配置
+        from app.core.agents.base_agent import BaseAgent
+        from app.core.agents.model_config import ModelConfig
+
+        self.BaseAgent = BaseAgent
+        self.ModelConfig = ModelConfig
+        self.api_base = api_base
+        self.requests_per_level = requests_per_level
+
+    def new_agent(self, stream: bool = False):
+        return self.BaseAgent(
+            model_config=self.ModelConfig(api_key="sk-bench", api_base=self.api_base, model="mock", stream=stream),
+            system_prompt="你是一个乐于助人的助手。",
+        )
+
+    def total(self, concurrency: int) -> int:
+        return max(self.requests_per_level, concurrency * 2)
+
+    async def agent_throughput(self, concurrency: int) -> Dict[str, float]:
+        latencies: List[float] = []
+        errors = 0
+
+        async def one(index: int) -> None:
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                await self.new_agent().generate(f"第{index}个问题")
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+        elapsed = await run_concurrent(self.total(concurrency), concurrency, one)
+        return summarize(latencies, elapsed, errors)
+
+    async def stream_ttft(self, concurrency: int) -> Dict[str, float]:
+        ttfts: List[float] = []
+        totals: List[float] = []
+        errors = 0
+
+        async def one(index: int) -> None:
+            nonlocal errors
+            start = time.perf_counter()
+            first = None
+            try:
+                async for _ in await self.new_agent(stream=True).generate(f"第{index}个问题"):
+                    if first is None:
+                        first = time.perf_counter() - start
+            except Exception:
+                errors += 1
+                return
+            if first is None:
+                # 没有收到任何Token，不能计为0延迟
+                errors += 1
+                return
+            ttfts.append(first)
+            totals.append(time.perf_counter() - start)
+
+        elapsed = await run_concurrent(self.total(concurrency), concurrency, one)
+        result = summarize(totals, elapsed, errors)
+        result["ttft_p50_ms"] = statistics.median(ttfts) * 1000 if ttfts else 0.0
+        result["ttft_p99_ms"] = percentile(ttfts, 0.99) * 1000 if ttfts else 0.0
+        return result
+
+    async def memory(self, conversations: int, turns: int, concurrency: int) -> Dict[str, float]:
+        """保留 conversations 个完成 turns 轮对话的 Agent，统计新增内存"""
+        agents = []
+        # 先完成一次请求，使共享客户端、连接池等一次性开销不计入
+        await self.new_agent().generate("预热")
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+
+        async def one(index: int) -> None:
+            agent = self.new_agent()
+            for turn in range(turns):
+                await agent.generate(f"会话{index}第{turn}轮提问")
+            agents.append(agent)
+
+        await run_concurrent(conversations, concurrency, one)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        messages = sum(len(agent.messages) for agent in agents)
+        return {
+            "conversations": len(agents),
+            "messages": messages,
+            "bytes_per_conversation": used / max(len(agents), 1),
+            "bytes_per_message": used / max(messages, 1),
+        }
+
+
+async def api_rps(base_url: str, concurrency: int, total: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def one(index: int) -> None:
+            nonlocal errors
+            start = time.perf_counter()
+            response = await client.post(f"{base_url}{API_PREFIX}/chat/completions", json={
+                "stream": False,
+                "messages": [{"role": "user", "content": f"第{index}个问题"}],
+            })
+            if response.status_code != 200:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+        elapsed = await run_concurrent(total, concurrency, one)
+    result = summarize(latencies, elapsed, errors)
+    result["rps"] = result.pop("throughput")
+    return result
+
+
+def metric_better(name: str) -> bool:
+    """指标是否越大越好"""
+    return HIGHER_IS_BETTER.get(name, False)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """打印两次结果的差异，返回回归的指标数"""
+    regressions = 0
+    print(f"\n与基线对比（阈值 {threshold:.0%}）：")
+    for scenario, levels in current["results"].items():
+        for level, metrics in levels.items():
+            old_metrics = baseline.get("results", {}).get(scenario, {}).get(level)
+            if not old_metrics:
+                continue
+            for name, value in metrics.items():
+                old = old_metrics.get(name)
+                if name in ("requests", "errors", "conversations", "messages") or not old:
+                    continue
+                change = (value - old) / old
+                worse = -change if metric_better(name) else change
+                flag = "回归" if worse > threshold else ("改进" if worse < -threshold else "")
+                regressions += flag == "回归"
+                print(f"  {scenario:<17} {level:<8} {name:<24} {old:>12.1f} -> {value:>12.1f} ({change:+7.1%}) {flag}")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="基准测试套件")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--requests", type=int, default=200, help="每个并发度下的请求数（至少为并发度的两倍）")
+    parser.add_argument("--scenarios", nargs="+", default=["agent_throughput", "stream_ttft", "memory", "api_rps"])
+    parser.add_argument("--conversations", type=int, default=200, help="memory 场景的会话数")
+    parser.add_argument("--turns", type=int, default=5, help="memory 场景每个会话的轮数")
+    parser.add_argument("--mock-latency", type=float, default=0.05)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--mock-reply-tokens", type=int, default=50)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="结果保存路径（JSON）")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果对比")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定回归的相对变化阈值")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    baseline_path = Path(args.compare).resolve() if args.compare else None
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": {},
+    }
+    results = report["results"]
+
+    with tempfile.TemporaryDirectory(prefix="lithium-bench-") as tmp:
+        workdir = Path(tmp)
+        mock_port = free_port()
+        mock = start_process([
+            sys.executable, str(MOCK_SERVER), "--port", str(mock_port),
+            "--latency", str(args.mock_latency),
+            "--tokens-per-second", str(args.mock_tokens_per_second),
+            "--reply-tokens", str(args.mock_reply_tokens),
+            "--error-rate", str(args.mock_error_rate),
+        ], workdir)
+        write_config(workdir, mock_port)
+        # 当前进程中的场景同样使用临时目录中的压测配置
+        os.environ["ENV"] = "loadtest"
+        os.chdir(workdir)
+        sys.path.insert(0, str(PROJECT_ROOT))
+        try:
+            await wait_ready(f"http://127.0.0.1:{mock_port}/docs")
+            suite = Suite(f"http://127.0.0.1:{mock_port}/v1", args.requests)
+
+            for scenario in ("agent_throughput", "stream_ttft"):
+                if scenario not in args.scenarios:
+                    continue
+                results[scenario] = {}
+                for concurrency in args.concurrency:
+                    result = await getattr(suite, scenario)(concurrency)
+                    results[scenario][f"c={concurrency}"] = result
+                    print(f"{scenario:<17} c={concurrency:<5d} " + " ".join(
+                        f"{key}={value:.1f}" for key, value in result.items()
+                    ))
+
+            if "memory" in args.scenarios:
+                result = await suite.memory(args.conversations, args.turns, max(args.concurrency))
+                results["memory"] = {f"turns={args.turns}": result}
+                print(f"{'memory':<17} 每个会话 {result['bytes_per_conversation'] / 1024:.1f} KiB，"
+                      f"每条消息 {result['bytes_per_message']:.0f} B")
+
+            if "api_rps" in args.scenarios:
+                port = free_port()
+                server = start_process(
+                    [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                     "--port", str(port), "--log-level", "warning"],
+                    workdir,
+                )
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    await wait_ready(f"{base_url}{API_PREFIX}/")
+                    results["api_rps"] = {}
+                    for concurrency in args.concurrency:
+                        result = await api_rps(base_url, concurrency, max(args.requests, concurrency * 2))
+                        results["api_rps"][f"c={concurrency}"] = result
+                        print(f"{'api_rps':<17} c={concurrency:<5d} " + " ".join(
+                            f"{key}={value:.1f}" for key, value in result.items()
+                        ))
+                finally:
+                    stop_process(server)
+        finally:
+            stop_process(mock)
+            os.chdir(PROJECT_ROOT)
+
+    if output is not None:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {output}")
+    if baseline_path is not None:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"\n{regressions} 个指标回归")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,206 @@
+"""
+多工作进程水平扩展压测
+- 启动本地 OpenAI 模拟服务（mock_openai_server.py），以不同的 uvicorn 工作进程数启动应用
+- 并发模拟若干会话，每个会话连续多轮调用 POST /api/v1/chat/completions（携带 session_id），
+  请求在工作进程之间随机分配，没有粘性路由
+- 结束后通过 GET /api/v1/chat/sessions/{id} 校验每个会话的消息条数，证明任意进程都能处理任意一轮
+- 输出各工作进程数下的吞吐量及相对单进程的加速比
+
+应用运行在临时目录中（独立的配置文件、数据库和日志），不会修改项目目录。
+
+运行方式（项目根目录）：
+    python scripts/benchmarks/load_test_workers.py --workers 1 2 4 --backend database
+    python scripts/benchmarks/load_test_workers.py --workers 1 2 4 --backend redis --redis-url redis://127.0.0.1:6379/0
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import yaml
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+MOCK_SERVER = PROJECT_ROOT / "scripts" / "benchmarks" / "mock_openai_server.py"
+API_PREFIX = "/api/v1"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_config(workdir: Path, mock_ports: List[int], args: argparse.Namespace) -> None:
+    """在临时目录写入压测使用的配置文件 configs/config_loadtest.yml"""
+    endpoints = [
+        {"name": f"mock-{port}", "api_base": f"http://127.0.0.1:{port}/v1", "api_key": "sk-loadtest", "model": "mock"}
+        for port in mock_ports
+    ]
+    settings: Dict[str, Any] = {
+        "app": {"name": "lithium-loadtest", "debug": False},
+        "api": {"prefix": API_PREFIX},
+        "database": {"url": f"sqlite:///{workdir / 'loadtest.db'}"},
+        "log": {"dir": str(workdir / "logs"), "console": {"level": "WARNING"}, "file": {"level": "WARNING"}},
+        "agents": {"max_agents": 1000, "retry_attempts": 0},
+        "llm": {
+            "api_key": "sk-loadtest",
+            "api_base": endpoints[0]["api_base"],
+            "model": "mock",
+            "stream": False,
+            "http_client": {"http2": False, "max_connections": 1000, "max_keepalive_connections": 200},
+            # 多个模拟服务进程通过路由器分摊，避免模拟服务成为瓶颈
+            "router": {"enabled": len(endpoints) > 1, "endpoints": endpoints},
+        },
+        "jobs": {"pool": "external"},
+        "session": {"backend": args.backend, "redis_url": args.redis_url, "history_limit": 50},
+    }
+    config_dir = workdir / "configs"
+    config_dir.mkdir(parents=True, exist_ok=True)
+    with open(config_dir / "config_loadtest.yml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(settings, f, allow_unicode=True)
+
+
+async def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"服务未就绪: {url}")
+
+
+async def run_conversation(client: httpx.AsyncClient, base_url: str, turns: int, latencies: List[float]) -> str:
+    """执行一个多轮会话，返回会话ID"""
+    session_id = uuid.uuid4().hex
+    for turn in range(turns):
+        start = time.perf_counter()
+        response = await client.post(f"{base_url}{API_PREFIX}/chat/completions", json={
+            "session_id": session_id,
+            "stream": False,
+            "messages": [{"role": "user", "content": f"第{turn}轮提问"}],
+        })
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return session_id
+
+
+async def load(base_url: str, sessions: int, turns: int, concurrency: int) -> Dict[str, Any]:
+    """并发执行所有会话并校验会话历史"""
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    # 每个请求使用新连接，由内核将连接分配给不同的工作进程
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def one() -> str:
+            async with semaphore:
+                return await run_conversation(client, base_url, turns, latencies)
+
+        start = time.perf_counter()
+        session_ids = await asyncio.gather(*(one() for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+
+        # 抽样校验：每轮一问一答，消息条数应为 2 * turns
+        broken = 0
+        for session_id in random.sample(session_ids, min(50, len(session_ids))):
+            response = await client.get(f"{base_url}{API_PREFIX}/chat/sessions/{session_id}")
+            if len(response.json()["messages"]) != 2 * turns:
+                broken += 1
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "broken_sessions": broken,
+    }
+
+
+def start_process(cmd: List[str], cwd: Path) -> subprocess.Popen:
+    env = {**os.environ, "ENV": "loadtest", "PYTHONPATH": str(PROJECT_ROOT)}
+    return subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="多工作进程水平扩展压测")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backend", choices=["database", "redis"], default="database")
+    parser.add_argument("--redis-url", default="redis://127.0.0.1:6379/0")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--mock-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="lithium-loadtest-") as tmp:
+        workdir = Path(tmp)
+        mock_ports = [free_port() for _ in range(max(args.workers))]
+        mocks = [
+            start_process(
+                [sys.executable, str(MOCK_SERVER), "--port", str(port), "--latency", str(args.mock_latency)],
+                workdir,
+            )
+            for port in mock_ports
+        ]
+        write_config(workdir, mock_ports, args)
+        try:
+            for port in mock_ports:
+                await wait_ready(f"http://127.0.0.1:{port}/docs")
+            for workers in args.workers:
+                port = free_port()
+                server = start_process(
+                    [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                     "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                    workdir,
+                )
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    await wait_ready(f"{base_url}{API_PREFIX}/")
+                    result = await load(base_url, args.sessions, args.turns, args.concurrency)
+                finally:
+                    stop_process(server)
+                results.append((workers, result))
+                print(
+                    f"workers={workers:<3d} 请求数={result['requests']:<6d} 吞吐={result['throughput']:8.1f} req/s "
+                    f"p50={result['p50_ms']:7.1f}ms p99={result['p99_ms']:7.1f}ms "
+                    f"会话历史异常={result['broken_sessions']}"
+                )
+        finally:
+            for mock in mocks:
+                stop_process(mock)
+
+    baseline = results[0][1]["throughput"] / results[0][0]
+    print("\n加速比（相对单进程吞吐）：")
+    for workers, result in results:
+        speedup = result["throughput"] / baseline
+        print(f"  workers={workers:<3d} speedup={speedup:5.2f}x  效率={speedup / workers:6.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+"""
+本地 OpenAI 兼容模拟服务
+- 实现 POST /v1/chat/completions（流式和非流式），无需访问真实服务商
+- 可配置响应延迟和错误注入（429 带 Retry-After、500），用于验证重试、熔断和对冲
+- 可配置生成速度（每秒Token数，每个字符计为一个Token）和回复长度；流式响应可注入中途断开
+
+运行方式（项目根目录）：
+    python scripts/benchmarks/mock_openai_server.py --port 9000 --latency 0.2 --error-rate 0.1
+
+Agent 侧将 api_base 设置为 http://127.0.0.1:9000/v1 即可。
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class MockSettings:
+    """模拟服务参数"""
+    latency: float = 0.1            # 首字节前的固定延迟（秒）
+    latency_jitter: float = 0.0     # 延迟的随机抖动上限（秒）
+    error_rate: float = 0.0         # 返回错误的概率
+    rate_limit_ratio: float = 0.5   # 错误中 429 所占比例，其余为 500
+    retry_after: float = 1.0        # 429 响应的 Retry-After（秒）
+    tokens_per_second: float = 0.0  # 生成速度，0 表示立即返回全部内容
+    stream_error_rate: float = 0.0  # 流式响应中途断开的概率
+    reply: str = "这是来自本地模拟服务的回复。"
+
+    def token_interval(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+settings = MockSettings()
+app = FastAPI(title="Mock OpenAI")
+
+
+def _completion_id() -> str:
+    return f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+
+def _injected_error() -> JSONResponse | None:
+    """按配置的错误率返回注入的错误响应"""
+    if random.random() >= settings.error_rate:
+        return None
+    if random.random() < settings.rate_limit_ratio:
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(settings.retry_after)},
+            content={"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+        )
+    return JSONResponse(
+        status_code=500,
+        content={"error": {"message": "Internal server error", "type": "server_error"}},
+    )
+
+
+def _usage(body: Dict[str, Any], completion_tokens: int) -> Dict[str, int]:
+    prompt_tokens = sum(len(str(m.get("content", ""))) // 4 + 4 for m in body.get("messages", []))
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def _stream(body: Dict[str, Any]) -> AsyncGenerator[str, None]:
+    completion_id = _completion_id()
+    created = int(time.time())
+    base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": body["model"]}
+    interval = settings.token_interval()
+    # 在随机位置断开连接，模拟上游中途出错
+    break_at = (
+        random.randrange(len(settings.reply)) if random.random() < settings.stream_error_rate else None
+    )
+    for index, char in enumerate(settings.reply):
+        if index == break_at:
+            raise ConnectionError("注入的流式响应中断")
+        if interval and index:
+            await asyncio.sleep(interval)
+        delta = {"content": char} if index else {"role": "assistant", "content": char}
+        chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    final = {
+        **base,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        "usage": _usage(body, len(settings.reply)),
+    }
+    yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """OpenAI 兼容的聊天补全接口"""
+    body = await request.json()
+    await asyncio.sleep(settings.latency + random.uniform(0, settings.latency_jitter))
+    error = _injected_error()
+    if error is not None:
+        return error
+    if body.get("stream"):
+        return StreamingResponse(_stream(body), media_type="text/event-stream")
+    # 非流式响应等待全部内容生成完毕
+    await asyncio.sleep(settings.token_interval() * max(len(settings.reply) - 1, 0))
+    return {
+        "id": _completion_id(),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": settings.reply},
+            "finish_reason": "stop",
+        }],
+        "usage": _usage(body, len(settings.reply)),
+    }
+
+
+def main() -> None:
+    """解析命令行参数并启动服务"""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=settings.latency)
+    parser.add_argument("--latency-jitter", type=float, default=settings.latency_jitter)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate)
+    parser.add_argument("--rate-limit-ratio", type=float, default=settings.rate_limit_ratio)
+    parser.add_argument("--retry-after", type=float, default=settings.retry_after)
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    parser.add_argument("--reply-tokens", type=int, default=None, help="回复长度（字符数），默认使用固定回复")
+    parser.add_argument("--stream-error-rate", type=float, default=settings.stream_error_rate)
+    args = parser.parse_args()
+
+    settings.latency = args.latency
+    settings.latency_jitter = args.latency_jitter
+    settings.error_rate = args.error_rate
+    settings.rate_limit_ratio = args.rate_limit_ratio
+    settings.retry_after = args.retry_after
+    settings.tokens_per_second = args.tokens_per_second
+    settings.stream_error_rate = args.stream_error_rate
+    if args.reply_tokens:
+        settings.reply = (settings.reply * (args.reply_tokens // len(settings.reply) + 1))[:args.reply_tokens]
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+测试包
+运行方式（项目根目录）：python -m pytest -q
+"""
@@ -0,0 +1,169 @@
+"""BaseAgent 测试"""
+import asyncio
+from types import SimpleNamespace
+
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.model_config import ModelConfig
+from app.core.agents.tools import ToolRegistry
+
+
+class RecordingAgent(BaseAgent):
+    """记录每次请求的参数，不访问网络"""
+
+    def __init__(self, **kwargs):
+        super().__init__(ModelConfig(api_key="test"), system_prompt="系统", **kwargs)
+        self.requests = []
+
+    async def _fetch_completion(self, key, params, prompt_tokens=None):
+        self.requests.append(params)
+        if params["stream"]:
+            return self._chunks("回答")
+        message = SimpleNamespace(content="回答", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    @staticmethod
+    async def _chunks(text):
+        for char in text:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=char))], usage=None)
+
+
+def test_assigning_same_value_keeps_config_version():
+    config = ModelConfig(api_key="test")
+    version = config.version
+    config.stream = False
+    config.temperature = 0.7
+    assert config.version == version
+    config.temperature = 0.2
+    assert config.version == version + 1
+    config.stop = ["a"]
+    config.stop.append("b")
+    config.stop = config.stop
+    assert config.version == version + 3
+
+
+def test_stream_argument_overrides_only_one_request():
+    agent = RecordingAgent()
+
+    async def main():
+        chunks = await agent.generate("问题1", stream=True)
+        streamed = "".join([chunk async for chunk in chunks])
+        template = agent._request_template()
+        version = agent.model_config.version
+        reply = await agent.generate("问题2", stream=False)
+        return streamed, reply, template, version
+
+    streamed, reply, template, version = asyncio.run(main())
+    assert streamed == reply == "回答"
+    assert [r["stream"] for r in agent.requests] == [True, False]
+    assert agent.model_config.stream is False
+    assert agent.model_config.version == version
+    assert agent._request_template() is template
+
+
+class ToolCallingAgent(BaseAgent):
+    """第一次请求要求调用工具 slow，之后直接回答"""
+
+    def __init__(self):
+        super().__init__(ModelConfig(api_key="test"), system_prompt="系统")
+        self.rounds = 0
+        self.requests = []
+
+    async def _create_chat_completion(self, **kwargs):
+        self.rounds += 1
+        self.requests.append(kwargs)
+        if self.rounds == 1:
+            call = SimpleNamespace(
+                id="call-1",
+                function=SimpleNamespace(name="slow", arguments="{}"),
+                model_dump=lambda **_: {"id": "call-1", "type": "function",
+                                        "function": {"name": "slow", "arguments": "{}"}},
+            )
+            message = SimpleNamespace(content=None, tool_calls=[call], function_call=None)
+        else:
+            message = SimpleNamespace(content="完成", tool_calls=None, function_call=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_cancelled_tool_round_leaves_no_dangling_tool_calls():
+    registry = ToolRegistry()
+
+    @registry.register
+    async def slow() -> str:
+        """慢工具"""
+        await asyncio.sleep(10)
+        return "ok"
+
+    agent = ToolCallingAgent()
+
+    async def main():
+        task = asyncio.create_task(agent.generate_with_tools("问题", registry))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+    assert not any(m.get("tool_calls") for m in agent.messages)
+
+
+def test_tool_generation_overrides_conflicting_kwargs():
+    registry = ToolRegistry()
+
+    @registry.register
+    async def slow() -> str:
+        """快速返回的工具"""
+        return "ok"
+
+    agent = ToolCallingAgent()
+    reply = asyncio.run(agent.generate_with_tools("问题", registry, stream=True, tool_choice="required"))
+    assert reply == "完成"
+    assert [r["stream"] for r in agent.requests] == [False, False]
+    assert agent.requests[0]["tool_choice"] == "auto"
+
+
+class UpstreamStream:
+    """记录是否被关闭的上游流"""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="回答"))], usage=None)
+
+    async def aclose(self):
+        self.closed = True
+
+
+class UpstreamAgent(BaseAgent):
+    def __init__(self):
+        super().__init__(ModelConfig(api_key="test"), system_prompt="系统")
+        self.upstreams = []
+
+    async def _fetch_completion(self, key, params, prompt_tokens=None):
+        self.upstreams.append(UpstreamStream())
+        return self.upstreams[-1]
+
+
+def test_unread_stream_reply_closes_upstream():
+    agent = UpstreamAgent()
+
+    async def main():
+        reply = await agent.generate("问题1", stream=True)
+        await reply.aclose()
+        reply = await agent.generate("问题2", stream=True)
+        del reply
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert [upstream.closed for upstream in agent.upstreams] == [True, True]
+
+
+def test_fork_does_not_share_mutable_config_fields():
+    agent = RecordingAgent()
+    agent.model_config.stop = ["a"]
+    branch = agent.fork()
+    branch.model_config.stop.append("b")
+    assert agent.model_config.stop == ["a"]
+    assert branch.model_config.stop == ["a", "b"]
@@ -0,0 +1,55 @@
+"""批量生成测试"""
+import asyncio
+from types import SimpleNamespace
+
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.model_config import ModelConfig
+
+
+class EchoAgent(BaseAgent):
+    """原样返回提示词，记录发起的请求数"""
+
+    def __init__(self):
+        super().__init__(ModelConfig(api_key="test"), system_prompt="系统")
+        self.started = 0
+
+    async def _create_chat_completion(self, **kwargs):
+        self.started += 1
+        await asyncio.sleep(0)
+        message = SimpleNamespace(content=kwargs["messages"][-1]["content"], tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_map_applies_backpressure():
+    agent = EchoAgent()
+
+    async def main():
+        stream = agent.map((str(i) for i in range(100)), concurrency=2)
+        first = await stream.__anext__()
+        # 调用方暂停读取时，工作协程最多填满队列再各自持有一个结果
+        await asyncio.sleep(0.05)
+        started = agent.started
+        rest = [result async for result in stream]
+        return first, started, rest
+
+    first, started, rest = asyncio.run(main())
+    assert started <= 2 + 2 + 1
+    assert len(rest) + 1 == 100
+    assert all(r.ok for r in rest)
+
+
+def test_generate_batch_returns_all_results_in_order():
+    agent = EchoAgent()
+    report = asyncio.run(agent.generate_batch([str(i) for i in range(20)], concurrency=3))
+    assert [r.content for r in report.results] == [str(i) for i in range(20)]
+    assert report.completed == 20
+    assert report.failed == 0
+
+
+def test_ordered_map():
+    agent = EchoAgent()
+
+    async def main():
+        return [r.index async for r in agent.map([str(i) for i in range(10)], concurrency=4, ordered=True)]
+
+    assert asyncio.run(main()) == list(range(10))
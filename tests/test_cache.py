@@ -0,0 +1,70 @@
+"""LLM补全缓存测试"""
+import asyncio
+
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+from app.core.llm.cache import CompletionCache, SqliteCache
+
+
+def _chunk(content, finish_reason=None):
+    return ChatCompletionChunk.model_validate({
+        "id": "c1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "m",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": finish_reason}],
+    })
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_record_stream_caches_complete_stream():
+    cache = CompletionCache()
+    upstream = FakeStream([_chunk("你"), _chunk("好", "stop")])
+
+    async def consume():
+        return [c.choices[0].delta.content async for c in cache.record_stream("k", upstream)]
+
+    assert asyncio.run(consume()) == ["你", "好"]
+    assert asyncio.run(cache.get("k"))["choices"][0]["message"]["content"] == "你好"
+
+
+def test_record_stream_closes_upstream_when_consumer_stops_early():
+    cache = CompletionCache()
+    upstream = FakeStream([_chunk("你"), _chunk("好"), _chunk("!", "stop")])
+
+    async def consume():
+        stream = cache.record_stream("k", upstream)
+        async for _ in stream:
+            break
+        await stream.aclose()
+
+    asyncio.run(consume())
+    assert upstream.closed
+    assert asyncio.run(cache.get("k")) is None
+
+
+@pytest.mark.parametrize("url, path", [
+    ("sqlite:///./lithium.db", "./lithium.db"),
+    ("sqlite+aiosqlite:////var/data/x.db", "/var/data/x.db"),
+])
+def test_path_from_url(url, path):
+    assert SqliteCache.path_from_url(url) == path
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:", "postgresql://u@h/db"])
+def test_path_from_url_rejects_non_file_databases(url):
+    with pytest.raises(ValueError):
+        SqliteCache.path_from_url(url)
@@ -0,0 +1,27 @@
+"""LLM客户端注册表测试"""
+import asyncio
+
+from app.core.llm.client_registry import ClientRegistry
+
+
+def test_retired_client_is_closed_after_in_flight_requests_finish():
+    registry = ClientRegistry()
+
+    async def main():
+        registry.get_client("http://test/v1", "key")
+        pooled = next(iter(registry._clients.values()))
+        pooled.stats.in_flight = 1
+        registry._on_config_change({}, {}, ["llm.http_client.max_connections"])
+        assert registry.get_client("http://test/v1", "key") is not pooled.client
+        await asyncio.sleep(0.6)
+        still_open = not pooled.http_client.is_closed
+        pooled.stats.in_flight = 0
+        await asyncio.sleep(0.6)
+        closed = pooled.http_client.is_closed
+        await registry.aclose()
+        return still_open, closed, registry._retired
+
+    still_open, closed, retired = asyncio.run(main())
+    assert still_open
+    assert closed
+    assert retired == []
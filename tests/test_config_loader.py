@@ -0,0 +1,40 @@
+"""配置加载器测试"""
+import asyncio
+import threading
+
+from app.config.config_loader import ConfigLoader
+
+
+def _loader(tmp_path, content):
+    (tmp_path / "config_dev.yml").write_text(content, encoding="utf-8")
+    loader = ConfigLoader(config_dir=tmp_path)
+    loader.get("llm")
+    return loader
+
+
+def test_in_loop_callbacks_run_on_event_loop_thread(tmp_path):
+    loader = _loader(tmp_path, "llm:\n  rate_limit:\n    rpm: 10\n")
+    calls = {}
+    loader.subscribe(lambda new, old, changed: calls.setdefault("thread", threading.get_ident()), "llm")
+    loader.subscribe(lambda new, old, changed: calls.setdefault("loop", threading.get_ident()), "llm", in_loop=True)
+
+    async def main():
+        loader._loop = asyncio.get_running_loop()
+        (tmp_path / "config_dev.yml").write_text("llm:\n  rate_limit:\n    rpm: 20\n", encoding="utf-8")
+        # 模拟监视线程重新加载
+        await asyncio.to_thread(loader._load)
+        await asyncio.sleep(0)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert calls["loop"] == loop_thread
+    assert calls["thread"] != loop_thread
+
+
+def test_in_loop_callbacks_run_inline_without_loop(tmp_path):
+    loader = _loader(tmp_path, "agents:\n  max_agents: 1\n")
+    changed = []
+    loader.subscribe(lambda new, old, paths: changed.extend(paths), "agents", in_loop=True)
+    (tmp_path / "config_dev.yml").write_text("agents:\n  max_agents: 2\n", encoding="utf-8")
+    loader._load()
+    assert changed == ["agents.max_agents"]
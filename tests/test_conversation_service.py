@@ -0,0 +1,53 @@
+"""会话持久化服务测试"""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app.model.database as database
+import app.service.conversation_service as conversation_service
+from app.model.conversation import ConversationMessage
+from app.service.conversation_service import ConversationStore, ConversationWriteError
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """指向临时 SQLite 文件、尚未建表的数据库"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(database, "_engine", engine)
+    monkeypatch.setattr(database, "_sessionmaker", async_sessionmaker(engine, expire_on_commit=False))
+    monkeypatch.setattr(database, "_schema_ready", False)
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+def test_writer_creates_schema_before_first_write(fresh_db):
+    async def main():
+        store = ConversationStore(flush_interval=0.01)
+        store.enqueue("s1", "user", "你好")
+        await store.flush("s1")
+        await store.close()
+        async with database.get_sessionmaker()() as db:
+            return await db.scalar(select(func.count()).select_from(ConversationMessage))
+
+    assert asyncio.run(main()) == 1
+
+
+def test_flush_raises_when_batch_was_dropped(fresh_db, monkeypatch):
+    def broken_sessionmaker():
+        raise RuntimeError("数据库不可用")
+
+    monkeypatch.setattr(conversation_service, "get_sessionmaker", broken_sessionmaker)
+
+    async def main():
+        store = ConversationStore(flush_interval=0.01, max_retries=0)
+        store.enqueue("s1", "user", "你好")
+        with pytest.raises(ConversationWriteError):
+            await store.flush("s1")
+        # 每次丢弃只报告一次
+        await store.flush("s1")
+        await store.close()
+        return store.stats()["dropped"]
+
+    assert asyncio.run(main()) == 1
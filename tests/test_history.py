@@ -0,0 +1,100 @@
+"""对话历史策略测试"""
+import asyncio
+from types import SimpleNamespace
+
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.history import SlidingWindowPolicy, SummarizingPolicy, TokenBudgetPolicy, build_history_policy
+from app.core.agents.message_buffer import Message
+from app.core.agents.model_config import ModelConfig
+
+
+class RecordingAgent(BaseAgent):
+    """记录经过 _fetch_completion 的请求，不访问网络"""
+
+    def __init__(self, history_policy=None):
+        super().__init__(ModelConfig(api_key="test"), system_prompt="系统", history_policy=history_policy)
+        self.fetched = []
+
+    async def _fetch_completion(self, key, params, prompt_tokens=None):
+        self.fetched.append(params)
+        message = SimpleNamespace(content="摘要", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def _fill(agent, turns):
+    for i in range(turns):
+        agent.add_message("user", f"问题{i} " + "内容" * 50)
+        agent.add_message("assistant", f"回答{i} " + "内容" * 50)
+
+
+def test_no_policy_by_default():
+    assert build_history_policy(None) is None
+    assert build_history_policy({}) is None
+
+
+def test_sliding_window_keeps_system_prompt():
+    agent = RecordingAgent(SlidingWindowPolicy(max_messages=3))
+    _fill(agent, 5)
+    messages, _ = asyncio.run(agent._history_for_request())
+    assert [m["role"] for m in messages] == ["system", "assistant", "user", "assistant"]
+
+
+def test_token_budget_drops_oldest_messages():
+    agent = RecordingAgent(TokenBudgetPolicy(max_tokens=400, reserve_tokens=0))
+    _fill(agent, 10)
+    messages, tokens = asyncio.run(agent._history_for_request())
+    assert messages[0]["content"] == "系统"
+    assert messages[-1]["content"].startswith("回答9")
+    assert len(messages) < len(agent.messages)
+    assert tokens <= 400
+
+
+def test_summarize_goes_through_fetch_completion():
+    agent = RecordingAgent(SummarizingPolicy(max_tokens=400, reserve_tokens=0))
+    _fill(agent, 10)
+    messages, tokens = asyncio.run(agent._history_for_request())
+    assert len(agent.fetched) == 1
+    assert agent.fetched[0]["stream"] is False
+    assert agent.fetched[0]["model"] == agent.model_config.model
+    assert agent.messages[1]["content"].startswith("以下是之前对话的摘要")
+    assert tokens <= 400
+
+
+def _tool_round(agent, calls):
+    """追加一轮工具调用：assistant 工具调用消息及各调用的结果"""
+    agent._buffer.append(Message(
+        role="assistant",
+        content="",
+        tool_calls=[{"id": f"call-{i}", "type": "function", "function": {"name": "f", "arguments": "{}"}}
+                    for i in range(calls)],
+    ))
+    for i in range(calls):
+        agent._buffer.append(Message(role="tool", content="结果" * 50, tool_call_id=f"call-{i}"))
+
+
+def _roles(messages):
+    return [m["role"] for m in messages]
+
+
+def test_sliding_window_keeps_tool_results_with_their_call():
+    agent = RecordingAgent(SlidingWindowPolicy(max_messages=1))
+    agent.add_message("user", "问题")
+    _tool_round(agent, 2)
+    messages, _ = asyncio.run(agent._history_for_request())
+    assert _roles(messages) == ["system", "assistant", "tool", "tool"]
+    agent.add_message("assistant", "回答")
+    agent.history_policy = SlidingWindowPolicy(max_messages=3)
+    messages, _ = asyncio.run(agent._history_for_request())
+    assert _roles(messages) == ["system", "assistant"]
+
+
+def test_token_budget_keeps_tool_results_with_their_call():
+    agent = RecordingAgent(TokenBudgetPolicy(max_tokens=120, reserve_tokens=0))
+    agent.add_message("user", "问题")
+    _tool_round(agent, 2)
+    messages, _ = asyncio.run(agent._history_for_request())
+    assert _roles(messages) == ["system", "assistant", "tool", "tool"]
+    agent.add_message("assistant", "回答")
+    messages, _ = asyncio.run(agent._history_for_request())
+    assert _roles(messages) == ["system", "assistant"]
+    assert messages[-1]["content"] == "回答"
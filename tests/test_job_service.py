@@ -0,0 +1,47 @@
+"""后台任务服务测试"""
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app.model.database as database
+import app.service.chat_service as chat_service
+from app.service.job_service import JobQueue
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(database, "_engine", engine)
+    monkeypatch.setattr(database, "_sessionmaker", async_sessionmaker(engine, expire_on_commit=False))
+    monkeypatch.setattr(database, "_schema_ready", False)
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+def _agents_run(*tasks):
+    return {"tasks": [{"name": name, "prompt": "p", "depends_on": deps} for name, deps in tasks]}
+
+
+def test_concurrent_events_get_distinct_sequence_numbers(fresh_db):
+    async def main():
+        queue = JobQueue()
+        job = await queue.submit("agents.run", _agents_run(("a", [])))
+        await asyncio.gather(*(queue.add_event(job["id"], "task", {"i": i}) for i in range(10)))
+        return await queue.events(job["id"])
+
+    events = asyncio.run(main())
+    assert [e["seq"] for e in events] == list(range(11))
+
+
+def test_agents_run_validation_does_not_create_agents(fresh_db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("校验时不应创建Agent")
+
+    monkeypatch.setattr(chat_service, "create_agent", fail)
+    queue = JobQueue()
+    with pytest.raises(ValueError):
+        asyncio.run(queue.submit("agents.run", _agents_run(("a", ["b"]), ("b", ["a"]))))
+    with pytest.raises(ValueError):
+        asyncio.run(queue.submit("agents.run", _agents_run(("a", ["missing"]))))
+    assert asyncio.run(queue.submit("agents.run", _agents_run(("a", []), ("b", ["a.summary"]))))["status"] == "queued"
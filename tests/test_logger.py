@@ -0,0 +1,14 @@
+"""日志模块测试"""
+from app.utils import logger as log_module
+
+
+def test_level_cache_follows_added_sinks():
+    log_module.ensure_logger()
+    before = log_module._levels.min_no
+    messages = []
+    handler_id = log_module.logger.add(messages.append, level="TRACE", format="{message}")
+    assert log_module._levels.min_no == 5
+    log_module.logger.debug("调试")
+    log_module.logger.remove(handler_id)
+    assert log_module._levels.min_no == before
+    assert [str(m).strip() for m in messages] == ["调试"]
@@ -0,0 +1,61 @@
+"""消息缓冲区与Token前缀和测试"""
+import asyncio
+from bisect import bisect_left
+from types import SimpleNamespace
+
+from app.core.agents.conversation_agent import ConversationAgent
+from app.core.agents.message_buffer import TokenPrefix
+from app.core.agents.model_config import ModelConfig
+from app.core.agents.session_backend import MemorySessionBackend
+
+
+def _prefix(*values):
+    prefix = TokenPrefix()
+    for value in values:
+        prefix.append(value)
+    return prefix
+
+
+def test_fork_shares_prefix_without_copying():
+    parent = _prefix(3, 7)
+    child = parent.fork()
+    assert child._values == [] and child._base[0] is parent._values
+    child.append(10)
+    parent.append(8)
+    assert list(child) == [0, 3, 7, 10]
+    assert list(parent) == [0, 3, 7, 8]
+    assert bisect_left(child, 7) == 2
+    assert child[-1] == 10
+
+
+def test_truncate_does_not_affect_other_branches():
+    parent = _prefix(3, 7, 12)
+    child = parent.fork()
+    parent.truncate(2)
+    child.truncate(3)
+    child.append(20)
+    assert list(parent) == [0, 3]
+    assert list(child) == [0, 3, 7, 20]
+    parent.append(5)
+    assert list(child) == [0, 3, 7, 20]
+
+
+class FixedReplyAgent(ConversationAgent):
+    async def _fetch_completion(self, key, params, prompt_tokens=None):
+        message = SimpleNamespace(content="回答", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_conversation_fork_without_session_id_does_not_persist():
+    backend = MemorySessionBackend()
+    agent = FixedReplyAgent(ModelConfig(api_key="test"), session_id="s1", backend=backend)
+
+    async def main():
+        await agent.generate("问题", stream=False)
+        branch = agent.fork()
+        await branch.generate("分支问题", stream=False)
+        return await backend.load("s1"), branch.messages
+
+    stored, branch_messages = asyncio.run(main())
+    assert [m["content"] for m in stored] == ["问题", "回答"]
+    assert [m["content"] for m in branch_messages] == ["问题", "回答", "分支问题", "回答"]
@@ -0,0 +1,134 @@
+"""消息总线测试"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.agents.conversation_agent import ConversationAgent
+from app.core.agents.message_bus import MessageBus, RedisTransport, SubscriptionClosed, serve_agent
+from app.core.agents.model_config import ModelConfig
+from app.core.agents.session_backend import MemorySessionBackend
+
+
+def test_close_ends_iteration_after_queued_messages():
+    async def main():
+        bus = MessageBus()
+        subscription = bus.subscribe("events")
+        received = []
+
+        async def read():
+            async for envelope in subscription:
+                received.append(envelope.payload)
+
+        reader = asyncio.create_task(read())
+        await bus.publish("events", 1)
+        await asyncio.sleep(0)
+        await bus.publish("events", 2)
+        subscription.close()
+        await asyncio.wait_for(reader, 1)
+        with pytest.raises(SubscriptionClosed):
+            await subscription.get()
+        return received
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_close_releases_blocked_publisher():
+    async def main():
+        bus = MessageBus()
+        subscription = bus.subscribe("events", maxsize=1)
+        await bus.publish("events", 1)
+        publisher = asyncio.create_task(bus.publish("events", 2))
+        await asyncio.sleep(0.01)
+        assert not publisher.done()
+        subscription.close()
+        await asyncio.wait_for(publisher, 1)
+        return subscription.dropped
+
+    assert asyncio.run(main()) == 1
+
+
+class FakePubSub:
+    def __init__(self, redis, fail):
+        self.redis = redis
+        self.fail = fail
+        self.messages = asyncio.Queue()
+
+    async def psubscribe(self, pattern):
+        self.redis.pubsubs.append(self)
+
+    async def listen(self):
+        if self.fail:
+            raise ConnectionError("连接断开")
+        while True:
+            yield await self.messages.get()
+
+    async def aclose(self):
+        self.redis.pubsubs.remove(self)
+
+
+class FakeRedis:
+    """首个订阅连接读取即失败，之后的连接正常收到发布的消息"""
+
+    def __init__(self):
+        self.pubsubs = []
+        self.created = 0
+
+    def pubsub(self, **kwargs):
+        self.created += 1
+        return FakePubSub(self, fail=self.created == 1)
+
+    async def publish(self, channel, data):
+        for pubsub in self.pubsubs:
+            pubsub.messages.put_nowait({"data": data})
+
+    async def aclose(self):
+        pass
+
+
+def test_redis_reader_reconnects_and_replies_bypass_full_subscriber():
+    async def main():
+        transport = RedisTransport("redis://localhost:6379/0", reconnect_delay=0)
+        transport._redis = FakeRedis()
+        bus = MessageBus(transport)
+        await bus.start()
+        # 等待读取循环在首次失败后重新订阅
+        while not (transport.reconnects and transport._redis.pubsubs):
+            await asyncio.sleep(0.01)
+        # 没有读取方的订阅者队列已满，不应阻塞读取循环
+        stalled = bus.subscribe("events", maxsize=1)
+        bus.respond("echo", lambda payload: asyncio.sleep(0, payload))
+        for i in range(3):
+            await bus.publish("events", i)
+        reply = await bus.request("echo", "你好", timeout=1)
+        stats = stalled.stats()
+        await bus.close()
+        return reply, stats, transport.reconnects
+
+    reply, stats, reconnects = asyncio.run(main())
+    assert reply == "你好"
+    assert stats["queued"] == 3 and stats["backlog"] == 2
+    assert reconnects == 1
+
+
+class FixedReplyAgent(ConversationAgent):
+    async def _fetch_completion(self, key, params, prompt_tokens=None):
+        message = SimpleNamespace(content=f"回答{len(params['messages'])}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_serve_conversation_agent_does_not_persist_requests():
+    backend = MemorySessionBackend()
+    agent = FixedReplyAgent(ModelConfig(api_key="test"), session_id="s1", backend=backend)
+
+    async def main():
+        bus = MessageBus()
+        serve_agent(bus, "agents.chat", agent)
+        replies = [await bus.request("agents.chat", {"prompt": "问题"}, timeout=1) for _ in range(2)]
+        await bus.close()
+        return replies, await backend.load("s1")
+
+    replies, stored = asyncio.run(main())
+    # 每个请求在独立分支上处理，历史不累积，也不写入原会话
+    assert replies[0] == replies[1]
+    assert stored == []
@@ -0,0 +1,112 @@
+"""DAG编排器测试"""
+import asyncio
+from types import SimpleNamespace
+
+from app.core.agents.base_agent import BaseAgent
+from app.core.agents.model_config import ModelConfig
+from app.core.agents.orchestrator import AgentTask, Orchestrator
+from app.core.agents.structured_output import publish_field
+
+
+def _completion(content):
+    message = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FlakyAgent(BaseAgent):
+    """前 failures 次请求失败（hang 为True时挂起直到超时）的Agent，记录每次请求发送的历史"""
+
+    def __init__(self, failures, hang=False):
+        super().__init__(ModelConfig(api_key="test"), system_prompt="系统")
+        self.failures = failures
+        self.hang = hang
+        self.requests = []
+
+    async def _create_chat_completion(self, messages=None, **kwargs):
+        self.requests.append([m["content"] for m in self._buffer.serialized()])
+        if len(self.requests) <= self.failures:
+            if self.hang:
+                await asyncio.sleep(10)
+            raise RuntimeError("上游错误")
+        return _completion("回答")
+
+
+def _run(tasks, **kwargs):
+    return asyncio.run(Orchestrator(max_concurrency=4, retry_delay=0, **kwargs).run(tasks))
+
+
+def test_retry_rolls_back_history_of_failed_attempts():
+    agent = FlakyAgent(failures=2)
+    results = _run([AgentTask.from_agent("a", agent, "问题", retry_attempts=2)])
+    assert results["a"].ok and results["a"].attempts == 3
+    assert agent.requests == [["系统", "问题"]] * 3
+    assert [m["content"] for m in agent.messages] == ["系统", "问题", "回答"]
+
+
+def test_timed_out_attempt_leaves_no_dangling_prompt():
+    agent = FlakyAgent(failures=1, hang=True)
+    results = _run([AgentTask.from_agent("a", agent, "问题", retry_attempts=1, timeout=0.05)])
+    assert results["a"].ok
+    assert agent.requests == [["系统", "问题"]] * 2
+    assert [m["content"] for m in agent.messages] == ["系统", "问题", "回答"]
+
+
+def test_failed_task_restores_original_history():
+    agent = FlakyAgent(failures=5)
+    results = _run([
+        AgentTask.from_agent("a", agent, "问题", retry_attempts=1),
+        AgentTask(name="b", run=lambda deps: asyncio.sleep(0, "b"), depends_on=["a"]),
+    ])
+    assert results["a"].status == "failed" and results["a"].attempts == 2
+    assert results["b"].status == "skipped"
+    assert [m["content"] for m in agent.messages] == ["系统"]
+
+
+def test_retry_backs_off_between_attempts():
+    orchestrator = Orchestrator(retry_delay=0.05)
+    delays = [orchestrator.backoff.backoff(attempt) for attempt in range(3)]
+    assert all(0 <= delay <= 0.05 * 2 ** attempt for attempt, delay in enumerate(delays))
+
+
+def test_field_dependents_restart_when_upstream_retries():
+    attempts = 0
+    seen = []
+
+    async def upstream(deps):
+        nonlocal attempts
+        attempts += 1
+        publish_field("plan", f"计划{attempts}")
+        await asyncio.sleep(0.02)
+        if attempts == 1:
+            raise RuntimeError("上游错误")
+        return {"plan": f"计划{attempts}"}
+
+    async def downstream(deps):
+        seen.append(deps["up.plan"])
+        return deps["up.plan"]
+
+    results = _run([
+        AgentTask("up", upstream, retry_attempts=1),
+        AgentTask("down", downstream, depends_on=["up.plan"]),
+    ])
+    assert results["up"].ok and results["up"].attempts == 2
+    assert results["down"].result == "计划2"
+    assert seen[-1] == "计划2"
+
+
+def test_field_dependent_is_skipped_when_upstream_finally_fails():
+    async def upstream(deps):
+        publish_field("plan", "计划")
+        await asyncio.sleep(0.02)
+        raise RuntimeError("上游错误")
+
+    async def downstream(deps):
+        return deps["up.plan"]
+
+    async def main():
+        orchestrator = Orchestrator(max_concurrency=4, retry_delay=0)
+        tasks = [AgentTask("up", upstream, retry_attempts=0), AgentTask("down", downstream, depends_on=["up.plan"])]
+        return [(r.name, r.status) async for r in orchestrator.run_stream(tasks)]
+
+    # 下游先于上游完成，其结果不会在上游失败前返回
+    assert asyncio.run(main()) == [("up", "failed"), ("down", "skipped")]
@@ -0,0 +1,82 @@
+"""限流调度器测试"""
+import asyncio
+
+from app.core.llm.rate_limiter import PRIORITY_HIGH, PRIORITY_LOW, Admission, RateLimiter
+from app.core.llm.resilience import ResilientExecutor
+
+
+def _drained(tpm=6000):
+    """Token桶已耗尽的限流器：每秒补充 tpm/60 个Token"""
+    limiter = RateLimiter("test", tpm=tpm)
+    limiter.tokens.consume(tpm)
+    return limiter
+
+
+def test_try_acquire_does_not_queue():
+    limiter = RateLimiter("test", tpm=6000)
+    assert limiter.try_acquire(6000) is not None
+    assert limiter.try_acquire(10) is None
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_higher_priority_is_admitted_first():
+    limiter = _drained()
+    order = []
+
+    async def request(name, priority):
+        await limiter.acquire(50, agent_id=name, priority=priority)
+        order.append(name)
+
+    async def main():
+        await asyncio.gather(request("low", PRIORITY_LOW), request("high", PRIORITY_HIGH))
+
+    asyncio.run(main())
+    assert order == ["high", "low"]
+
+
+def test_queue_time_is_excluded_from_latency():
+    limiter = _drained()
+    executor = ResilientExecutor("test")
+
+    async def request():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def main():
+        start = asyncio.get_running_loop().time()
+        result = await executor.call(request, admit=Admission(limiter, 10))
+        return result, asyncio.get_running_loop().time() - start
+
+    result, elapsed = asyncio.run(main())
+    assert result == "ok"
+    assert elapsed >= 0.1
+    assert executor.latency.quantile(0.5) < 0.05
+
+
+def _hedging_executor():
+    executor = ResilientExecutor("test", hedge_quantile=0.5, hedge_min_samples=1, hedge_min_delay=0.01)
+    executor.latency.record(0.01)
+    return executor
+
+
+async def _slow_once():
+    await asyncio.sleep(0.05)
+    return "ok"
+
+
+def test_hedge_is_skipped_when_quota_is_exhausted():
+    limiter = RateLimiter("test", tpm=6000)
+    admission = Admission(limiter, 6000)
+    executor = _hedging_executor()
+    assert asyncio.run(executor.call(_slow_once, admit=admission)) == "ok"
+    assert executor.hedged_requests == 0
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_hedge_is_admitted_when_quota_is_available():
+    limiter = RateLimiter("test", tpm=6000)
+    admission = Admission(limiter, 10)
+    executor = _hedging_executor()
+    assert asyncio.run(executor.call(_slow_once, admit=admission)) == "ok"
+    assert executor.hedged_requests == 1
+    assert limiter.admitted == 2
@@ -0,0 +1,152 @@
+"""LLM调用容错测试"""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.core.llm.resilience import CircuitBreaker, CircuitOpenError, ResilientExecutor, RetryPolicy
+
+
+def _status_error(cls, status):
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    return cls("error", response=httpx.Response(status, request=request), body=None)
+
+
+def _server_error():
+    return _status_error(openai.InternalServerError, 500)
+
+
+def _executor(**kwargs):
+    return ResilientExecutor(
+        "test",
+        retry=RetryPolicy(retry_attempts=0),
+        breaker=CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.01),
+        **kwargs
+    )
+
+
+async def _fail():
+    raise _server_error()
+
+
+async def _ok():
+    return "ok"
+
+
+def _open(executor):
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(executor.call(_fail))
+    assert executor.breaker.state == "open"
+
+
+def test_breaker_opens_and_recovers_after_successful_probe():
+    executor = _executor()
+    _open(executor)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(executor.call(_ok))
+    asyncio.run(asyncio.sleep(0.02))
+    assert asyncio.run(executor.call(_ok)) == "ok"
+    assert executor.breaker.state == "closed"
+
+
+def test_only_one_probe_in_half_open():
+    executor = _executor()
+    _open(executor)
+    asyncio.run(asyncio.sleep(0.02))
+
+    async def main():
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "ok"
+        return await asyncio.gather(executor.call(slow), executor.call(_ok), return_exceptions=True)
+
+    probe, rejected = asyncio.run(main())
+    assert probe == "ok"
+    assert isinstance(rejected, CircuitOpenError)
+
+
+def test_cancelled_probe_releases_half_open_slot():
+    executor = _executor()
+    _open(executor)
+    asyncio.run(asyncio.sleep(0.02))
+
+    async def cancel_probe():
+        task = asyncio.create_task(executor.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert executor.breaker.state == "half_open"
+    assert asyncio.run(executor.call(_ok)) == "ok"
+    assert executor.breaker.state == "closed"
+
+
+def test_probe_timeout_does_not_count_as_failure():
+    executor = _executor()
+    _open(executor)
+    asyncio.run(asyncio.sleep(0.02))
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(executor.call(lambda: asyncio.sleep(10)), timeout=0.01))
+    assert asyncio.run(executor.call(_ok)) == "ok"
+
+
+def test_retries_retryable_errors_then_succeeds():
+    executor = ResilientExecutor("test", retry=RetryPolicy(retry_attempts=2, base_delay=0.001))
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise _server_error()
+        return "ok"
+
+    assert asyncio.run(executor.call(flaky)) == "ok"
+    assert executor.retries == 2
+    assert executor.breaker.state == "closed"
+
+
+def test_non_retryable_error_is_raised_immediately():
+    executor = ResilientExecutor("test", retry=RetryPolicy(retry_attempts=3, base_delay=0.001))
+
+    async def bad_request():
+        raise ValueError("参数错误")
+
+    with pytest.raises(ValueError):
+        asyncio.run(executor.call(bad_request))
+    assert executor.retries == 0
+
+
+@pytest.mark.parametrize("error", [
+    _status_error(openai.AuthenticationError, 401),
+    _status_error(openai.NotFoundError, 404),
+    KeyError("choices"),
+])
+def test_failed_probe_with_non_request_error_keeps_breaker_half_open(error):
+    executor = _executor()
+    _open(executor)
+    asyncio.run(asyncio.sleep(0.02))
+
+    async def fail():
+        raise error
+
+    with pytest.raises(type(error)):
+        asyncio.run(executor.call(fail))
+    assert executor.breaker.state == "half_open"
+    assert executor.breaker._failures == 1
+
+
+def test_bad_request_probe_closes_breaker():
+    executor = _executor()
+    _open(executor)
+    asyncio.run(asyncio.sleep(0.02))
+
+    async def bad_request():
+        raise _status_error(openai.BadRequestError, 400)
+
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(executor.call(bad_request))
+    assert executor.breaker.state == "closed"
@@ -0,0 +1,68 @@
+"""多端点路由测试"""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.core.llm.router import Endpoint, Router
+
+
+def _server_error():
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    return openai.InternalServerError("error", response=httpx.Response(500, request=request), body=None)
+
+
+def _router(*names, **kwargs):
+    return Router([Endpoint(name=name, api_key="test", model="test") for name in names], **kwargs)
+
+
+def test_unobserved_endpoint_uses_prior_latency():
+    router = _router("router-a", "router-b", initial_latency=2.0)
+    a, b = router.endpoints
+    a.stats.record(0.5, ok=True, alpha=0.3)
+    assert router._score(b) == pytest.approx(2.0)
+    assert router.choose() is a
+
+
+def test_failure_records_penalty_latency():
+    router = _router("router-fail", "router-ok", failure_latency=5.0)
+    failing, healthy = router.endpoints
+    calls = []
+
+    async def fn(endpoint):
+        calls.append(endpoint.name)
+        if endpoint is failing:
+            raise _server_error()
+        return endpoint.name
+
+    # 先让健康端点观测到较慢但成功的延迟
+    healthy.stats.record(1.0, ok=True, alpha=0.3)
+    failing.stats.ewma_latency = 0.1
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(router._call_endpoint(failing, fn))
+    assert failing.stats.ewma_latency >= 0.3 * 5.0
+    assert failing.stats.errors == 1
+    assert router.choose() is healthy
+
+
+def test_failing_endpoint_loses_to_unobserved_one():
+    router = _router("router-x", "router-y", initial_latency=1.0)
+    x, y = router.endpoints
+    # x 曾经很快，首次调用会选中它
+    x.stats.record(0.01, ok=True, alpha=0.3)
+
+    async def fn(endpoint):
+        if endpoint is x:
+            raise _server_error()
+        return endpoint.name
+
+    async def main():
+        results = []
+        for _ in range(5):
+            results.append(await router.call(fn))
+        return results
+
+    assert asyncio.run(main()) == ["router-y"] * 5
+    assert x.stats.errors == 1
+    assert router._score(x) > router._score(y)
@@ -0,0 +1,47 @@
+"""语义缓存测试"""
+import asyncio
+
+from app.core.llm.semantic_cache import SemanticCache
+
+PRIME = "请写一个Python函数，判断一个整数是否为素数，要求时间复杂度尽可能低，并给出测试用例。"
+EVEN = "请写一个Python函数，判断一个整数是否为偶数，要求时间复杂度尽可能低，并给出测试用例。"
+
+
+def _add(cache, prompt, answer, scope=1):
+    vector = asyncio.run(cache.embed(prompt))
+    cache.add(vector, scope, prompt, {"answer": answer})
+
+
+def _lookup(cache, prompt, scope=1):
+    return cache.lookup(asyncio.run(cache.embed(prompt)), scope)
+
+
+def test_default_threshold_rejects_prompts_with_different_meaning():
+    cache = SemanticCache()
+    _add(cache, PRIME, "素数")
+    assert _lookup(cache, EVEN) is None
+    assert _lookup(cache, "  " + PRIME.upper()) == {"answer": "素数"}
+
+
+def test_reload_drops_slots_overwritten_after_last_save(tmp_path):
+    cache = SemanticCache(max_entries=1, path=str(tmp_path))
+    _add(cache, PRIME, "素数")
+    cache.save()
+    # 保存后槽位被新条目覆盖，向量已写入内存映射文件，但进程在保存元数据前退出
+    _add(cache, EVEN, "偶数")
+    cache.index.vectors.flush()
+    del cache
+
+    reloaded = SemanticCache(max_entries=1, path=str(tmp_path))
+    assert len(reloaded._entries) == 0
+    assert _lookup(reloaded, EVEN) is None
+
+
+def test_reload_keeps_consistent_entries(tmp_path):
+    cache = SemanticCache(path=str(tmp_path))
+    _add(cache, PRIME, "素数")
+    cache.save()
+    del cache
+
+    reloaded = SemanticCache(path=str(tmp_path))
+    assert _lookup(reloaded, PRIME) == {"answer": "素数"}
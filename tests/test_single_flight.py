@@ -0,0 +1,135 @@
+"""请求合并测试"""
+import asyncio
+
+from app.core.llm.single_flight import SingleFlight
+
+
+class SlowStream:
+    """按间隔产出分片的上游流，记录是否被关闭"""
+
+    def __init__(self, chunks, interval=0.01):
+        self.chunks = chunks
+        self.interval = interval
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.interval)
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "结果"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)))
+        return results, flight.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == ["结果"] * 5
+    assert calls == 1
+    assert stats == {"in_flight": 0, "leaders": 1, "followers": 4}
+
+
+def test_follower_keeps_stream_when_leader_aborts_before_follower_reads():
+    upstream = SlowStream(["a", "b", "c"])
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return upstream
+
+    async def main():
+        flight = SingleFlight()
+        leader, follower = await asyncio.gather(
+            flight.do("k", fetch, stream=True), flight.do("k", fetch, stream=True)
+        )
+        async for _ in leader:
+            break
+        await leader.aclose()
+        await asyncio.sleep(0.02)
+        return [chunk async for chunk in follower]
+
+    assert asyncio.run(main()) == ["a", "b", "c"]
+
+
+def test_stream_is_cancelled_when_every_subscriber_aborts():
+    upstream = SlowStream(["a", "b", "c"], interval=0.05)
+
+    async def fetch():
+        return upstream
+
+    async def main():
+        flight = SingleFlight()
+        stream = await flight.do("k", fetch, stream=True)
+        async for _ in stream:
+            break
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        return flight.stats()
+
+    assert asyncio.run(main())["in_flight"] == 0
+    assert upstream.closed
+
+
+def test_error_is_delivered_to_every_subscriber():
+    async def fetch():
+        raise ValueError("上游失败")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("k", fetch) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_unread_subscriber_does_not_keep_stream_alive():
+    upstream = SlowStream(["a", "b", "c"], interval=0.05)
+
+    async def fetch():
+        return upstream
+
+    async def main():
+        flight = SingleFlight()
+        reader, unread = await asyncio.gather(
+            flight.do("k", fetch, stream=True), flight.do("k", fetch, stream=True)
+        )
+        task = reader._broadcast._task
+        await unread.aclose()
+        async for _ in reader:
+            break
+        await reader.aclose()
+        await asyncio.sleep(0.01)
+        return task
+
+    task = asyncio.run(main())
+    assert task.done()
+    assert upstream.closed
+
+
+def test_dropped_subscriber_cancels_stream():
+    upstream = SlowStream(["a", "b", "c"], interval=0.05)
+
+    async def fetch():
+        return upstream
+
+    async def main():
+        flight = SingleFlight()
+        stream = await flight.do("k", fetch, stream=True)
+        task = stream._broadcast._task
+        del stream
+        await asyncio.sleep(0.01)
+        return task
+
+    assert asyncio.run(main()).done()
+    assert upstream.closed
@@ -0,0 +1,101 @@
+"""流式结构化输出解析测试"""
+import asyncio
+import json
+import random
+
+import pytest
+from pydantic import BaseModel, Field, ValidationError
+
+from app.core.agents.structured_output import IncrementalJSONParser, iter_fields, parse_structured
+
+
+DOCUMENT = {
+    "title": "标题 \"引号\" \\ 反斜杠",
+    "count": -12.5e3,
+    "ok": True,
+    "none": None,
+    "tags": ["a", "b}", {"x": [1, 2, {"y": "]"}]}],
+    "nested": {"k": "v", "empty": {}},
+    "last": 0,
+}
+
+
+class Plan(BaseModel):
+    title: str
+    count: float
+    outline: list = Field(alias="tags")
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+def _split(text, rng):
+    parts, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, 7)
+        parts.append(text[i:i + size])
+        i += size
+    return parts
+
+
+def test_fields_match_json_loads_for_any_chunking():
+    text = "说明文字\n```json\n" + json.dumps(DOCUMENT, ensure_ascii=False, indent=1) + "\n```"
+    rng = random.Random(7)
+    for _ in range(50):
+        parser = IncrementalJSONParser()
+        fields = []
+        for part in _split(text, rng):
+            fields.extend(parser.feed(part))
+        parser.close()
+        assert dict(fields) == DOCUMENT
+        assert [key for key, _ in fields] == list(DOCUMENT)
+
+
+def test_field_is_returned_before_object_ends():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": "x", "b": [1') == [("a", "x")]
+    assert parser.feed(", 2]") == [("b", [1, 2])]
+    assert not parser.done
+    assert parser.feed(', "c": 3}') == [("c", 3)]
+    assert parser.done
+
+
+def test_incomplete_or_malformed_object_raises():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1, "b": ')
+    with pytest.raises(ValueError):
+        parser.close()
+    with pytest.raises(ValueError):
+        IncrementalJSONParser().feed('{"a" 1}')
+    with pytest.raises(ValueError):
+        IncrementalJSONParser().feed('{"a": ,}')
+
+
+def test_iter_fields_validates_each_field_and_uses_alias():
+    text = json.dumps({"title": "t", "count": 3, "tags": [1], "extra": 1})
+
+    async def collect():
+        return [item async for item in iter_fields(_chunks(_split(text, random.Random(1))), Plan)]
+
+    assert asyncio.run(collect()) == [("title", "t"), ("count", 3.0), ("outline", [1])]
+
+
+def test_iter_fields_rejects_invalid_field():
+    async def collect():
+        return [item async for item in iter_fields(_chunks(['{"title": "t", "count": "x"}']), Plan)]
+
+    with pytest.raises(ValidationError):
+        asyncio.run(collect())
+
+
+def test_parse_structured_reports_fields_and_returns_model():
+    seen = []
+    result = asyncio.run(parse_structured(
+        _chunks(['{"title": "t", ', '"count": 1, "tags": []}']),
+        Plan,
+        on_field=lambda name, value: seen.append(name),
+    ))
+    assert seen == ["title", "count", "outline"]
+    assert result == Plan(title="t", count=1, tags=[])